@@ -0,0 +1,29 @@
+"""add news_articles (time, id) index
+
+Revision ID: 3f2a9c1d7b10
+Revises: 
+Create Date: 2026-10-17 22:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c1d7b10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # main.py runs create_all on import, so a fresh database may already have it
+    indexes = sa.inspect(op.get_bind()).get_indexes("news_articles")
+    if "ix_news_articles_time_id" not in {i["name"] for i in indexes}:
+        op.create_index("ix_news_articles_time_id", "news_articles", ["time", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_news_articles_time_id", table_name="news_articles")
@@ -0,0 +1,67 @@
+"""add news_articles content_hash and summary_cache
+
+Revision ID: 5b9e2d7c4a16
+Revises: c57e0a9f4d31
+Create Date: 2026-10-18 01:40:00.000000
+
+"""
+import hashlib
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e2d7c4a16'
+down_revision: Union[str, None] = 'c57e0a9f4d31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def content_hash(content):
+    # same as main.content_hash at the time of this revision
+    normalised = " ".join(unicodedata.normalize("NFKC", content).split()).casefold()
+    return hashlib.sha256(normalised.encode("utf-8")).hexdigest()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # main.py runs create_all on import, so a fresh database may already have them
+    if "content_hash" not in {c["name"] for c in inspector.get_columns("news_articles")}:
+        op.add_column("news_articles", sa.Column("content_hash", sa.String(length=64), nullable=True))
+        op.create_index("ix_news_articles_content_hash", "news_articles", ["content_hash"])
+    if "summary_cache" not in inspector.get_table_names():
+        op.create_table(
+            "summary_cache",
+            sa.Column("content_hash", sa.String(length=64), nullable=False),
+            sa.Column("summary", sa.Text(), nullable=False),
+            sa.Column("reason", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("content_hash"),
+        )
+
+    articles = sa.table(
+        "news_articles",
+        sa.column("id", sa.Integer()),
+        sa.column("content", sa.Text()),
+        sa.column("content_hash", sa.String()),
+    )
+    rows = bind.execute(
+        sa.select(articles.c.id, articles.c.content).where(articles.c.content_hash.is_(None))
+    ).all()
+    if rows:
+        bind.execute(
+            articles.update()
+            .where(articles.c.id == sa.bindparam("article_id"))
+            .values(content_hash=sa.bindparam("digest")),
+            [{"article_id": row.id, "digest": content_hash(row.content)} for row in rows],
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("summary_cache")
+    op.drop_index("ix_news_articles_content_hash", table_name="news_articles")
+    op.drop_column("news_articles", "content_hash")
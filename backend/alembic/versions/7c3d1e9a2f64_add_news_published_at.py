@@ -0,0 +1,72 @@
+"""add news_articles published_at
+
+Revision ID: 7c3d1e9a2f64
+Revises: e2a7f3c9b851
+Create Date: 2026-10-18 03:20:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3d1e9a2f64'
+down_revision: Union[str, None] = 'e2a7f3c9b851'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# same as main.PUBLISHED_AT_FORMATS at the time of this revision
+PUBLISHED_AT_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y-%m-%d")
+
+
+def parse_published_at(value, fallback):
+    for fmt in PUBLISHED_AT_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return fallback
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # main.py runs create_all on import, so a fresh database may already have it
+    if "published_at" in {c["name"] for c in inspector.get_columns("news_articles")}:
+        return
+    op.add_column("news_articles", sa.Column("published_at", sa.DateTime(), nullable=True))
+
+    articles = sa.table(
+        "news_articles",
+        sa.column("id", sa.Integer()),
+        sa.column("time", sa.String()),
+        sa.column("published_at", sa.DateTime()),
+    )
+    migrated_at = datetime.now().replace(microsecond=0)
+    rows = bind.execute(sa.select(articles.c.id, articles.c.time)).all()
+    if rows:
+        bind.execute(
+            articles.update()
+            .where(articles.c.id == sa.bindparam("article_id"))
+            .values(published_at=sa.bindparam("parsed")),
+            [
+                {"article_id": row.id, "parsed": parse_published_at(row.time, migrated_at)}
+                for row in rows
+            ],
+        )
+
+    with op.batch_alter_table("news_articles") as batch_op:
+        batch_op.alter_column("published_at", existing_type=sa.DateTime(), nullable=False)
+    if "ix_news_articles_time_id" in {i["name"] for i in inspector.get_indexes("news_articles")}:
+        op.drop_index("ix_news_articles_time_id", table_name="news_articles")
+    op.create_index("ix_news_articles_published_at_id", "news_articles", ["published_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_news_articles_published_at_id", table_name="news_articles")
+    op.create_index("ix_news_articles_time_id", "news_articles", ["time", "id"])
+    with op.batch_alter_table("news_articles") as batch_op:
+        batch_op.drop_column("published_at")
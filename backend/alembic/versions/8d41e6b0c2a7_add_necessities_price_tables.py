@@ -0,0 +1,50 @@
+"""add necessities price tables
+
+Revision ID: 8d41e6b0c2a7
+Revises: 3f2a9c1d7b10
+Create Date: 2026-10-17 23:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41e6b0c2a7'
+down_revision: Union[str, None] = '3f2a9c1d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # main.py runs create_all on import, so a fresh database may already have them
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if "necessities_prices" not in tables:
+        op.create_table(
+            "necessities_prices",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("category", sa.String(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("data", sa.Text(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_necessities_prices_category", "necessities_prices", ["category"])
+        op.create_index("ix_necessities_prices_name", "necessities_prices", ["name"])
+    if "price_refreshes" not in tables:
+        op.create_table(
+            "price_refreshes",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("fetched_at", sa.DateTime(), nullable=False),
+            sa.Column("item_count", sa.Integer(), nullable=False),
+            sa.Column("digest", sa.String(length=64), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("price_refreshes")
+    op.drop_index("ix_necessities_prices_name", table_name="necessities_prices")
+    op.drop_index("ix_necessities_prices_category", table_name="necessities_prices")
+    op.drop_table("necessities_prices")
@@ -0,0 +1,46 @@
+"""add news_articles upvote_count
+
+Revision ID: a94f0b6d3e27
+Revises: 7c3d1e9a2f64
+Create Date: 2026-10-18 04:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a94f0b6d3e27'
+down_revision: Union[str, None] = '7c3d1e9a2f64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    # main.py runs create_all on import, so a fresh database may already have them
+    if "ix_user_news_upvotes_news_articles_id" not in {
+        i["name"] for i in inspector.get_indexes("user_news_upvotes")
+    }:
+        op.create_index(
+            "ix_user_news_upvotes_news_articles_id", "user_news_upvotes", ["news_articles_id"]
+        )
+    if "upvote_count" in {c["name"] for c in inspector.get_columns("news_articles")}:
+        return
+    op.add_column(
+        "news_articles",
+        sa.Column("upvote_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        "UPDATE news_articles SET upvote_count = ("
+        "SELECT count(*) FROM user_news_upvotes "
+        "WHERE user_news_upvotes.news_articles_id = news_articles.id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("news_articles") as batch_op:
+        batch_op.drop_column("upvote_count")
+    op.drop_index("ix_user_news_upvotes_news_articles_id", table_name="user_news_upvotes")
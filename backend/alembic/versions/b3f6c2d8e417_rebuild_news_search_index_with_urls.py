@@ -0,0 +1,37 @@
+"""rebuild news_articles_fts with the url of every entry
+
+Revision ID: b3f6c2d8e417
+Revises: d5e8a1f7c392
+Create Date: 2026-10-18 08:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f6c2d8e417'
+down_revision: Union[str, None] = 'd5e8a1f7c392'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # entries of the contentless index cannot be deleted, the table is
+    # recreated empty and refilled by main.run_search_index_sync on startup
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS news_articles_fts")
+        op.execute(
+            "CREATE VIRTUAL TABLE news_articles_fts "
+            "USING fts5(title, body, url UNINDEXED)"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS news_articles_fts")
+        op.execute(
+            "CREATE VIRTUAL TABLE news_articles_fts "
+            "USING fts5(title, body, content='')"
+        )
@@ -0,0 +1,61 @@
+"""store parsed price series
+
+Revision ID: c57e0a9f4d31
+Revises: 8d41e6b0c2a7
+Create Date: 2026-10-18 00:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c57e0a9f4d31'
+down_revision: Union[str, None] = '8d41e6b0c2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def create_necessities_prices(with_series):
+    columns = [
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("category", sa.String(), nullable=False),
+    ]
+    if with_series:
+        columns.append(sa.Column("item_no", sa.String(), nullable=False))
+    columns += [
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("data", sa.Text(), nullable=False),
+    ]
+    constraints = [sa.PrimaryKeyConstraint("id")]
+    if with_series:
+        columns += [
+            sa.Column("series", sa.LargeBinary(), nullable=False),
+            sa.Column("series_start", sa.Date(), nullable=False),
+            sa.Column("series_step_months", sa.Integer(), nullable=False),
+        ]
+        constraints.append(
+            sa.UniqueConstraint("category", "item_no", name="uq_necessities_prices_category_item_no")
+        )
+    op.create_table("necessities_prices", *columns, *constraints)
+    op.create_index("ix_necessities_prices_category", "necessities_prices", ["category"])
+    op.create_index("ix_necessities_prices_name", "necessities_prices", ["name"])
+
+
+def upgrade() -> None:
+    # necessities_prices only caches upstream data, so it is rebuilt rather
+    # than altered and refilled by the next refresh_necessities_prices run
+    columns = sa.inspect(op.get_bind()).get_columns("necessities_prices")
+    if "item_no" in {c["name"] for c in columns}:
+        return
+    op.drop_table("necessities_prices")
+    op.execute("DELETE FROM price_refreshes")
+    create_necessities_prices(with_series=True)
+
+
+def downgrade() -> None:
+    op.drop_table("necessities_prices")
+    op.execute("DELETE FROM price_refreshes")
+    create_necessities_prices(with_series=False)
@@ -0,0 +1,55 @@
+"""add scheduler_leases and ingest_runs
+
+Revision ID: d5e8a1f7c392
+Revises: a94f0b6d3e27
+Create Date: 2026-10-18 05:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8a1f7c392'
+down_revision: Union[str, None] = 'a94f0b6d3e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # main.py runs create_all on import, so a fresh database may already have them
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if "scheduler_leases" not in tables:
+        op.create_table(
+            "scheduler_leases",
+            sa.Column("name", sa.String(length=50), nullable=False),
+            sa.Column("holder", sa.String(length=100), nullable=False),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("name"),
+        )
+    if "ingest_runs" not in tables:
+        op.create_table(
+            "ingest_runs",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("trigger", sa.String(length=20), nullable=False),
+            sa.Column("holder", sa.String(length=100), nullable=False),
+            sa.Column("status", sa.String(length=20), nullable=False),
+            sa.Column("started_at", sa.DateTime(), nullable=False),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+            sa.Column("duration", sa.Float(), nullable=True),
+            sa.Column("new", sa.Integer(), nullable=False),
+            sa.Column("skipped", sa.Integer(), nullable=False),
+            sa.Column("irrelevant", sa.Integer(), nullable=False),
+            sa.Column("failed", sa.Integer(), nullable=False),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_ingest_runs_started_at", "ingest_runs", ["started_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ingest_runs_started_at", table_name="ingest_runs")
+    op.drop_table("ingest_runs")
+    op.drop_table("scheduler_leases")
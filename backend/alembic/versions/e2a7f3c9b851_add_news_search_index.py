@@ -0,0 +1,32 @@
+"""add news_articles_fts search index
+
+Revision ID: e2a7f3c9b851
+Revises: 5b9e2d7c4a16
+Create Date: 2026-10-18 02:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7f3c9b851'
+down_revision: Union[str, None] = '5b9e2d7c4a16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the index is filled by main.sync_news_search_index on the next startup,
+    # the tokenising lives in news_search and is not repeated here
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS news_articles_fts "
+            "USING fts5(title, body, content='')"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS news_articles_fts")
@@ -0,0 +1,121 @@
+"""
+Extraction of the parts of an udn article page the application uses.
+
+Only `h1.article-content__title`, `time.article-content__time` and the
+`<p>`s of `section.article-content__editor` are needed, so instead of
+building a BeautifulSoup tree of the whole page (navigation, related news,
+scripts) the page is streamed through the standard library HTML tokenizer,
+text is only collected inside those elements and tokenizing stops once the
+editor section is closed.
+
+Text follows BeautifulSoup's `.text`: entities decoded, whitespace kept,
+comments and script/style contents left out.
+"""
+from collections import namedtuple
+from html.parser import HTMLParser
+
+TITLE_CLASS = "article-content__title"
+TIME_CLASS = "article-content__time"
+EDITOR_CLASS = "article-content__editor"
+# paragraphs of related-news links at the end of an article
+RELATED_MARKER = "▪"
+
+ArticlePage = namedtuple("ArticlePage", "title time paragraphs")
+
+
+class _Done(Exception):
+    """everything needed has been read"""
+
+
+def has_class(attrs, name):
+    for key, value in attrs:
+        if key == "class" and value and name in value.split():
+            return True
+    return False
+
+
+class ArticleExtractor(HTMLParser):
+    """collect the title, time and editor paragraphs while tokenizing"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.time = None
+        self.paragraphs = None
+        # text being collected: [tag, depth of that tag, parts, where it goes]
+        self.capture = None
+        self.section_depth = 0
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self.skip_depth += 1
+            return
+        if self.capture is not None:
+            if tag == self.capture[0]:
+                self.capture[1] += 1
+        elif self.section_depth:
+            if tag == "p":
+                self.capture = ["p", 1, [], "paragraph"]
+        elif tag == "h1" and self.title is None and has_class(attrs, TITLE_CLASS):
+            self.capture = ["h1", 1, [], "title"]
+        elif tag == "time" and self.time is None and has_class(attrs, TIME_CLASS):
+            self.capture = ["time", 1, [], "time"]
+        if tag == "section" and (
+                self.section_depth or (self.paragraphs is None and has_class(attrs, EDITOR_CLASS))
+        ):
+            if not self.section_depth:
+                self.paragraphs = []
+            self.section_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.capture is not None and tag == self.capture[0]:
+            self.capture[1] -= 1
+            if not self.capture[1]:
+                self.finish_capture()
+        if tag == "section" and self.section_depth:
+            self.section_depth -= 1
+            if not self.section_depth:
+                if self.capture is not None:
+                    # an unclosed <p> ends with its section
+                    self.finish_capture()
+                if self.title is not None and self.time is not None:
+                    raise _Done
+
+    def handle_data(self, data):
+        if self.capture is not None and not self.skip_depth:
+            self.capture[2].append(data)
+
+    def finish_capture(self):
+        _, _, parts, target = self.capture
+        self.capture = None
+        text = "".join(parts)
+        if target == "title":
+            self.title = text
+        elif target == "time":
+            self.time = text
+        elif text.strip() and RELATED_MARKER not in text:
+            self.paragraphs.append(text)
+
+
+def extract_article(html):
+    """
+    :param html: article page
+    :return: ArticlePage, None when the page lacks the title, the time or
+        the editor section (video and gallery pages)
+    """
+    extractor = ArticleExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+        if extractor.capture is not None and extractor.section_depth:
+            # a page cut off inside the editor section keeps its last paragraph
+            extractor.finish_capture()
+    except _Done:
+        pass
+    if extractor.title is None or extractor.time is None or extractor.paragraphs is None:
+        return None
+    return ArticlePage(extractor.title, extractor.time, extractor.paragraphs)
@@ -0,0 +1,65 @@
+"""
+Engine setup for the news database.
+
+The URL decides the backend, so moving from the SQLite file to Postgres is a
+DATABASE_URL change. SQLite files are opened in WAL mode so the ingest and
+price refresh jobs can write while request threads keep reading, with a busy
+timeout instead of immediate "database is locked" errors and
+synchronous=NORMAL, which is durable across application crashes in WAL mode.
+"""
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+
+def is_sqlite_file(url):
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def sqlite_pragmas(journal_mode, busy_timeout_ms):
+    """connect listener applying the per-connection sqlite settings"""
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    return on_connect
+
+
+def create_database_engine(
+        url,
+        echo=False,
+        pool_size=10,
+        max_overflow=20,
+        busy_timeout_ms=5000,
+        journal_mode="WAL",
+):
+    """
+    :param url: SQLAlchemy database URL
+    :param echo: log every statement
+    :param pool_size: connections kept open, for file and server databases
+    :param max_overflow: extra connections opened under load
+    :param busy_timeout_ms: sqlite only, how long a writer waits for a lock
+    :param journal_mode: sqlite only, WAL unless testing the alternatives
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(
+            url, echo=echo, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True
+        )
+    if not is_sqlite_file(url):
+        # in-memory databases live in a single connection
+        return create_engine(url, echo=echo)
+    engine = create_engine(
+        url,
+        echo=echo,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        # pooled connections move between request and scheduler threads;
+        # the timeout is applied again by the busy_timeout pragma
+        connect_args={"check_same_thread": False, "timeout": busy_timeout_ms / 1000},
+    )
+    event.listen(engine, "connect", sqlite_pragmas(journal_mode, busy_timeout_ms))
+    return engine
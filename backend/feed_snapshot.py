@@ -0,0 +1,82 @@
+"""
+Pre-encoded pages of the anonymous news feed.
+
+Every anonymous reader gets the same page for the same query, so a page is
+queried and orjson encoded once and then served as bytes. Writers that
+change what the feed shows (the ingest writer, upvote toggles) bump a data
+generation, which makes every stored page stale at once without tracking
+which pages an article appears on.
+
+The generation lives in the process, writes made by other workers are only
+seen once a page outlives its TTL.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import orjson
+
+# items are the decoded page and must not be modified, body is its encoding
+FeedPage = namedtuple("FeedPage", "items body next_cursor")
+
+
+class FeedSnapshotCache:
+    """
+    :param ttl: seconds a page is served without a write in this process
+    :param max_pages: pages kept, least recently used ones are dropped beyond it
+    """
+
+    def __init__(self, ttl, max_pages, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self.clock = clock
+        self.generation = 0
+        self.pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, key):
+        """
+        :return: (FeedPage, None) on a hit, (None, generation to pass to
+            store) on a miss
+        """
+        with self.lock:
+            entry = self.pages.get(key)
+            if entry is not None and entry[0] == self.generation and entry[1] > self.clock():
+                self.pages.move_to_end(key)
+                self.hits += 1
+                return entry[2], None
+            self.misses += 1
+            return None, self.generation
+
+    def store(self, key, generation, items, next_cursor):
+        """
+        encode a page read at `generation`, kept only if nothing was written
+        since
+
+        :return: FeedPage
+        """
+        page = FeedPage(items, orjson.dumps(items), next_cursor)
+        with self.lock:
+            if generation == self.generation:
+                self.pages[key] = (generation, self.clock() + self.ttl, page)
+                self.pages.move_to_end(key)
+                while len(self.pages) > self.max_pages:
+                    self.pages.popitem(last=False)
+        return page
+
+    def bump(self):
+        """mark every stored page stale after a write"""
+        with self.lock:
+            self.generation += 1
+            self.pages.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "pages": len(self.pages),
+            }
@@ -1,25 +1,52 @@
+import asyncio
+import base64
+import contextvars
+import hashlib
 import json
+import orjson
 import sentry_sdk
+from sentry_sdk.integrations.fastapi import FastApiIntegration
+from sentry_sdk.integrations.httpx import HttpxIntegration
+from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
+from sentry_sdk.integrations.starlette import StarletteIntegration
 from apscheduler.schedulers.background import BackgroundScheduler
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import itertools
-from sqlalchemy import delete, insert, select
-from sqlalchemy.orm import Session, sessionmaker
+import math
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, namedtuple
+from sqlalchemy import delete, func, literal, select, tuple_, update
+from sqlalchemy.orm import Session, load_only, sessionmaker
 from typing import List, Optional
 import requests
-from fastapi import APIRouter, HTTPException, Query, Depends, status, FastAPI
+from fastapi import APIRouter, HTTPException, Header, Query, Depends, status, FastAPI, Response
 import os
-from datetime import datetime, timedelta
+import socket
+import threading
+import time
+import uuid
+import unicodedata
+from datetime import date, datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from pydantic import BaseModel, Field, AnyHttpUrl
-from sqlalchemy import (Column, ForeignKey, Integer, String, Table, Text,
-                        create_engine)
+from sqlalchemy import (DDL, Column, Date, DateTime, Float, ForeignKey, Index, Integer, LargeBinary,
+                        String, Table, Text, UniqueConstraint,
+                        event)
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
+from database import create_database_engine
+from metrics import Registry
+from feed_snapshot import FeedSnapshotCache
+import article_html
+import news_search
+from ttl_cache import SQLiteCacheStore, TTLCache
+
 Base = declarative_base()
 
 
@@ -30,6 +57,8 @@ user_news_association_table = Table(
     Column(
         "news_articles_id", Integer, ForeignKey("news_articles.id"), primary_key=True
     ),
+    # upvotes per article, the primary key only covers lookups by user
+    Index("ix_user_news_upvotes_news_articles_id", "news_articles_id"),
 )
 
 # from pydantic import BaseModel
@@ -47,30 +76,173 @@ class User(Base):
     )
 
 
+# udn display times, e.g. "2024-08-01 12:34"
+PUBLISHED_AT_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y-%m-%d")
+
+
+def parse_published_at(value):
+    """
+    parse a udn display time, articles with an unreadable time count as
+    published now
+
+    :param value: NewsArticle.time
+    :return: naive local datetime
+    """
+    for fmt in PUBLISHED_AT_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return datetime.now().replace(microsecond=0)
+
+
+def default_published_at(context):
+    return parse_published_at(context.get_current_parameters()["time"])
+
+
 class NewsArticle(Base):
     __tablename__ = "news_articles"
     id = Column(Integer, primary_key=True, autoincrement=True)
     url = Column(String, unique=True, nullable=False)
     title = Column(String, nullable=False)
     time = Column(String, nullable=False)
+    # parsed `time`, filled from it unless given
+    published_at = Column(DateTime, nullable=False, default=default_published_at)
     content = Column(Text, nullable=False)
     summary = Column(Text, nullable=False)
     reason = Column(Text, nullable=False)
+    # sha256 of the normalised content, see content_hash
+    content_hash = Column(String(64), index=True)
+    # rows in user_news_upvotes for this article, kept by toggle_upvote and
+    # rebuilt by repair_upvote_counts
+    upvote_count = Column(Integer, nullable=False, default=0, server_default="0")
     upvoted_by_users = relationship(
         "User", secondary=user_news_association_table, back_populates="upvoted_news"
     )
 
+    __table_args__ = (
+        # backs the (published_at, id) keyset pagination and date ranges of the news feeds
+        Index("ix_news_articles_published_at_id", "published_at", "id"),
+    )
+
+
+class NecessityPrice(Base):
+    """latest snapshot of the opendata NecessitiesPrice dataset"""
+    __tablename__ = "necessities_prices"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    category = Column(String, nullable=False, index=True)
+    # upstream 編號, unique within a category
+    item_no = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True)
+    # upstream item plus our id, kept as json so responses are assembled without re-encoding
+    data = Column(Text, nullable=False)
+    # 統計值 parsed into float32 monthly prices, see price_series
+    series = Column(LargeBinary, nullable=False)
+    series_start = Column(Date, nullable=False)
+    series_step_months = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("category", "item_no", name="uq_necessities_prices_category_item_no"),
+    )
+
+
+class PriceRefresh(Base):
+    """history of necessities price refreshes"""
+    __tablename__ = "price_refreshes"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fetched_at = Column(DateTime, nullable=False)
+    item_count = Column(Integer, nullable=False)
+    digest = Column(String(64), nullable=False)
+
+
+class SummaryCacheEntry(Base):
+    """LLM summaries of content that is not a stored article"""
+    __tablename__ = "summary_cache"
+    content_hash = Column(String(64), primary_key=True)
+    summary = Column(Text, nullable=False)
+    reason = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
 
-engine = create_engine("sqlite:///news_database.db", echo=True)
+class SchedulerLease(Base):
+    """named lock held by one process at a time, until expires_at unless renewed"""
+    __tablename__ = "scheduler_leases"
+    name = Column(String(50), primary_key=True)
+    # token of the holder, see acquire_lease
+    holder = Column(String(100), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class IngestRun(Base):
+    """history of ingest cycles, one row per run_ingest call that got the lease"""
+    __tablename__ = "ingest_runs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # scheduled, manual or initial
+    trigger = Column(String(20), nullable=False)
+    holder = Column(String(100), nullable=False)
+    # running, succeeded or failed
+    status = Column(String(20), nullable=False)
+    started_at = Column(DateTime, nullable=False, index=True)
+    finished_at = Column(DateTime)
+    duration = Column(Float)
+    new = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    irrelevant = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///news_database.db")
+DATABASE_ECHO = os.environ.get("DATABASE_ECHO", "false").lower() == "true"
+DATABASE_POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", "10"))
+DATABASE_MAX_OVERFLOW = int(os.environ.get("DATABASE_MAX_OVERFLOW", "20"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+
+engine = create_database_engine(
+    DATABASE_URL,
+    echo=DATABASE_ECHO,
+    pool_size=DATABASE_POOL_SIZE,
+    max_overflow=DATABASE_MAX_OVERFLOW,
+    busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS,
+    journal_mode=SQLITE_JOURNAL_MODE,
+)
+
+# the FTS5 search index is a virtual table outside the metadata, created
+# alongside it so every create_all (tests included) gets one
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL(news_search.CREATE_INDEX).execute_if(dialect="sqlite"),
+)
 
 Base.metadata.create_all(engine)
 
 Session = sessionmaker(bind=engine)
 
+# an empty SENTRY_DSN turns Sentry off
+SENTRY_DSN = os.environ.get(
+    "SENTRY_DSN",
+    "https://4001ffe917ccb261aa0e0c34026dc343@o4505702629834752.ingest.us.sentry.io/4507694792704000",
+)
+# share of requests traced; latency and query counts of every request are in /metrics
+SENTRY_TRACES_SAMPLE_RATE = float(os.environ.get("SENTRY_TRACES_SAMPLE_RATE", "0.1"))
+# the profiler samples every thread continuously, enable it when investigating
+SENTRY_PROFILES_SAMPLE_RATE = float(os.environ.get("SENTRY_PROFILES_SAMPLE_RATE", "0"))
+
 sentry_sdk.init(
-    dsn="https://4001ffe917ccb261aa0e0c34026dc343@o4505702629834752.ingest.us.sentry.io/4507694792704000",
-    traces_sample_rate=1.0,
-    profiles_sample_rate=1.0,
+    dsn=SENTRY_DSN or None,
+    traces_sample_rate=SENTRY_TRACES_SAMPLE_RATE,
+    profiles_sample_rate=SENTRY_PROFILES_SAMPLE_RATE,
+    # listed instead of auto-enabled, the openai integration would import
+    # openai at startup
+    auto_enabling_integrations=False,
+    integrations=[
+        StarletteIntegration(),
+        FastApiIntegration(),
+        HttpxIntegration(),
+        SqlalchemyIntegration(),
+    ],
 )
 
 app = FastAPI()
@@ -83,10 +255,99 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+
+metrics_registry = Registry()
+request_duration = metrics_registry.histogram(
+    "http_request_duration_seconds",
+    "Time to answer a request, by route template and status.",
+    ["method", "route", "status"],
+)
+request_sql_queries = metrics_registry.histogram(
+    "http_request_sql_queries",
+    "SQL statements executed while answering a request.",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
 )
+upstream_duration = metrics_registry.histogram(
+    "upstream_request_duration_seconds",
+    "Time until an upstream service answered with response headers.",
+    ["host"],
+)
+upstream_requests = metrics_registry.counter(
+    "upstream_requests_total",
+    "Calls to upstream services by status class, error when no response came back.",
+    ["host", "outcome"],
+)
+ingest_stage_duration = metrics_registry.histogram(
+    "ingest_stage_duration_seconds",
+    "Time spent in each ingest stage; article and summary stages are timed per article.",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+# SQL statement counter of the request being answered, see RequestMetricsMiddleware
+current_sql_queries = contextvars.ContextVar("current_sql_queries", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_sql_statement(conn, cursor, statement, parameters, context, executemany):
+    queries = current_sql_queries.get()
+    if queries is not None:
+        queries[0] += 1
+
+
+# endpoint -> path template, filled on first use once every route is declared
+route_paths = {}
+
+
+def route_label(scope):
+    """path template of the matched route, so ids in urls don't become label values"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if endpoint not in route_paths:
+        route_paths.update(
+            (route.endpoint, route.path) for route in app.routes if hasattr(route, "endpoint")
+        )
+    return route_paths.get(endpoint, "unmatched")
+
+
+class RequestMetricsMiddleware:
+    """record the latency and SQL statement count of every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = current_sql_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_sql_queries.reset(token)
+            route = route_label(scope)
+            request_duration.labels(scope["method"], route, status_code[0]).observe(elapsed)
+            request_sql_queries.labels(scope["method"], route).observe(queries[0])
+
+
+app.add_middleware(RequestMetricsMiddleware)
 
 import os
-from openai import OpenAI
+import httpx
 
 
 # def generate_summary(content):
@@ -121,10 +382,81 @@ from openai import OpenAI
 #     return completion.choices[0].message.content
 
 
-from urllib.parse import quote
+from urllib.parse import quote, urlsplit
 import requests
-from bs4 import BeautifulSoup
-from sqlalchemy.orm import Session
+
+
+def insert_ignoring_conflicts(table, dialect_name, index_elements=("url",)):
+    """INSERT ... ON CONFLICT DO NOTHING for the dialects we run on"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table).on_conflict_do_nothing(index_elements=list(index_elements))
+
+
+def normalise_text(text):
+    """NFKC, casefolded, whitespace runs collapsed to one space"""
+    return " ".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+def content_hash(content):
+    """key of stored summaries, equal for texts differing only in normalisation"""
+    return hashlib.sha256(normalise_text(content).encode("utf-8")).hexdigest()
+
+
+def add_news(news_data_list, session_factory=Session):
+    """
+    add news to db in a single transaction, skipping urls already stored
+    :param news_data_list: news info
+    :param session_factory:
+    :return: (inserted, skipped)
+    """
+    rows = [
+        {
+            "url": news_data["url"],
+            "title": news_data["title"],
+            "time": news_data["time"],
+            "content": " ".join(news_data["content"]),  # 將內容list轉換為字串
+            "summary": news_data["summary"],
+            "reason": news_data["reason"],
+        }
+        for news_data in news_data_list
+    ]
+    for row in rows:
+        row["content_hash"] = content_hash(row["content"])
+    if not rows:
+        return 0, 0
+    session = session_factory()
+    try:
+        stmt = insert_ignoring_conflicts(
+            NewsArticle.__table__, session.get_bind().dialect.name
+        )
+        inserted = session.execute(stmt, rows).rowcount
+        if inserted and session.get_bind().dialect.name == "sqlite":
+            news_search.index_urls(session.connection(), [row["url"] for row in rows])
+        session.commit()
+    finally:
+        session.close()
+    if inserted:
+        feed_snapshots.bump()
+    return inserted, len(rows) - inserted
+
+
+def sync_news_search_index(session_factory=Session):
+    """
+    index articles written outside add_news, e.g. before the index existed,
+    and drop entries of deleted articles; run it under the ingest lease
+    """
+    session = session_factory()
+    try:
+        if session.get_bind().dialect.name != "sqlite":
+            return 0
+        indexed = news_search.sync_index(session.connection())
+        session.commit()
+    finally:
+        session.close()
+    return indexed
 
 
 def add_new(news_data):
@@ -133,133 +465,737 @@ def add_new(news_data):
     :param news_data: news info
     :return:
     """
-    session = Session()
-    session.add(NewsArticle(
-        url=news_data["url"],
-        title=news_data["title"],
-        time=news_data["time"],
-        content=" ".join(news_data["content"]),  # 將內容list轉換為字串
-        summary=news_data["summary"],
-        reason=news_data["reason"],
-    ))
-    session.commit()
-    session.close()
+    add_news([news_data])
+
+
+UDN_BASE_URL = os.environ.get("UDN_BASE_URL", "https://udn.com")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL")
+# in-flight requests allowed to each upstream host during an ingest cycle
+INGEST_HOST_CONCURRENCY = int(os.environ.get("INGEST_HOST_CONCURRENCY", "4"))
+INGEST_LLM_CONCURRENCY = int(os.environ.get("INGEST_LLM_CONCURRENCY", "4"))
+INGEST_RETRIES = int(os.environ.get("INGEST_RETRIES", "2"))
+INGEST_RETRY_BACKOFF = 0.5
+# per-stage timeouts in seconds
+INGEST_LIST_TIMEOUT = 10.0
+INGEST_ARTICLE_TIMEOUT = 10.0
+INGEST_LLM_TIMEOUT = 30.0
+# titles graded per relevance request
+RELEVANCE_BATCH_SIZE = int(os.environ.get("RELEVANCE_BATCH_SIZE", "50"))
+RELEVANCE_CACHE_SIZE = 10000
+# urls of stored articles remembered in memory before asking the database
+KNOWN_URL_CACHE_SIZE = 10000
+
+# threads parsing article html off the event loop
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", "4"))
+SEARCH_TIMEOUT = 10.0
+# articles a search fetches at once, and seconds it waits for them before
+# answering with whatever has been parsed
+SEARCH_FANOUT = int(os.environ.get("SEARCH_FANOUT", "8"))
+SEARCH_ARTICLE_BUDGET = float(os.environ.get("SEARCH_ARTICLE_BUDGET", "8"))
+# search caches: prompt -> keywords and keywords -> parsed articles, kept in
+# memory and, when SEARCH_CACHE_DB names an sqlite file, persisted there too
+SEARCH_KEYWORD_TTL = int(os.environ.get("SEARCH_KEYWORD_TTL", "86400"))
+SEARCH_ARTICLE_TTL = int(os.environ.get("SEARCH_ARTICLE_TTL", "600"))
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+SEARCH_CACHE_DB = os.environ.get("SEARCH_CACHE_DB")
+
+RELEVANCE_PROMPT = "你是一個關聯度評估機器人，請評估每則新聞標題是否與「民生用品的價格變化」相關，並給予'high'、'medium'、'low'評價。用戶會以json格式輸入 {'編號': '標題'}，請以json格式回答 {'編號': 'high'、'medium'或'low'}"
+RELEVANCE_GRADES = ("high", "medium", "low")
+SUMMARY_PROMPT = "你是一個新聞摘要生成機器人，請統整新聞中提及的影響及主要原因 (影響、原因各50個字，請以json格式回答 {'影響': '...', '原因': '...'})"
+
+
+parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="html-parse")
 
 
-def get_new_info(search_term, is_initial=False):
+async def parse_in_worker(func, *args):
+    """run CPU-bound parsing on parse_executor instead of the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(parse_executor, func, *args)
+
+
+def upstream_outcome(status_code):
+    return f"{status_code // 100}xx"
+
+
+def observe_upstream(host, seconds, outcome):
+    upstream_duration.labels(host).observe(seconds)
+    upstream_requests.labels(host, outcome).inc()
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport recording latency and outcome of every call per host,
+    keyword arguments go to httpx.AsyncHTTPTransport (a client ignores its
+    own `limits` once it is given a transport)
     """
-    get new
 
-    :param search_term:
-    :param is_initial:
-    :return:
+    def __init__(self, **kwargs):
+        self.transport = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request):
+        start = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            observe_upstream(request.url.host, time.perf_counter() - start, "error")
+            raise
+        observe_upstream(
+            request.url.host, time.perf_counter() - start, upstream_outcome(response.status_code)
+        )
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+# clients shared by the request handlers, see get_http_client / get_llm_client
+shared_clients = {}
+SHARED_CLIENT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+
+def get_http_client():
+    """pooled httpx client for request handlers, created on first use"""
+    if "http" not in shared_clients:
+        shared_clients["http"] = httpx.AsyncClient(
+            transport=MeteredTransport(limits=SHARED_CLIENT_LIMITS),
+            timeout=SEARCH_TIMEOUT,
+            follow_redirects=True,
+        )
+    return shared_clients["http"]
+
+
+def new_llm_client():
+    """AsyncOpenAI client, the openai package is imported on first use"""
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    return AsyncOpenAI(
+        api_key="xxx",
+        base_url=OPENAI_BASE_URL,
+        timeout=INGEST_LLM_TIMEOUT,
+        max_retries=INGEST_RETRIES,
+        http_client=DefaultAsyncHttpxClient(
+            transport=MeteredTransport(limits=SHARED_CLIENT_LIMITS)
+        ),
+    )
+
+
+def get_llm_client():
+    """AsyncOpenAI client for request handlers, created on first use"""
+    if "llm" not in shared_clients:
+        shared_clients["llm"] = new_llm_client()
+    return shared_clients["llm"]
+
+
+async def close_shared_clients():
+    if "http" in shared_clients:
+        await shared_clients.pop("http").aclose()
+    if "llm" in shared_clients:
+        await shared_clients.pop("llm").close()
+
+
+class HostLimiter:
+    """bound the number of concurrent requests sent to each host"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.semaphores = {}
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(self.limit)
+        return self.semaphores[host]
+
+
+async def fetch_with_retries(client, limiter, url, timeout, **kwargs):
     """
-    all_news_data = []
-    # iterate pages to get more news data, not actually get all news data
-    if is_initial:
-        a = []
-        for p in range(1, 10):
-            p2 = {
-                "page": p,
-                "id": f"search:{quote(search_term)}",
-                "channelId": 2,
-                "type": "searchword",
-            }
-            response = requests.get("https://udn.com/api/more", params=p2)
-            a.append(response.json()["lists"])
-
-        for l in a:
-            all_news_data.append(l)
-    else:
-        p = {
-            "page": 1,
+    GET `url`, retrying transport errors and 5xx responses with backoff
+
+    :param client: httpx.AsyncClient
+    :param limiter: HostLimiter
+    :param url:
+    :param timeout: timeout of a single attempt
+    :return: httpx.Response
+    """
+    for attempt in range(INGEST_RETRIES + 1):
+        try:
+            async with limiter(url):
+                response = await client.get(url, timeout=timeout, **kwargs)
+            response.raise_for_status()
+            return response
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code < 500 or attempt == INGEST_RETRIES:
+                raise
+        except httpx.TransportError:
+            if attempt == INGEST_RETRIES:
+                raise
+        await asyncio.sleep(INGEST_RETRY_BACKOFF * 2 ** attempt)
+
+
+async def fetch_news_list(client, limiter, search_term, page):
+    response = await fetch_with_retries(
+        client,
+        limiter,
+        f"{UDN_BASE_URL}/api/more",
+        INGEST_LIST_TIMEOUT,
+        params={
+            "page": page,
             "id": f"search:{quote(search_term)}",
             "channelId": 2,
             "type": "searchword",
-        }
-        response = requests.get("https://udn.com/api/more", params=p)
+        },
+    )
+    return response.json()["lists"]
 
-        all_news_data = response.json()["lists"]
-    return all_news_data
 
-def get_new(is_initial=False):
+async def async_get_new_info(client, limiter, search_term, is_initial=False):
     """
-    get new info
+    get new, fetching all list pages concurrently
 
+    :param client: httpx.AsyncClient
+    :param limiter: HostLimiter
+    :param search_term:
     :param is_initial:
     :return:
     """
-    news_data = get_new_info("價格", is_initial=is_initial)
-    for news in news_data:
-        title = news["title"]
+    pages = range(1, 10) if is_initial else [1]
+    lists = await asyncio.gather(
+        *(fetch_news_list(client, limiter, search_term, p) for p in pages)
+    )
+    return [news for l in lists for news in l]
+
+
+def parse_news_article(url, html):
+    """
+    parse an udn article page
+
+    :param url:
+    :param html:
+    :return: news info with content as list of paragraphs, None if the page
+        has no article text
+    """
+    page = article_html.extract_article(html)
+    if page is None:
+        return None
+    return {
+        "url": url,
+        "title": page.title,
+        "time": page.time,
+        "content": page.paragraphs,
+    }
+
+
+class OpenAIRelevanceBackend:
+    """grade a batch of titles with a single chat completion"""
+
+    async def __call__(self, titles, llm):
+        numbered = {str(i): title for i, title in enumerate(titles, 1)}
         m = [
-            {
-                "role": "system",
-                "content": "你是一個關聯度評估機器人，請評估新聞標題是否與「民生用品的價格變化」相關，並給予'high'、'medium'、'low'評價。(僅需回答'high'、'medium'、'low'三個詞之一)",
-            },
-            {"role": "user", "content": f"{title}"},
+            {"role": "system", "content": RELEVANCE_PROMPT},
+            {"role": "user", "content": json.dumps(numbered, ensure_ascii=False)},
         ]
-        ai = OpenAI(api_key="xxx").chat.completions.create(
+        completion = await llm.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=m,
+            response_format={"type": "json_object"},
+        )
+        grades = json.loads(completion.choices[0].message.content)
+        return {title: grades.get(i) for i, title in numbered.items()}
+
+
+class RelevanceClassifier:
+    """
+    grade news titles in batches, remembering every grade by title hash so
+    a headline is only sent to the backend once
+
+    :param backend: async callable taking a list of titles, plus the extra
+        arguments given to grade(), and returning a dict of title -> grade
+    """
+
+    def __init__(self, backend, batch_size=RELEVANCE_BATCH_SIZE, max_entries=RELEVANCE_CACHE_SIZE):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self.grades = OrderedDict()
+
+    @staticmethod
+    def title_key(title):
+        return hashlib.sha256(title.strip().encode("utf-8")).hexdigest()
+
+    def cached(self, title):
+        key = self.title_key(title)
+        if key in self.grades:
+            self.grades.move_to_end(key)
+            return self.grades[key]
+        return None
+
+    def remember(self, title, grade):
+        self.grades[self.title_key(title)] = grade
+        if len(self.grades) > self.max_entries:
+            self.grades.popitem(last=False)
+
+    async def grade(self, titles, *backend_args):
+        """
+        grade titles, only sending unseen ones to the backend
+
+        :param titles:
+        :param backend_args: passed on to the backend, e.g. the cycle's AsyncOpenAI
+        :return: dict of title -> 'high', 'medium' or 'low', None for titles
+            whose batch failed
+        """
+        pending = list(dict.fromkeys(t for t in titles if self.cached(t) is None))
+        batches = [
+            pending[i:i + self.batch_size]
+            for i in range(0, len(pending), self.batch_size)
+        ]
+        results = await asyncio.gather(
+            *(self.backend(batch, *backend_args) for batch in batches), return_exceptions=True
         )
-        relevance = ai.choices[0].message.content
-        if relevance == "high":
-            response = requests.get(news["titleLink"])
-            soup = BeautifulSoup(response.text, "html.parser")
-            # 標題
-            title = soup.find("h1", class_="article-content__title").text
-            time = soup.find("time", class_="article-content__time").text
-            # 定位到包含文章内容的 <section>
-            content_section = soup.find("section", class_="article-content__editor")
-
-            paragraphs = [
-                p.text
-                for p in content_section.find_all("p")
-                if p.text.strip() != "" and "▪" not in p.text
-            ]
-            detailed_news =  {
-                "url": news["titleLink"],
-                "title": title,
-                "time": time,
-                "content": paragraphs,
-            }
-            m = [
-                {
-                    "role": "system",
-                    "content": "你是一個新聞摘要生成機器人，請統整新聞中提及的影響及主要原因 (影響、原因各50個字，請以json格式回答 {'影響': '...', '原因': '...'})",
-                },
-                {"role": "user", "content": " ".join(detailed_news["content"])},
-            ]
-
-            completion = OpenAI(api_key="xxx").chat.completions.create(
+        failed = set()
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                print(result)
+                failed.update(batch)
+                continue
+            for title, grade in result.items():
+                # unknown answers are not remembered so they are graded again next cycle
+                if grade in RELEVANCE_GRADES:
+                    self.remember(title, grade)
+        return {
+            title: self.cached(title) or (None if title in failed else "low")
+            for title in titles
+        }
+
+
+relevance_classifier = RelevanceClassifier(OpenAIRelevanceBackend())
+
+
+async def summarise_news(llm, semaphore, content):
+    m = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": content},
+    ]
+    async with semaphore:
+        with ingest_stage_duration.labels("summary").time():
+            completion = await llm.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=m,
             )
-            result = completion.choices[0].message.content
-            result = json.loads(result)
-            detailed_news["summary"] = result["影響"]
-            detailed_news["reason"] = result["原因"]
-            add_new(detailed_news)
+    return json.loads(completion.choices[0].message.content)
+
+
+async def process_news(client, limiter, llm, llm_semaphore, news):
+    """
+    fetch and summarise one relevant news list entry
+
+    :return: news info ready for add_new, None if the page has no article text
+    """
+    with ingest_stage_duration.labels("article_fetch").time():
+        response = await fetch_with_retries(
+            client, limiter, news["titleLink"], INGEST_ARTICLE_TIMEOUT
+        )
+    with ingest_stage_duration.labels("article_parse").time():
+        detailed_news = await parse_in_worker(
+            parse_news_article, news["titleLink"], response.text
+        )
+    if detailed_news is None:
+        return None
+    result = await summarise_news(
+        llm, llm_semaphore, " ".join(detailed_news["content"])
+    )
+    detailed_news["summary"] = result["影響"]
+    detailed_news["reason"] = result["原因"]
+    return detailed_news
+
+
+class IngestStats:
+    """per-cycle counters of the ingest pipeline"""
+
+    def __init__(self):
+        self.skipped = 0
+        self.irrelevant = 0
+        self.new = 0
+        self.failed = 0
+
+    def __repr__(self):
+        return (
+            f"IngestStats(skipped={self.skipped}, irrelevant={self.irrelevant}, "
+            f"new={self.new}, failed={self.failed})"
+        )
+
+
+class RecentUrls:
+    """LRU set of article urls already stored in news_articles"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.urls = OrderedDict()
+
+    def __contains__(self, url):
+        if url in self.urls:
+            self.urls.move_to_end(url)
+            return True
+        return False
+
+    def add(self, url):
+        self.urls[url] = None
+        self.urls.move_to_end(url)
+        if len(self.urls) > self.max_entries:
+            self.urls.popitem(last=False)
+
+
+known_news_urls = RecentUrls(KNOWN_URL_CACHE_SIZE)
+
+
+def stored_news_urls(urls, session_factory=Session):
+    """
+    find which urls are already in news_articles with a single IN query
+
+    :param urls:
+    :param session_factory:
+    :return: set of stored urls
+    """
+    if not urls:
+        return set()
+    session = session_factory()
+    try:
+        return set(
+            session.scalars(select(NewsArticle.url).where(NewsArticle.url.in_(urls)))
+        )
+    finally:
+        session.close()
+
+
+async def filter_new_news(news_data, stats, session_factory=Session):
+    """
+    drop list entries whose article is already stored, before any article
+    fetch or LLM call is spent on them
+
+    :param news_data: udn list entries
+    :param stats: IngestStats, skipped entries are counted on it
+    :param session_factory:
+    :return: entries not stored yet, each url at most once
+    """
+    candidates = {}
+    for news in news_data:
+        if news["titleLink"] not in known_news_urls:
+            candidates.setdefault(news["titleLink"], news)
+    stored = await asyncio.to_thread(
+        stored_news_urls, list(candidates), session_factory
+    )
+    for url in stored:
+        known_news_urls.add(url)
+    fresh = [news for url, news in candidates.items() if url not in stored]
+    stats.skipped += len(news_data) - len(fresh)
+    return fresh
+
+
+async def ingest_news(is_initial=False, stats=None, session_factory=Session):
+    """
+    run the scrape / dedup / grade / summarise pipeline, relevance is graded
+    in batches and the remaining stages run concurrently for each entry
+
+    :param is_initial: crawl the first 9 list pages instead of 1
+    :param stats: IngestStats to count skipped, irrelevant and failed entries on
+    :param session_factory: sessions used to look up stored urls
+    :return: news info for add_news, in list order
+    """
+    stats = stats if stats is not None else IngestStats()
+    limiter = HostLimiter(INGEST_HOST_CONCURRENCY)
+    llm_semaphore = asyncio.Semaphore(INGEST_LLM_CONCURRENCY)
+    limits = httpx.Limits(
+        max_connections=INGEST_HOST_CONCURRENCY * 4,
+        max_keepalive_connections=INGEST_HOST_CONCURRENCY * 2,
+    )
+    client = httpx.AsyncClient(transport=MeteredTransport(limits=limits), follow_redirects=True)
+    async with client, new_llm_client() as llm:
+        with ingest_stage_duration.labels("list").time():
+            news_data = await async_get_new_info(
+                client, limiter, "價格", is_initial=is_initial
+            )
+        with ingest_stage_duration.labels("dedup").time():
+            news_data = await filter_new_news(news_data, stats, session_factory)
+        with ingest_stage_duration.labels("relevance").time():
+            relevance = await relevance_classifier.grade([n["title"] for n in news_data], llm)
+        # a batch the LLM failed to grade is a failure, not off-topic news
+        stats.failed += sum(relevance[n["title"]] is None for n in news_data)
+        stats.irrelevant += sum(relevance[n["title"]] in ("low", "medium") for n in news_data)
+        news_data = [n for n in news_data if relevance[n["title"]] == "high"]
+        results = await asyncio.gather(
+            *(process_news(client, limiter, llm, llm_semaphore, news) for news in news_data),
+            return_exceptions=True,
+        )
+    detailed_news_list = []
+    for news, result in zip(news_data, results):
+        if isinstance(result, Exception):
+            stats.failed += 1
+            print(news.get("titleLink"), result)
+        elif result is None:
+            stats.skipped += 1
+            print(news.get("titleLink"), "no article text")
+        else:
+            detailed_news_list.append(result)
+    return detailed_news_list
+
+
+def get_new(is_initial=False):
+    """
+    get new info
+
+    :param is_initial:
+    :return: IngestStats of this cycle
+    """
+    stats = IngestStats()
+    detailed_news_list = asyncio.run(ingest_news(is_initial=is_initial, stats=stats))
+    try:
+        with ingest_stage_duration.labels("db_write").time():
+            inserted, skipped = add_news(detailed_news_list)
+    except Exception as e:
+        stats.failed += len(detailed_news_list)
+        print(e)
+    else:
+        stats.new += inserted
+        stats.skipped += skipped
+        for detailed_news in detailed_news_list:
+            known_news_urls.add(detailed_news["url"])
+    print(stats)
+    return stats
+
+
+INGEST_INTERVAL_MINUTES = int(os.environ.get("INGEST_INTERVAL_MINUTES", "100"))
+# random delay added to every interval so workers started together drift apart
+INGEST_JITTER_SECONDS = int(os.environ.get("INGEST_JITTER_SECONDS", "300"))
+# a crashed holder blocks ingest for at most this long, live holders renew
+INGEST_LEASE_SECONDS = int(os.environ.get("INGEST_LEASE_SECONDS", "600"))
+INGEST_LEASE = "ingest"
+# users allowed to start an ingest by hand, comma separated; empty turns
+# POST /api/v1/ingest/runs off for everyone
+INGEST_OPERATORS = {
+    name.strip() for name in os.environ.get("INGEST_OPERATORS", "").split(",") if name.strip()
+}
+# a manual ingest takes this lease and leaves it to expire, so across all
+# workers at most one is started per cooldown
+MANUAL_INGEST_LEASE = "ingest-manual"
+MANUAL_INGEST_COOLDOWN_SECONDS = int(os.environ.get("MANUAL_INGEST_COOLDOWN_SECONDS", "900"))
+# identifies this process in lease tokens and ingest_runs
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(name, seconds, session_factory=Session):
+    """
+    take the lease if it is free or expired, in one conditional upsert so
+    only one process can win
+
+    :return: holder token, None if the lease is held
+    """
+    token = f"{PROCESS_ID}:{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow()
+    session = session_factory()
+    try:
+        if session.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(SchedulerLease).values(
+            name=name, holder=token, expires_at=now + timedelta(seconds=seconds)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"holder": stmt.excluded.holder, "expires_at": stmt.excluded.expires_at},
+            where=SchedulerLease.expires_at <= now,
+        )
+        acquired = session.execute(stmt).rowcount
+        session.commit()
+    finally:
+        session.close()
+    return token if acquired else None
+
+
+def renew_lease(name, token, seconds, session_factory=Session):
+    """:return: False if the lease was lost to another holder"""
+    session = session_factory()
+    try:
+        renewed = session.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == name, SchedulerLease.holder == token)
+            .values(expires_at=datetime.utcnow() + timedelta(seconds=seconds))
+        ).rowcount
+        session.commit()
+    finally:
+        session.close()
+    return bool(renewed)
+
+
+def release_lease(name, token, session_factory=Session):
+    session = session_factory()
+    try:
+        session.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == name, SchedulerLease.holder == token)
+            .values(expires_at=datetime.utcnow())
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def keep_lease(stop, name, token, seconds, session_factory=Session):
+    """renew the lease every third of its length until `stop` is set"""
+    while not stop.wait(seconds / 3):
+        if not renew_lease(name, token, seconds, session_factory):
+            print(f"lost lease {name}")
+            return
+
+
+def run_ingest(trigger="scheduled", session_factory=Session):
+    """
+    run one ingest cycle if no other process or thread is running one,
+    recording it in ingest_runs
+
+    :param trigger: scheduled, manual or initial
+    :param session_factory:
+    :return: IngestRun, None if the lease is held elsewhere
+    """
+    token = acquire_lease(INGEST_LEASE, INGEST_LEASE_SECONDS, session_factory)
+    if token is None:
+        return None
+    stop = threading.Event()
+    keeper = threading.Thread(
+        target=keep_lease,
+        args=(stop, INGEST_LEASE, token, INGEST_LEASE_SECONDS, session_factory),
+        daemon=True,
+    )
+    keeper.start()
+    session = session_factory()
+    try:
+        run = IngestRun(
+            trigger=trigger, holder=token, status="running", started_at=datetime.utcnow()
+        )
+        session.add(run)
+        session.commit()
+        start = time.perf_counter()
+        try:
+            # under the lease, so it never races add_news for the write lock
+            sync_news_search_index(session_factory)
+            stats = get_new()
+        except Exception as e:
+            print(e)
+            run.status, run.error = "failed", repr(e)
+        else:
+            run.status = "succeeded"
+            run.new, run.skipped = stats.new, stats.skipped
+            run.irrelevant, run.failed = stats.irrelevant, stats.failed
+        run.duration = time.perf_counter() - start
+        run.finished_at = datetime.utcnow()
+        session.commit()
+        session.refresh(run)
+        session.expunge(run)
+    finally:
+        session.close()
+        stop.set()
+        keeper.join()
+        release_lease(INGEST_LEASE, token, session_factory)
+    return run
+
+
+def run_search_index_sync(session_factory=Session):
+    """
+    sync the search index under the ingest lease
+
+    :return: articles indexed, None if an ingest cycle holds the lease, it
+        syncs the index before crawling
+    """
+    token = acquire_lease(INGEST_LEASE, INGEST_LEASE_SECONDS, session_factory)
+    if token is None:
+        return None
+    try:
+        return sync_news_search_index(session_factory)
+    finally:
+        release_lease(INGEST_LEASE, token, session_factory)
+
+
+# progress of the crawl filling an empty news table after startup, see /api/v1/health/ready
+initial_crawl = {"state": "not_needed"}
+
+
+def run_initial_crawl():
+    initial_crawl["state"] = "running"
+    run = run_ingest(trigger="initial")
+    if run is None:
+        # another worker holds the lease and is crawling
+        initial_crawl["state"] = "elsewhere"
+    elif run.status == "failed":
+        initial_crawl["state"] = "failed"
+    else:
+        initial_crawl["state"] = "done"
 
 
 @app.on_event("startup")
-def start_scheduler():
+async def start_scheduler():
+    """
+    schedule the background jobs and return, nothing slow runs before the
+    server accepts requests
+    """
+    get_http_client()
     db = SessionLocal()
-    if db.query(NewsArticle).count() == 0:
+    try:
+        empty = db.scalar(select(NewsArticle.id).limit(1)) is None
+    finally:
+        db.close()
+    # jobs without a trigger run once, right after bgs.start(); the initial
+    # crawl syncs the search index itself
+    if empty:
         # should change into simple factory pattern
-        get_new()
-    db.close()
-    bgs.add_job(get_new, "interval", minutes=100)
+        initial_crawl["state"] = "pending"
+        bgs.add_job(run_initial_crawl)
+    else:
+        bgs.add_job(run_search_index_sync)
+    # max_instances and coalesce stop overlap within this process, the
+    # lease taken by run_ingest across processes
+    bgs.add_job(
+        run_ingest,
+        "interval",
+        minutes=INGEST_INTERVAL_MINUTES,
+        jitter=INGEST_JITTER_SECONDS,
+        id=INGEST_LEASE,
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+    bgs.add_job(
+        run_price_refresh,
+        "interval",
+        hours=PRICE_REFRESH_HOURS,
+        next_run_time=datetime.now(),
+    )
     bgs.start()
 
 
 @app.on_event("shutdown")
-def shutdown_scheduler():
+async def shutdown_scheduler():
     bgs.shutdown()
-
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    await close_shared_clients()
+
+
+# bcrypt cost factor, hashes stored with any other cost are rehashed on the
+# next successful login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# threads hashing and verifying passwords, bounding the CPU logins can take
+AUTH_HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", "2"))
+# seconds a token subject stays resolved to its user without a query
+AUTH_USER_CACHE_TTL = int(os.environ.get("AUTH_USER_CACHE_TTL", "60"))
+AUTH_USER_CACHE_MAX_BYTES = int(os.environ.get("AUTH_USER_CACHE_MAX_BYTES", str(1024 * 1024)))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+auth_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
+# username -> [id, username]
+user_cache = TTLCache(AUTH_USER_CACHE_TTL, AUTH_USER_CACHE_MAX_BYTES)
+AuthenticatedUser = namedtuple("AuthenticatedUser", "id username")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/login")
 
 
@@ -271,24 +1207,73 @@ def session_opener():
         session.close()
 
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """metrics of this worker process in the Prometheus text format"""
+    return Response(content=metrics_registry.render(), media_type=metrics_registry.content_type)
 
-def verify(p1, p2):
-    return pwd_context.verify(p1, p2)
 
+@app.get("/api/v1/health/ready")
+def readiness(response: Response, db=Depends(session_opener)):
+    """
+    ready once the database answers and the news table is not waiting for
+    its first crawl, 503 until then
+    """
+    db.execute(select(1))
+    ready = initial_crawl["state"] not in ("pending", "running")
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": ready, "initial_crawl": initial_crawl["state"]}
 
-def check_user_password_is_correct(db, n, pwd):
-    OuO = db.query(User).filter(User.username == n).first()
-    if not verify(pwd, OuO.hashed_password):
-        return False
-    return OuO
+
+def hash_in_worker(func, *args):
+    """
+    run bcrypt on auth_executor, bounding the CPU logins can take; called
+    from plain `def` handlers, which FastAPI runs in its threadpool so
+    neither the hash nor the session work blocks the event loop
+    """
+    return auth_executor.submit(func, *args).result()
+
+
+def invalidate_user(username):
+    """drop the cached token resolution of a user whose row changed"""
+    user_cache.discard(username)
+
+
+def find_user(db, username):
+    """
+    :return: AuthenticatedUser, cached for AUTH_USER_CACHE_TTL seconds, None
+        if there is no such user
+    """
+    cached = user_cache.get(username)
+    if cached is not None:
+        return AuthenticatedUser(*cached)
+    row = db.execute(
+        select(User.id, User.username).where(User.username == username)
+    ).first()
+    if row is None:
+        return None
+    user_cache.set(username, [row.id, row.username])
+    return AuthenticatedUser(row.id, row.username)
 
 
 def authenticate_user_token(
     token = Depends(oauth2_scheme),
     db = Depends(session_opener)
 ):
-    payload = jwt.decode(token, '1892dhianiandowqd0n', algorithms=["HS256"])
-    return db.query(User).filter(User.username == payload.get("sub")).first()
+    unauthorized = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, '1892dhianiandowqd0n', algorithms=["HS256"])
+    except JWTError:
+        raise unauthorized
+    user = find_user(db, payload.get("sub"))
+    if user is None:
+        raise unauthorized
+    return user
 
 
 def create_access_token(data, expires_delta=None):
@@ -305,11 +1290,29 @@ def create_access_token(data, expires_delta=None):
 
 
 @app.post("/api/v1/users/login")
-async def login_for_access_token(
+def login_for_access_token(
         form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(session_opener)
 ):
     """login"""
-    user = check_user_password_is_correct(db, form_data.username, form_data.password)
+    user = db.query(User).filter(User.username == form_data.username).first()
+    if user is None:
+        # spend the same time as a wrong password so usernames can't be probed
+        hash_in_worker(pwd_context.dummy_verify)
+        verified = False
+    else:
+        verified, new_hash = hash_in_worker(
+            pwd_context.verify_and_update, form_data.password, user.hashed_password
+        )
+    if not verified:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if new_hash is not None:
+        # stored with another cost factor, upgrade it now that the password is known
+        user.hashed_password = new_hash
+        db.commit()
     access_token = create_access_token(
         data={"sub": str(user.username)}, expires_delta=timedelta(minutes=30)
     )
@@ -321,11 +1324,12 @@ class UserAuthSchema(BaseModel):
 @app.post("/api/v1/users/register")
 def create_user(user: UserAuthSchema, db: Session = Depends(session_opener)):
     """create user"""
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = hash_in_worker(pwd_context.hash, user.password)
     db_user = User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user(db_user.username)
     return db_user
 
 
@@ -337,75 +1341,263 @@ def read_users_me(user=Depends(authenticate_user_token)):
 _id_counter = itertools.count(start=1000000)
 
 
-def get_article_upvote_details(article_id, uid, db):
-    cnt = (
-        db.query(user_news_association_table)
-        .filter_by(news_articles_id=article_id)
-        .count()
+def query_news_with_upvote_details(db, uid=None):
+    """
+    query news articles together with their upvote count and whether the
+    given user upvoted them, reading the stored upvote_count and probing
+    user_news_upvotes by primary key for the user
+
+    :param db:
+    :param uid: user id, None for anonymous
+    :return: query yielding (NewsArticle, upvotes, is_upvoted)
+    """
+    assoc = user_news_association_table.c
+    voted = (
+        select(assoc.user_id)
+        .where(assoc.user_id == uid, assoc.news_articles_id == NewsArticle.id)
+        .exists()
+        if uid
+        else literal(False)
     )
-    voted = False
-    if uid:
-        voted = (
-                db.query(user_news_association_table)
-                .filter_by(news_articles_id=article_id, user_id=uid)
-                .first()
-                is not None
+    return db.query(NewsArticle, NewsArticle.upvote_count, voted)
+
+
+# columns returned by the feed endpoints, `content` is only sent by the detail endpoint
+NEWS_LIST_FIELDS = ("id", "url", "title", "time", "summary", "reason")
+NEWS_DETAIL_FIELDS = NEWS_LIST_FIELDS + ("content",)
+# encoded anonymous feed pages, see feed_snapshot; the TTL bounds how long
+# writes made by other worker processes go unseen
+FEED_SNAPSHOT_TTL = float(os.environ.get("FEED_SNAPSHOT_TTL", "5"))
+FEED_SNAPSHOT_PAGES = int(os.environ.get("FEED_SNAPSHOT_PAGES", "256"))
+feed_snapshots = FeedSnapshotCache(FEED_SNAPSHOT_TTL, FEED_SNAPSHOT_PAGES)
+
+
+def encode_news_cursor(article):
+    """encode the (published_at, id) keyset position after `article`"""
+    raw = json.dumps([article.published_at.isoformat(), article.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_news_cursor(cursor):
+    """decode a cursor made by encode_news_cursor into (published_at, id)"""
+    try:
+        published_at, article_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(published_at, str) or not isinstance(article_id, int):
+            raise ValueError(cursor)
+        published_at = datetime.fromisoformat(published_at)
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
         )
-    return cnt, voted
+    return published_at, article_id
+
+
+def query_news_page(db, limit, cursor, since=None, until=None):
+    """
+    query one page of the anonymous news feed, newest first, keyed on
+    (published_at, id)
+
+    :param db:
+    :param limit: page size
+    :param cursor: cursor from a previous page, None for the first page
+    :param since: only news published at or after this time
+    :param until: only news published before this time
+    :return: (items, cursor of the following page or None)
+    """
+    query = query_news_with_upvote_details(db).options(
+        load_only(*(getattr(NewsArticle, f) for f in NEWS_LIST_FIELDS + ("published_at", "upvote_count")))
+    )
+    if cursor:
+        query = query.filter(
+            tuple_(NewsArticle.published_at, NewsArticle.id) < decode_news_cursor(cursor)
+        )
+    if since is not None:
+        query = query.filter(NewsArticle.published_at >= since)
+    if until is not None:
+        query = query.filter(NewsArticle.published_at < until)
+    news = (
+        query.order_by(NewsArticle.published_at.desc(), NewsArticle.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(news) > limit:
+        news = news[:limit]
+        next_cursor = encode_news_cursor(news[-1][0])
+    items = [
+        {
+            **{f: getattr(article, f) for f in NEWS_LIST_FIELDS},
+            "upvotes": upvotes,
+            "is_upvoted": bool(upvoted),
+        }
+        for article, upvotes, upvoted in news
+    ]
+    return items, next_cursor
+
+
+def read_news_page(db, uid, limit, cursor, since=None, until=None):
+    """
+    read one page of the news feed from feed_snapshots, querying it on a
+    miss; a user's page is the anonymous one with their upvotes overlaid
+
+    the cursor for the following page is sent in the X-Next-Cursor header
+
+    :param db:
+    :param uid: user id, None for anonymous
+    :param limit: page size
+    :param cursor: cursor from a previous page, None for the first page
+    :param since: only news published at or after this time
+    :param until: only news published before this time
+    :return: JSON response
+    """
+    key = (limit, cursor, since, until)
+    page, generation = feed_snapshots.lookup(key)
+    if page is None:
+        items, next_cursor = query_news_page(db, limit, cursor, since, until)
+        page = feed_snapshots.store(key, generation, items, next_cursor)
+    body = page.body
+    if uid and page.items:
+        assoc = user_news_association_table.c
+        upvoted = set(db.scalars(
+            select(assoc.news_articles_id).where(
+                assoc.user_id == uid,
+                assoc.news_articles_id.in_([item["id"] for item in page.items]),
+            )
+        ))
+        if upvoted:
+            body = orjson.dumps(
+                [{**item, "is_upvoted": item["id"] in upvoted} for item in page.items]
+            )
+    headers = {"X-Next-Cursor": page.next_cursor} if page.next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/api/v1/news/news")
-def read_news(db=Depends(session_opener)):
+def read_news(
+        limit: int = Query(50, ge=1, le=200),
+        cursor: Optional[str] = Query(None),
+        since: Optional[datetime] = Query(None),
+        until: Optional[datetime] = Query(None),
+        db=Depends(session_opener),
+):
     """
     read new
 
+    :param limit:
+    :param cursor:
+    :param since: published at or after
+    :param until: published before
     :param db:
     :return:
     """
-    news = db.query(NewsArticle).order_by(NewsArticle.time.desc()).all()
-    result = []
-    for n in news:
-        upvotes, upvoted = get_article_upvote_details(n.id, None, db)
-        result.append(
-            {**n.__dict__, "upvotes": upvotes, "is_upvoted": upvoted}
-        )
-    return result
+    return read_news_page(db, None, limit, cursor, since, until)
 
 
 @app.get(
     "/api/v1/news/user_news"
 )
 def read_user_news(
+        limit: int = Query(50, ge=1, le=200),
+        cursor: Optional[str] = Query(None),
+        since: Optional[datetime] = Query(None),
+        until: Optional[datetime] = Query(None),
         db=Depends(session_opener),
         u=Depends(authenticate_user_token)
 ):
     """
     read user new
 
+    :param limit:
+    :param cursor:
+    :param since: published at or after
+    :param until: published before
     :param db:
     :param u:
     :return:
     """
-    news = db.query(NewsArticle).order_by(NewsArticle.time.desc()).all()
-    result = []
-    for article in news:
-        upvotes, upvoted = get_article_upvote_details(article.id, u.id, db)
-        result.append(
-            {
-                **article.__dict__,
-                "upvotes": upvotes,
-                "is_upvoted": upvoted,
-            }
+    return read_news_page(db, u.id, limit, cursor, since, until)
+
+
+@app.get("/api/v1/news/search")
+def search_stored_news(
+        q: str = Query(..., min_length=1),
+        limit: int = Query(20, ge=1, le=100),
+        db=Depends(session_opener),
+):
+    """
+    full-text search over stored news, best match first
+
+    :param q: search text
+    :param limit:
+    :param db:
+    :return:
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Search needs SQLite FTS5"
         )
-    return result
+    ranked = news_search.search(db.connection(), q, limit)
+    if not ranked:
+        return []
+    news = (
+        query_news_with_upvote_details(db)
+        .options(load_only(*(getattr(NewsArticle, f) for f in NEWS_LIST_FIELDS)))
+        .filter(NewsArticle.id.in_([article_id for article_id, _ in ranked]))
+        .all()
+    )
+    by_id = {article.id: (article, upvotes) for article, upvotes, _ in news}
+    return [
+        {
+            **{f: getattr(by_id[article_id][0], f) for f in NEWS_LIST_FIELDS},
+            "upvotes": by_id[article_id][1],
+            "rank": rank,
+        }
+        for article_id, rank in ranked
+        if article_id in by_id
+    ]
+
+
+@app.get("/api/v1/news/news/{id}")
+def read_news_detail(id: int, db=Depends(session_opener)):
+    """
+    read a single new including its content
+
+    :param id:
+    :param db:
+    :return:
+    """
+    article = db.query(NewsArticle).filter_by(id=id).first()
+    if article is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="News not found")
+    return {f: getattr(article, f) for f in NEWS_DETAIL_FIELDS}
 
 class PromptRequest(BaseModel):
     prompt: str
 
-@app.post("/api/v1/news/search_news")
-async def search_news(request: PromptRequest):
-    prompt = request.prompt
-    news_list = []
+keyword_cache = TTLCache(
+    SEARCH_KEYWORD_TTL,
+    SEARCH_CACHE_MAX_BYTES // 32,
+    SQLiteCacheStore(SEARCH_CACHE_DB, "search_keyword_cache") if SEARCH_CACHE_DB else None,
+)
+article_cache = TTLCache(
+    SEARCH_ARTICLE_TTL,
+    SEARCH_CACHE_MAX_BYTES - SEARCH_CACHE_MAX_BYTES // 32,
+    SQLiteCacheStore(SEARCH_CACHE_DB, "search_article_cache") if SEARCH_CACHE_DB else None,
+)
+
+
+async def search_news_events(prompt, http, llm):
+    """
+    search udn for the news a prompt asks for
+
+    yields ("keywords", keywords) once the keywords are extracted, then
+    ("news", detailed_news) for every article as soon as it is parsed,
+    until all are done or SEARCH_ARTICLE_BUDGET runs out
+
+    :param prompt:
+    :param http: httpx.AsyncClient
+    :param llm: AsyncOpenAI
+    """
     m = [
         {
             "role": "system",
@@ -414,66 +1606,212 @@ async def search_news(request: PromptRequest):
         {"role": "user", "content": f"{prompt}"},
     ]
 
-    completion = OpenAI(api_key="xxx").chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=m,
-    )
-    keywords = completion.choices[0].message.content
+    prompt_key = normalise_text(prompt)
+    keywords = await keyword_cache.aget(prompt_key)
+    if keywords is None:
+        completion = await llm.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=m,
+        )
+        keywords = completion.choices[0].message.content
+        await keyword_cache.aset(prompt_key, keywords)
+    yield "keywords", keywords
+
+    keywords_key = normalise_text(keywords)
+    cached = await article_cache.aget(keywords_key)
+    if cached is not None:
+        for detailed_news in cached:
+            # entries persisted in SEARCH_CACHE_DB before published_at was sent
+            detailed_news.setdefault(
+                "published_at", parse_published_at(detailed_news["time"]).isoformat()
+            )
+            yield "news", detailed_news
+        return
     # should change into simple factory pattern
-    news_items = get_new_info(keywords, is_initial=False)
-    for news in news_items:
+    news_items = await async_get_new_info(
+        http, HostLimiter(INGEST_HOST_CONCURRENCY), keywords, is_initial=False
+    )
+    semaphore = asyncio.Semaphore(SEARCH_FANOUT)
+    pending = {
+        asyncio.create_task(fetch_search_article(http, semaphore, news))
+        for news in news_items
+    }
+    deadline = asyncio.get_running_loop().time() + SEARCH_ARTICLE_BUDGET
+    found = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=deadline - asyncio.get_running_loop().time(),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                # articles still loading when the budget runs out are left out
+                break
+            for task in done:
+                if task.exception() is not None:
+                    print(task.exception())
+                    continue
+                if task.result() is None:
+                    continue
+                found.append(task.result())
+                yield "news", task.result()
+        if not pending:
+            # only complete results are cached, a budget cut-off is retried
+            await article_cache.aset(keywords_key, found)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+@app.post("/api/v1/news/search_news")
+async def search_news(
+        request: PromptRequest,
+        http=Depends(get_http_client),
+        llm=Depends(get_llm_client),
+):
+    news_list = [
+        item
+        async for event, item in search_news_events(request.prompt, http, llm)
+        if event == "news"
+    ]
+    return sorted(news_list, key=lambda x: x["published_at"], reverse=True)
+
+
+@app.get("/api/v1/news/search_news/stream")
+async def stream_search_news(
+        prompt: str = Query(...),
+        http=Depends(get_http_client),
+        llm=Depends(get_llm_client),
+):
+    """
+    search_news as Server-Sent Events: a `keywords` event, a `news` event per
+    article as soon as it is parsed, then `done`
+
+    :param prompt:
+    :param http:
+    :param llm:
+    :return:
+    """
+    async def event_stream():
         try:
-            response = requests.get(news["titleLink"])
-            soup = BeautifulSoup(response.text, "html.parser")
-            # 標題
-            title = soup.find("h1", class_="article-content__title").text
-            time = soup.find("time", class_="article-content__time").text
-            # 定位到包含文章内容的 <section>
-            content_section = soup.find("section", class_="article-content__editor")
-
-            paragraphs = [
-                p.text
-                for p in content_section.find_all("p")
-                if p.text.strip() != "" and "▪" not in p.text
-            ]
-            detailed_news = {
-                "url": news["titleLink"],
-                "title": title,
-                "time": time,
-                "content": paragraphs,
-            }
-            detailed_news["content"] = " ".join(detailed_news["content"])
-            detailed_news["id"] = next(_id_counter)
-            news_list.append(detailed_news)
+            async for event, item in search_news_events(prompt, http, llm):
+                data = {"keywords": item} if event == "keywords" else item
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
         except Exception as e:
             print(e)
-    return sorted(news_list, key=lambda x: x["time"], reverse=True)
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def fetch_search_article(http, semaphore, news):
+    """
+    fetch and parse one search result article
+
+    :param http: httpx.AsyncClient
+    :param semaphore: bounds the articles fetched at once
+    :param news: udn list entry
+    :return: news info, None if the page has no article text
+    """
+    async with semaphore:
+        response = await http.get(news["titleLink"])
+    detailed_news = await parse_in_worker(
+        parse_news_article, news["titleLink"], response.text
+    )
+    if detailed_news is None:
+        return None
+    detailed_news["content"] = " ".join(detailed_news["content"])
+    detailed_news["id"] = next(_id_counter)
+    # ISO timestamp clients can order results by, `time` is udn's display format
+    detailed_news["published_at"] = parse_published_at(detailed_news["time"]).isoformat()
+    return detailed_news
+
+@app.get("/api/v1/news/search_cache/stats")
+def search_cache_stats():
+    return {"keywords": keyword_cache.stats(), "articles": article_cache.stats()}
+
 
 class NewsSumaryRequestSchema(BaseModel):
     content: str
 
-@app.post("/api/v1/news/news_summary")
-async def news_summary(
-        payload: NewsSumaryRequestSchema, u=Depends(authenticate_user_token)
-):
-    response = {}
+# content hash -> in-flight LLM summary, shared by concurrent identical requests
+summary_requests = {}
+
+
+def find_stored_summary(db, digest):
+    """
+    summary of an ingested article with this content, else a cached one
+
+    :return: {"summary", "reason"}, None if never summarised
+    """
+    row = db.execute(
+        select(NewsArticle.summary, NewsArticle.reason)
+        .where(NewsArticle.content_hash == digest, NewsArticle.summary != "")
+        .limit(1)
+    ).first()
+    if row is None:
+        row = db.execute(
+            select(SummaryCacheEntry.summary, SummaryCacheEntry.reason)
+            .where(SummaryCacheEntry.content_hash == digest)
+        ).first()
+    return None if row is None else {"summary": row.summary, "reason": row.reason}
+
+
+def store_summary(db, digest, summary):
+    stmt = insert_ignoring_conflicts(
+        SummaryCacheEntry.__table__, db.get_bind().dialect.name, ["content_hash"]
+    )
+    db.execute(stmt, {"content_hash": digest, "created_at": datetime.utcnow(), **summary})
+    db.commit()
+
+
+async def request_summary(llm, content):
     m = [
-        {
-            "role": "system",
-            "content": "你是一個新聞摘要生成機器人，請統整新聞中提及的影響及主要原因 (影響、原因各50個字，請以json格式回答 {'影響': '...', '原因': '...'})",
-        },
-        {"role": "user", "content": f"{payload.content}"},
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"{content}"},
     ]
-
-    completion = OpenAI(api_key="xxx").chat.completions.create(
+    completion = await llm.chat.completions.create(
         model="gpt-3.5-turbo",
         messages=m,
     )
     result = completion.choices[0].message.content
-    if result:
-        result = json.loads(result)
-        response["summary"] = result["影響"]
-        response["reason"] = result["原因"]
+    if not result:
+        return {}
+    result = json.loads(result)
+    return {"summary": result["影響"], "reason": result["原因"]}
+
+
+async def coalesced_summary(llm, digest, content):
+    """one LLM call per content hash however many requests wait for it"""
+    task = summary_requests.get(digest)
+    if task is None:
+        task = asyncio.ensure_future(request_summary(llm, content))
+        summary_requests[digest] = task
+        task.add_done_callback(lambda _: summary_requests.pop(digest, None))
+    # a cancelled request must not cancel the call others are waiting on
+    return await asyncio.shield(task)
+
+
+@app.post("/api/v1/news/news_summary")
+async def news_summary(
+        payload: NewsSumaryRequestSchema,
+        u=Depends(authenticate_user_token),
+        llm=Depends(get_llm_client),
+        db=Depends(session_opener),
+):
+    digest = content_hash(payload.content)
+    response = await asyncio.to_thread(find_stored_summary, db, digest)
+    if response is not None:
+        return response
+    response = await coalesced_summary(llm, digest, payload.content)
+    if response:
+        await asyncio.to_thread(store_summary, db, digest, response)
     return response
 
 
@@ -484,43 +1822,421 @@ def upvote_article(
         u=Depends(authenticate_user_token),
 ):
     message = toggle_upvote(id, u.id, db)
+    if message is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="News not found")
     return {"message": message}
 
 
 def toggle_upvote(n_id, u_id, db):
-    existing_upvote = db.execute(
-        select(user_news_association_table).where(
-            user_news_association_table.c.news_articles_id == n_id,
-            user_news_association_table.c.user_id == u_id,
-        )
-    ).scalar()
+    """
+    flip the user's upvote and upvote_count in one transaction
 
-    if existing_upvote:
-        delete_stmt = delete(user_news_association_table).where(
-            user_news_association_table.c.news_articles_id == n_id,
-            user_news_association_table.c.user_id == u_id,
+    the DELETE (or the INSERT when nothing was deleted) decides the outcome
+    by its row count, so parallel toggles never leave upvote_count out of
+    step with user_news_upvotes
+
+    :return: message, None if the article does not exist
+    """
+    assoc = user_news_association_table.c
+    removed = db.execute(
+        delete(user_news_association_table).where(
+            assoc.news_articles_id == n_id, assoc.user_id == u_id
         )
-        db.execute(delete_stmt)
-        db.commit()
-        return "Upvote removed"
+    ).rowcount
+    if removed:
+        change, message = -1, "Upvote removed"
     else:
-        insert_stmt = insert(user_news_association_table).values(
-            news_articles_id=n_id, user_id=u_id
+        stmt = insert_ignoring_conflicts(
+            user_news_association_table,
+            db.get_bind().dialect.name,
+            ["user_id", "news_articles_id"],
         )
-        db.execute(insert_stmt)
-        db.commit()
-        return "Article upvoted"
+        added = db.execute(stmt, {"news_articles_id": n_id, "user_id": u_id}).rowcount
+        change, message = added, "Article upvoted"
+    updated = db.execute(
+        update(NewsArticle)
+        .where(NewsArticle.id == n_id)
+        .values(upvote_count=NewsArticle.upvote_count + change)
+    ).rowcount
+    if not updated:
+        db.rollback()
+        return None
+    db.commit()
+    feed_snapshots.bump()
+    return message
+
+
+def repair_upvote_counts(session_factory=Session):
+    """
+    recount upvote_count from user_news_upvotes where they disagree
+
+    :return: number of articles corrected
+    """
+    assoc = user_news_association_table.c
+    actual = (
+        select(func.count())
+        .where(assoc.news_articles_id == NewsArticle.id)
+        .scalar_subquery()
+    )
+    session = session_factory()
+    try:
+        repaired = session.execute(
+            update(NewsArticle)
+            .where(NewsArticle.upvote_count != actual)
+            .values(upvote_count=actual)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+    finally:
+        session.close()
+    if repaired:
+        feed_snapshots.bump()
+    return repaired
 
 
 def news_exists(id2, db: Session):
     return db.query(NewsArticle).filter_by(id=id2).first() is not None
 
 
+def lease_holder(name, db):
+    """:return: holder token of an unexpired lease, None if free"""
+    return db.scalar(
+        select(SchedulerLease.holder).where(
+            SchedulerLease.name == name, SchedulerLease.expires_at > datetime.utcnow()
+        )
+    )
+
+
+def ingest_run_info(run):
+    return {
+        "id": run.id,
+        "trigger": run.trigger,
+        "holder": run.holder,
+        "status": run.status,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "duration": run.duration,
+        "new": run.new,
+        "skipped": run.skipped,
+        "irrelevant": run.irrelevant,
+        "failed": run.failed,
+        "error": run.error,
+    }
+
+
+@app.post("/api/v1/ingest/runs", status_code=status.HTTP_202_ACCEPTED)
+def trigger_ingest(
+        db=Depends(session_opener),
+        u=Depends(authenticate_user_token),
+):
+    """
+    start an ingest cycle now in the background; only INGEST_OPERATORS may,
+    409 while one is running in any process, 429 within
+    MANUAL_INGEST_COOLDOWN_SECONDS of the last manual start
+    """
+    if u.username not in INGEST_OPERATORS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not an ingest operator")
+    if lease_holder(INGEST_LEASE, db) is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ingest already running")
+    cooldown = acquire_lease(
+        MANUAL_INGEST_LEASE,
+        MANUAL_INGEST_COOLDOWN_SECONDS,
+        lambda: Session(bind=db.get_bind()),
+    )
+    if cooldown is None:
+        expires_at = db.scalar(
+            select(SchedulerLease.expires_at).where(SchedulerLease.name == MANUAL_INGEST_LEASE)
+        )
+        retry_after = max(1, math.ceil((expires_at - datetime.utcnow()).total_seconds()))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Ingest was started recently",
+            headers={"Retry-After": str(retry_after)},
+        )
+    bgs.add_job(run_ingest, kwargs={"trigger": "manual"})
+    return {"message": "Ingest started"}
+
+
+@app.get("/api/v1/ingest/status")
+def ingest_status(
+        limit: int = Query(10, ge=1, le=100),
+        db=Depends(session_opener),
+):
+    """
+    whether an ingest is running, when this process runs the next one and
+    the latest runs of all processes
+    """
+    job = bgs.get_job(INGEST_LEASE)
+    runs = db.scalars(select(IngestRun).order_by(IngestRun.id.desc()).limit(limit))
+    return {
+        "running": lease_holder(INGEST_LEASE, db),
+        "next_run_time": job.next_run_time if job is not None else None,
+        "runs": [ingest_run_info(run) for run in runs],
+    }
+
+
+NECESSITIES_PRICE_URL = "https://opendata.ey.gov.tw/api/ConsumerProtection/NecessitiesPrice"
+PRICE_REFRESH_HOURS = int(os.environ.get("PRICE_REFRESH_HOURS", "6"))
+# every worker schedules the refresh, the lease makes them take turns
+PRICE_LEASE = "prices"
+PRICE_LEASE_SECONDS = int(os.environ.get("PRICE_LEASE_SECONDS", "300"))
+# windows in months the price ranking is precomputed for
+PRICE_RANKING_WINDOWS = (1, 3, 6, 12, 24, 36)
+# ranking of the refresh with this digest, rebuilt when another refresh lands
+price_ranking_cache = {"digest": None, "ranking": None}
+
+
+def apply_necessity_price_item(price, item):
+    """
+    copy an upstream item onto a NecessityPrice, parsing its series
+
+    :raise ValueError: malformed 統計值 or dates, price is left unchanged
+    """
+    # numpy is imported on first use, like openai and bs4
+    import price_series
+
+    start = price_series.parse_date(item["時間起點"])
+    end = price_series.parse_date(item["時間終點"])
+    values = price_series.parse_series(item["統計值"])
+    price.name = item["產品名稱"]
+    price.data = json.dumps(item, ensure_ascii=False)
+    price.series = price_series.series_to_blob(values)
+    price.series_start = start
+    price.series_step_months = price_series.series_step_months(start, end, len(values))
+
+
+def refresh_necessities_prices(session_factory=Session):
+    """
+    update the stored necessities prices to a fresh upstream snapshot, items
+    keep their id across refreshes and the previous snapshot is kept if
+    upstream fails
+
+    :param session_factory:
+    :return: PriceRefresh, None if upstream failed
+    """
+    host = urlsplit(NECESSITIES_PRICE_URL).hostname
+    start = time.perf_counter()
+    try:
+        response = requests.get(NECESSITIES_PRICE_URL, timeout=30)
+    except requests.RequestException as e:
+        observe_upstream(host, time.perf_counter() - start, "error")
+        print(e)
+        return None
+    observe_upstream(host, time.perf_counter() - start, upstream_outcome(response.status_code))
+    try:
+        response.raise_for_status()
+        items = response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(e)
+        return None
+    digest = hashlib.sha256(
+        json.dumps(items, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    session = session_factory()
+    try:
+        existing = {
+            (p.category, p.item_no): p for p in session.scalars(select(NecessityPrice))
+        }
+        refreshed = []
+        for item in items:
+            key = (item["類別"], str(item["編號"]))
+            price = existing.pop(key, None)
+            if price is None:
+                price = NecessityPrice(category=key[0], item_no=key[1])
+            try:
+                apply_necessity_price_item(price, item)
+            except ValueError as e:
+                # the stored row, if any, keeps its previous series
+                print(f"skipped necessity price {key[0]} {key[1]}: {e}")
+                continue
+            session.add(price)
+            refreshed.append((price, item))
+        for price in existing.values():
+            session.delete(price)
+        session.flush()
+        # new rows only get their id on flush
+        for price, item in refreshed:
+            price.data = json.dumps({"id": price.id, **item}, ensure_ascii=False)
+        refresh = PriceRefresh(
+            fetched_at=datetime.utcnow(), item_count=len(refreshed), digest=digest
+        )
+        session.add(refresh)
+        session.commit()
+        session.refresh(refresh)
+        session.expunge(refresh)
+        price_ranking_cache.update(
+            digest=refresh.digest, ranking=build_price_ranking(session)
+        )
+    finally:
+        session.close()
+    return refresh
+
+
+def run_price_refresh(session_factory=Session):
+    """
+    refresh the necessities prices if no other process or thread is
+    refreshing them
+
+    :return: PriceRefresh, None if upstream failed or the lease is held elsewhere
+    """
+    token = acquire_lease(PRICE_LEASE, PRICE_LEASE_SECONDS, session_factory)
+    if token is None:
+        return None
+    try:
+        return refresh_necessities_prices(session_factory)
+    finally:
+        release_lease(PRICE_LEASE, token, session_factory)
+
+
+def latest_price_digest(db):
+    return db.scalar(
+        select(PriceRefresh.digest).order_by(PriceRefresh.id.desc()).limit(1)
+    )
+
+
+def build_price_ranking(db):
+    import price_series
+
+    commodities = [
+        (
+            p.id,
+            p.category,
+            p.name,
+            price_series.blob_to_series(p.series),
+            p.series_start,
+            p.series_step_months,
+        )
+        for p in db.scalars(select(NecessityPrice).order_by(NecessityPrice.id))
+    ]
+    return price_series.PriceRanking(commodities, PRICE_RANKING_WINDOWS)
+
+
+def current_price_ranking(db):
+    """
+    ranking of the latest refresh, built here if the refresh ran in another
+    process
+    """
+    digest = latest_price_digest(db)
+    if price_ranking_cache["ranking"] is None or price_ranking_cache["digest"] != digest:
+        price_ranking_cache.update(digest=digest, ranking=build_price_ranking(db))
+    return price_ranking_cache["ranking"]
+
+
+def necessities_price_etag(digest, category, commodity):
+    key = json.dumps([digest, category, commodity], ensure_ascii=False)
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
 @app.get("/api/v1/prices/necessities-price")
 def get_necessities_prices(
-        category=Query(None), commodity=Query(None)
+        category=Query(None),
+        commodity=Query(None),
+        if_none_match: Optional[str] = Header(None),
+        db=Depends(session_opener),
+):
+    """
+    serve necessities prices from the last refresh, never calling upstream
+
+    :param category: CategoryName
+    :param commodity: Name
+    :param if_none_match:
+    :param db:
+    :return:
+    """
+    digest = latest_price_digest(db)
+    etag = necessities_price_etag(digest, category, commodity)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    query = select(NecessityPrice.data).order_by(NecessityPrice.id)
+    if category:
+        query = query.where(NecessityPrice.category == category)
+    if commodity:
+        query = query.where(NecessityPrice.name == commodity)
+    body = "[" + ",".join(db.scalars(query)) + "]"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/v1/prices/{id}/series")
+def get_necessity_price_series(
+        id: int,
+        since: Optional[date] = Query(None),
+        until: Optional[date] = Query(None),
+        points: Optional[int] = Query(None, ge=1, le=1000),
+        window: int = Query(12, ge=1, le=120),
+        db=Depends(session_opener),
 ):
-    return requests.get(
-        "https://opendata.ey.gov.tw/api/ConsumerProtection/NecessitiesPrice",
-        params={"CategoryName": category, "Name": commodity},
-    ).json()
+    """
+    monthly price series of one commodity with summary statistics
+
+    :param id: NecessityPrice id, sent as `id` in the necessities-price items
+    :param since: first month to include
+    :param until: last month to include
+    :param points: downsample to at most this many points
+    :param window: months in the moving average
+    :param db:
+    :return:
+    """
+    import price_series
+
+    price = db.get(NecessityPrice, id)
+    if price is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Commodity not found")
+    step = price.series_step_months
+    values, start = price_series.slice_series(
+        price_series.blob_to_series(price.series), price.series_start, step, since, until
+    )
+    average = price_series.moving_average(values, max(1, window // step))
+    sampled, starts = price_series.bucket_means(values, points)
+    sampled_average, _ = price_series.bucket_means(average, points)
+    dates = price_series.series_dates(start, step, len(values))
+    return {
+        "id": price.id,
+        "category": price.category,
+        "name": price.name,
+        "step_months": step,
+        "dates": [dates[i].isoformat() for i in starts],
+        "values": price_series.to_json_list(sampled),
+        "moving_average": price_series.to_json_list(sampled_average),
+        "stats": price_series.summarize_series(values, step),
+    }
+
+
+@app.get("/api/v1/prices/ranking")
+def get_necessity_price_ranking(
+        category=Query(None),
+        window: int = Query(12),
+        k: int = Query(10, ge=1, le=500),
+        order: str = Query("desc", pattern="^(asc|desc)$"),
+        db=Depends(session_opener),
+):
+    """
+    commodities ranked by percent price change over the last `window` months
+
+    :param category: CategoryName, all commodities if omitted
+    :param window: one of PRICE_RANKING_WINDOWS
+    :param k: number of commodities
+    :param order: desc for fastest rising, asc for fastest falling
+    :param db:
+    :return:
+    """
+    if window not in PRICE_RANKING_WINDOWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"window must be one of {list(PRICE_RANKING_WINDOWS)}",
+        )
+    items = current_price_ranking(db).top(window, k, category, ascending=order == "asc")
+    if items is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    return items
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="news backend maintenance")
+    parser.add_argument("command", choices=["repair-upvotes"])
+    args = parser.parse_args()
+    if args.command == "repair-upvotes":
+        print(f"repaired upvote_count of {repair_upvote_counts()} articles")
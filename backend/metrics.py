@@ -0,0 +1,178 @@
+"""
+In-process counters and histograms rendered in the Prometheus text format.
+
+Only what the /metrics endpoint needs: labelled counters and cumulative
+histograms, safe to update from request threads, the event loop and the
+scheduler. Every worker process keeps its own series, so each worker is a
+separate scrape target.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# seconds, from a feed page served from memory to a slow upstream call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    """
+    a metric family, one child per distinct set of label values
+
+    :param name: metric name
+    :param documentation: HELP text
+    :param labelnames: label names, values are passed to labels() in this order
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        values = tuple(str(v) for v in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self.lock:
+            children = sorted(self.children.items())
+        for values, child in children:
+            lines.extend(self.render_child(values, child))
+        return "\n".join(lines)
+
+    def render_child(self, values, child):
+        raise NotImplementedError
+
+
+class CounterChild:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def new_child(self):
+        return CounterChild()
+
+    def render_child(self, values, child):
+        yield f"{self.name}{format_labels(self.labelnames, values)} {format_value(child.value)}"
+
+
+class HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # per bucket, not cumulative, the last one counts values above every bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """observe the seconds spent in the block, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        """:return: (cumulative counts per bucket ending with +Inf, sum)"""
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+
+class Histogram(Metric):
+    """
+    :param buckets: increasing upper bounds, +Inf is added
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(b) for b in buckets)
+
+    def new_child(self):
+        return HistogramChild(self.buckets)
+
+    def render_child(self, values, child):
+        cumulative, total = child.snapshot()
+        for bound, count in zip(self.buckets + (math.inf,), cumulative):
+            labels = format_labels(self.labelnames, values, [("le", format_value(bound))])
+            yield f"{self.name}_bucket{labels} {count}"
+        labels = format_labels(self.labelnames, values)
+        yield f"{self.name}_sum{labels} {format_value(total)}"
+        yield f"{self.name}_count{labels} {cumulative[-1]}"
+
+
+class Registry:
+    """the metrics of one application, rendered together"""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
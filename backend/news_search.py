@@ -0,0 +1,171 @@
+"""
+Full-text search over stored news articles with an SQLite FTS5 index.
+
+FTS5's unicode61 tokenizer keeps a whole run of CJK characters as a single
+token, so text is indexed as overlapping character bigrams instead:
+油價上漲 is stored as 油價 價上 上漲 and a query is turned into a phrase of
+the same bigrams. Latin words and numbers are indexed whole.
+
+The index rowid is the news_articles id and every entry keeps the url it
+was built from (unindexed). A sync compares the index against news_articles
+by id: entries of deleted articles, or of an id now used by another url,
+are dropped and articles without an entry are indexed, so it stays right
+when ids are reused.
+"""
+import re
+import unicodedata
+
+from sqlalchemy import bindparam, text
+
+INDEX_TABLE = "news_articles_fts"
+INDEX_BATCH_SIZE = 1000
+# hiragana/katakana, CJK extension A, CJK unified ideographs, hangul, compatibility ideographs
+CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+CJK_RE = re.compile(rf"[{CJK}]+")
+RUN_RE = re.compile(rf"[{CJK}]+|[^\W{CJK}]+")
+CREATE_INDEX = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5(title, body, url UNINDEXED)"
+)
+# title matches weigh more than body matches in bm25
+TITLE_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+
+
+def token_runs(value):
+    """
+    split text into runs of tokens, a CJK run as its bigrams and every
+    other word as one token
+    """
+    value = unicodedata.normalize("NFKC", value).casefold()
+    for match in RUN_RE.finditer(value):
+        run = match.group()
+        if len(run) > 1 and CJK_RE.fullmatch(run):
+            yield [run[i:i + 2] for i in range(len(run) - 1)]
+        else:
+            yield [run]
+
+
+def index_text(*values):
+    """text as stored in the index, tokens separated by spaces"""
+    return " ".join(
+        token for value in values if value for run in token_runs(value) for token in run
+    )
+
+
+def match_query(query):
+    """
+    FTS5 MATCH expression requiring every run of the query as a phrase,
+    a lone CJK character matches as a bigram prefix
+
+    :return: None when the query has nothing to search for
+    """
+    phrases = []
+    for run in token_runs(query):
+        phrase = '"' + " ".join(run) + '"'
+        if len(run[0]) == 1 and CJK_RE.fullmatch(run[0]):
+            phrase += "*"
+        phrases.append(phrase)
+    return " ".join(phrases) or None
+
+
+def expanding(statement, *names):
+    return text(statement).bindparams(*(bindparam(name, expanding=True) for name in names))
+
+
+def index_ids(connection, ids):
+    """
+    (re)index these news_articles ids, replacing any entry they already have
+
+    :return: number of articles indexed
+    """
+    indexed = 0
+    for start in range(0, len(ids), INDEX_BATCH_SIZE):
+        batch = ids[start:start + INDEX_BATCH_SIZE]
+        rows = connection.execute(
+            expanding(
+                "SELECT id, url, title, content, summary, reason FROM news_articles "
+                "WHERE id IN :ids",
+                "ids",
+            ),
+            {"ids": batch},
+        ).all()
+        connection.execute(
+            expanding(f"DELETE FROM {INDEX_TABLE} WHERE rowid IN :ids", "ids"), {"ids": batch}
+        )
+        if rows:
+            connection.execute(
+                text(
+                    f"INSERT INTO {INDEX_TABLE} (rowid, title, body, url) "
+                    "VALUES (:id, :title, :body, :url)"
+                ),
+                [
+                    {
+                        "id": row.id,
+                        "title": index_text(row.title),
+                        "body": index_text(row.content, row.summary, row.reason),
+                        "url": row.url,
+                    }
+                    for row in rows
+                ],
+            )
+        indexed += len(rows)
+    return indexed
+
+
+def index_urls(connection, urls):
+    """
+    index the articles just stored under these urls
+
+    :return: number of articles indexed
+    """
+    if not urls:
+        return 0
+    ids = connection.execute(
+        expanding("SELECT id FROM news_articles WHERE url IN :urls", "urls"), {"urls": list(urls)}
+    ).scalars().all()
+    return index_ids(connection, ids)
+
+
+def sync_index(connection):
+    """
+    drop entries whose article is gone or whose id now belongs to another
+    url, then index the articles without an entry
+
+    :return: number of articles indexed
+    """
+    stale = connection.execute(
+        text(
+            f"SELECT f.rowid FROM {INDEX_TABLE} f "
+            "LEFT JOIN news_articles a ON a.id = f.rowid "
+            "WHERE a.id IS NULL OR a.url IS NOT f.url"
+        )
+    ).scalars().all()
+    for start in range(0, len(stale), INDEX_BATCH_SIZE):
+        connection.execute(
+            expanding(f"DELETE FROM {INDEX_TABLE} WHERE rowid IN :ids", "ids"),
+            {"ids": stale[start:start + INDEX_BATCH_SIZE]},
+        )
+    missing = connection.execute(
+        text(
+            "SELECT id FROM news_articles a WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {INDEX_TABLE} f WHERE f.rowid = a.id) ORDER BY id"
+        )
+    ).scalars().all()
+    return index_ids(connection, missing)
+
+
+def search(connection, query, limit):
+    """
+    :return: [(article id, bm25 rank)], best match first
+    """
+    expression = match_query(query)
+    if expression is None:
+        return []
+    return connection.execute(
+        text(
+            f"SELECT rowid, bm25({INDEX_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS rank "
+            f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH :query "
+            "ORDER BY rank LIMIT :limit"
+        ),
+        {"query": expression, "limit": limit},
+    ).all()
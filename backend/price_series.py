@@ -0,0 +1,234 @@
+"""
+Monthly necessities price series stored as float32 blobs.
+
+The opendata `統計值` field is a comma separated list of monthly prices from
+`時間起點`, with 0 or blanks for months without a price. It is parsed once
+on refresh into a float32 array (missing months as NaN) together with its
+start date and step, so requests work on arrays instead of strings.
+"""
+from datetime import date
+
+import numpy as np
+
+
+def parse_series(text):
+    """parse a `統計值` string, missing or zero prices become NaN"""
+    values = np.array(
+        [float(v) if v.strip() else np.nan for v in text.split(",")],
+        dtype=np.float32,
+    )
+    values[values == 0] = np.nan
+    return values
+
+
+def series_to_blob(values):
+    return np.asarray(values, dtype=np.float32).tobytes()
+
+
+def blob_to_series(blob):
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def parse_date(text):
+    return date.fromisoformat(text.strip()[:10])
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def months_between(start, end):
+    return (end.year - start.year) * 12 + end.month - start.month
+
+
+def series_step_months(start, end, length):
+    """months between two samples, 1 unless the range says otherwise"""
+    if length < 2:
+        return 1
+    return max(1, round(months_between(start, end) / (length - 1)))
+
+
+def series_dates(start, step_months, length):
+    return [add_months(start, i * step_months) for i in range(length)]
+
+
+def slice_series(values, start, step_months, since=None, until=None):
+    """
+    restrict a series to [since, until]
+
+    :return: (values, start of the returned values)
+    """
+    first, last = 0, len(values)
+    if since is not None:
+        first = max(0, -(-months_between(start, since) // step_months))
+    if until is not None:
+        last = min(last, months_between(start, until) // step_months + 1)
+    last = max(first, last)
+    return values[first:last], add_months(start, first * step_months)
+
+
+def bucket_means(values, points):
+    """
+    downsample to at most `points` values, each the NaN-ignoring mean of an
+    equal run of samples
+
+    :return: (means, index of the first sample of every bucket)
+    """
+    if points is None or len(values) <= points:
+        return values, np.arange(len(values))
+    starts = np.linspace(0, len(values), points, endpoint=False).astype(np.intp)
+    present = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(present, values, 0), starts)
+    counts = np.add.reduceat(present, starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = (sums / counts).astype(np.float32)
+    return means, starts
+
+
+def moving_average(values, window):
+    """
+    trailing NaN-ignoring mean over `window` samples, NaN until the window is full
+    """
+    present = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0), dtype=np.float64)))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    result = np.full(len(values), np.nan, dtype=np.float32)
+    if window <= len(values):
+        window_sums = sums[window:] - sums[:-window]
+        window_counts = counts[window:] - counts[:-window]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[window - 1:] = window_sums / window_counts
+    return result
+
+
+def percent_change(values, lag):
+    """
+    change of the last price against the price `lag` samples earlier, in percent
+    """
+    if lag < 1 or len(values) <= lag:
+        return None
+    current, previous = values[-1], values[-1 - lag]
+    if np.isnan(current) or np.isnan(previous):
+        return None
+    return round((float(current) - float(previous)) / float(previous) * 100, 2)
+
+
+def summarize_series(values, step_months):
+    """min, max, mean and year over year change of a series"""
+    if len(values) == 0 or np.isnan(values).all():
+        return {"min": None, "max": None, "mean": None, "yoy_change": None}
+    return {
+        "min": float(np.nanmin(values)),
+        "max": float(np.nanmax(values)),
+        "mean": round(float(np.nanmean(values)), 2),
+        "yoy_change": percent_change(values, 12 // step_months),
+    }
+
+
+def to_json_list(values):
+    """floats rounded for transport, NaN as null"""
+    return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
+
+def month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def align_series(series_list):
+    """
+    place series on one monthly grid
+
+    :param series_list: (values, start, step_months) per commodity
+    :return: (2-D float32 matrix with a row per commodity and NaN where a
+        month has no price, first month of the grid)
+    """
+    if not series_list:
+        return np.empty((0, 0), dtype=np.float32), None
+    firsts = [month_index(start) for _, start, _ in series_list]
+    lasts = [f + (len(v) - 1) * step for f, (v, _, step) in zip(firsts, series_list)]
+    base = min(firsts)
+    matrix = np.full((len(series_list), max(lasts) - base + 1), np.nan, dtype=np.float32)
+    for row, (first, (values, _, step)) in enumerate(zip(firsts, series_list)):
+        matrix[row, first - base:first - base + len(values) * step:step] = values
+    return matrix, date(base // 12, base % 12 + 1, 1)
+
+
+def forward_fill(matrix):
+    """carry the last known price of every row forward over NaN months"""
+    present = ~np.isnan(matrix)
+    columns = np.where(present, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(columns, axis=1, out=columns)
+    filled = matrix[np.arange(matrix.shape[0])[:, None], columns]
+    # rows that start with NaN have nothing to carry forward
+    filled[np.cumsum(present, axis=1) == 0] = np.nan
+    return filled
+
+
+def window_changes(filled, window):
+    """
+    percent change of every row between the last month and `window` months
+    earlier, NaN where either price is unknown
+
+    :return: (changes, latest prices, earlier prices)
+    """
+    if filled.shape[1] <= window:
+        nan = np.full(filled.shape[0], np.nan, dtype=np.float32)
+        return nan, filled[:, -1] if filled.shape[1] else nan, nan
+    latest, earlier = filled[:, -1], filled[:, -1 - window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        changes = (latest - earlier) / earlier * 100
+    return changes, latest, earlier
+
+
+class PriceRanking:
+    """
+    commodities ranked by percent price change, computed for every window
+    and category at once so a top-k request is a slice
+
+    :param commodities: (id, category, name, values, start, step_months) per commodity
+    :param windows: windows in months to rank by
+    """
+
+    def __init__(self, commodities, windows):
+        self.windows = tuple(windows)
+        self.ids = [c[0] for c in commodities]
+        self.categories = np.array([c[1] for c in commodities], dtype=object)
+        self.names = [c[2] for c in commodities]
+        matrix, _ = align_series([(c[3], c[4], c[5]) for c in commodities])
+        filled = forward_fill(matrix)
+        self.changes = {}
+        self.orders = {}
+        groups = {None: np.arange(len(commodities))}
+        for category in dict.fromkeys(self.categories):
+            groups[category] = np.flatnonzero(self.categories == category)
+        for window in self.windows:
+            changes, latest, earlier = window_changes(filled, window)
+            self.changes[window] = (changes, latest, earlier)
+            for category, rows in groups.items():
+                rows = rows[~np.isnan(changes[rows])]
+                # stable sort keeps upstream order between equal changes
+                self.orders[category, window] = rows[np.argsort(-changes[rows], kind="stable")]
+
+    def top(self, window, k, category=None, ascending=False):
+        """
+        the k fastest rising (or falling when ascending) commodities
+
+        :return: list of dicts, None if the category is unknown
+        """
+        order = self.orders.get((category, window))
+        if order is None:
+            return None
+        rows = order[::-1][:k] if ascending else order[:k]
+        changes, latest, earlier = self.changes[window]
+        return [
+            {
+                "id": self.ids[row],
+                "category": self.categories[row],
+                "name": self.names[row],
+                "change": round(float(changes[row]), 2),
+                "latest": round(float(latest[row]), 2),
+                "previous": round(float(earlier[row]), 2),
+            }
+            for row in rows
+        ]
@@ -0,0 +1,45 @@
+"""
+compare two endpoint benchmark results written by test_endpoint_suite
+
+    python tests/benchmark/compare.py results/old.json results/new.json
+"""
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def change(old, new):
+    if not old:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def compare(old, new):
+    lines = [
+        f"{'scenario':20} {'p50 ms':>19} {'':>7} {'p99 ms':>19} {'':>7} {'throughput/s':>19} {'':>7}",
+    ]
+    for name in sorted(old["results"].keys() | new["results"].keys()):
+        a, b = old["results"].get(name), new["results"].get(name)
+        if a is None or b is None:
+            lines.append(f"{name:20} only in {'new' if a is None else 'old'}")
+            continue
+        lines.append(
+            f"{name:20} "
+            + " ".join(
+                f"{a[key]:9.1f} {b[key]:9.1f} {change(a[key], b[key])}"
+                for key in ("p50_ms", "p99_ms", "throughput")
+            )
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    old, new = load(sys.argv[1]), load(sys.argv[2])
+    print(f"{old['commit']} -> {new['commit']}")
+    print(compare(old, new))
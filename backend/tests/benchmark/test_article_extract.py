@@ -0,0 +1,61 @@
+import time
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup, SoupStrainer
+
+from article_html import extract_article
+
+FIXTURES = Path(__file__).parent.parent / "fixtures"
+PAGES = ["udn_article.html", "udn_article_inline_tags.html", "udn_video_no_editor.html"]
+ROUNDS = 20
+
+
+def full_tree(html, **kwargs):
+    """the whole-page BeautifulSoup parse the extractor replaced"""
+    soup = BeautifulSoup(html, "html.parser", **kwargs)
+    title = soup.find("h1", class_="article-content__title")
+    time_ = soup.find("time", class_="article-content__time")
+    section = soup.find("section", class_="article-content__editor")
+    if title is None or time_ is None or section is None:
+        return None
+    paragraphs = [
+        p.text for p in section.find_all("p") if p.text.strip() != "" and "▪" not in p.text
+    ]
+    return title.text, time_.text, paragraphs
+
+
+def strained_tree(html):
+    return full_tree(html, parse_only=SoupStrainer(["h1", "time", "section"]))
+
+
+def per_page_ms(parse, pages):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for html in pages:
+            parse(html)
+    return (time.perf_counter() - start) / (ROUNDS * len(pages)) * 1000
+
+
+@pytest.fixture(scope="module")
+def pages():
+    return [(FIXTURES / name).read_text(encoding="utf-8") for name in PAGES]
+
+
+def test_extractor_matches_beautifulsoup(pages):
+    for html in pages:
+        page = extract_article(html)
+        assert (tuple(page) if page else None) == full_tree(html)
+
+
+def test_extractor_speed(pages):
+    full = per_page_ms(full_tree, pages)
+    strained = per_page_ms(strained_tree, pages)
+    extracted = per_page_ms(extract_article, pages)
+
+    print(
+        f"\n{len(pages)} saved pages of ~100KB: BeautifulSoup html.parser {full:.1f}ms/page, "
+        f"with SoupStrainer {strained:.1f}ms/page, extract_article {extracted:.2f}ms/page"
+    )
+    assert extracted < full / 5
+    assert extracted < strained
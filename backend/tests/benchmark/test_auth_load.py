@@ -0,0 +1,149 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+import main
+from main import Base, NewsArticle, User, app, pwd_context, session_opener, user_cache
+from tests.fake_upstream import serve_in_thread
+
+SECRET_KEY = "1892dhianiandowqd0n"
+ALGORITHM = "HS256"
+FEED_REQUESTS = 200
+CONCURRENT_LOGINS = 8
+
+
+@pytest.fixture
+def auth_db(tmp_path, monkeypatch):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'auth.db'}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": 1, "username": "reader", "hashed_password": pwd_context.hash("password")}
+        ])
+        conn.execute(insert(NewsArticle), [
+            {
+                "url": f"https://example.com/news-{i}",
+                "title": f"News {i}",
+                "time": f"2024-08-01 12:{i:02d}",
+                "content": "content",
+                "summary": "summary",
+                "reason": "reason",
+            }
+            for i in range(20)
+        ])
+    session_local = sessionmaker(bind=engine)
+
+    def override_session_opener():
+        db = session_local()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setitem(app.dependency_overrides, session_opener, override_session_opener)
+    user_cache.clear()
+    yield engine
+    user_cache.clear()
+
+
+def user_queries(engine):
+    """list collecting the statements that look up a user"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    return statements
+
+
+def feed_throughput(client, headers, cached):
+    start = time.perf_counter()
+    for _ in range(FEED_REQUESTS):
+        if not cached:
+            user_cache.clear()
+        assert client.get("/api/v1/news/user_news?limit=20", headers=headers).status_code == 200
+    return FEED_REQUESTS / (time.perf_counter() - start)
+
+
+def test_authenticated_feed_throughput(auth_db):
+    client = TestClient(app)
+    token = jwt.encode({"sub": "reader"}, SECRET_KEY, algorithm=ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    statements = user_queries(auth_db)
+    uncached = feed_throughput(client, headers, cached=False)
+    uncached_lookups = len(statements)
+    statements.clear()
+    cached = feed_throughput(client, headers, cached=True)
+    cached_lookups = len(statements)
+
+    print(
+        f"\n/user_news without user cache {uncached:.0f} req/s ({uncached_lookups} user queries), "
+        f"with user cache {cached:.0f} req/s ({cached_lookups} user queries)"
+    )
+    assert uncached_lookups == FEED_REQUESTS
+    assert cached_lookups <= 1
+
+
+async def login_load(url):
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        idle = []
+        for _ in range(10):
+            start = time.perf_counter()
+            assert (await client.get("/api/v1/news/news?limit=5")).status_code == 200
+            idle.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        logins = [
+            asyncio.create_task(
+                client.post(
+                    "/api/v1/users/login", data={"username": "reader", "password": "password"}
+                )
+            )
+            for _ in range(CONCURRENT_LOGINS)
+        ]
+        await asyncio.sleep(0.05)
+        loaded = []
+        while not all(task.done() for task in logins):
+            probe = time.perf_counter()
+            assert (await client.get("/api/v1/news/news?limit=5")).status_code == 200
+            loaded.append(time.perf_counter() - probe)
+        responses = await asyncio.gather(*logins)
+        elapsed = time.perf_counter() - start
+    return idle, loaded, responses, elapsed
+
+
+def test_concurrent_logins_keep_the_loop_free(auth_db):
+    start = time.perf_counter()
+    pwd_context.verify("password", pwd_context.hash("password"))
+    # one hash and one verify at the configured cost
+    bcrypt_seconds = (time.perf_counter() - start) / 2
+
+    server, thread, url = serve_in_thread(app)
+    try:
+        idle, loaded, responses, elapsed = asyncio.run(login_load(url))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    print(
+        f"\n{CONCURRENT_LOGINS} logins at {main.BCRYPT_ROUNDS} rounds on "
+        f"{main.AUTH_HASH_WORKERS} workers took {elapsed:.2f}s "
+        f"(one verify {bcrypt_seconds * 1000:.0f}ms); "
+        f"/news p50 idle {statistics.median(idle) * 1000:.1f}ms, "
+        f"during logins {statistics.median(loaded) * 1000:.1f}ms over {len(loaded)} requests"
+    )
+    assert all(r.status_code == 200 for r in responses)
+    # verifying on the event loop would hold each feed request for a whole bcrypt run
+    assert statistics.median(loaded) < bcrypt_seconds / 2
@@ -0,0 +1,315 @@
+"""
+Load benchmark of the feed, search, summary, upvote, price and ingest paths
+against a seeded file database and the fake upstreams, over real sockets.
+
+Every scenario reports p50/p99 latency and throughput; the results of a run
+are written as JSON to BENCHMARK_RESULTS_DIR (tests/benchmark/results by
+default) under the current commit, compare two runs with
+`python tests/benchmark/compare.py old.json new.json`.
+
+BENCHMARK_ARTICLES, BENCHMARK_REQUESTS and BENCHMARK_CONCURRENCY scale a run.
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import pytest
+from jose import jwt
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+import main
+from database import create_database_engine
+from feed_snapshot import FeedSnapshotCache
+from main import Base, NewsArticle, User, app, session_opener, user_news_association_table
+from tests.fake_upstream import FakeUpstream, serve_in_thread
+from ttl_cache import TTLCache
+
+SECRET_KEY = "1892dhianiandowqd0n"
+ALGORITHM = "HS256"
+ARTICLE_COUNT = int(os.environ.get("BENCHMARK_ARTICLES", "20000"))
+REQUESTS = int(os.environ.get("BENCHMARK_REQUESTS", "200"))
+CONCURRENCY = int(os.environ.get("BENCHMARK_CONCURRENCY", "16"))
+RESULTS_DIR = Path(os.environ.get("BENCHMARK_RESULTS_DIR", Path(__file__).parent / "results"))
+USER_COUNT = 200
+UPVOTE_COUNT = ARTICLE_COUNT * 2
+UPSTREAM_LATENCY = 0.05
+PRICE_COUNT = 300
+INGEST_PER_PAGE = 10
+INGEST_CYCLES = 3
+WORDS = [
+    "油價", "電價", "物價", "通膨", "上漲", "下跌", "颱風", "蔬菜", "雞蛋", "稻米",
+    "央行", "升息", "薪資", "房價", "匯率", "出口", "能源", "運費", "缺貨", "補貼",
+]
+QUERIES = ["油價上漲", "颱風 蔬菜", "央行升息", "雞蛋缺貨", "能源 補貼", "匯率 出口"]
+
+
+def sentence(rng, words):
+    return "".join(rng.choice(WORDS) for _ in range(words)) + "。"
+
+
+def seed_database(path):
+    """
+    file database with ARTICLE_COUNT articles over a year, USER_COUNT users
+    and UPVOTE_COUNT upvotes, indexed for search
+
+    :return: sessionmaker
+    """
+    engine = create_database_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "username": f"reader{i}", "hashed_password": "x"}
+            for i in range(1, USER_COUNT + 1)
+        ])
+        conn.execute(insert(NewsArticle), [
+            {
+                "id": i,
+                "url": f"https://example.com/news-{i}",
+                "title": sentence(rng, 4),
+                "time": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d} {i // 60 % 24:02d}:{i % 60:02d}",
+                "content": sentence(rng, 30),
+                "summary": sentence(rng, 8),
+                "reason": sentence(rng, 8),
+            }
+            for i in range(1, ARTICLE_COUNT + 1)
+        ])
+        pairs = {
+            (rng.randint(1, USER_COUNT), rng.randint(1, ARTICLE_COUNT)) for _ in range(UPVOTE_COUNT)
+        }
+        conn.execute(insert(user_news_association_table), [
+            {"user_id": u, "news_articles_id": a} for u, a in pairs
+        ])
+    session_local = sessionmaker(bind=engine)
+    main.repair_upvote_counts(session_local)
+    main.sync_news_search_index(session_local)
+    return session_local
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+@pytest.fixture(scope="module")
+def results():
+    collected = {}
+    yield collected
+    commit = current_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "articles": ARTICLE_COUNT,
+            "requests": REQUESTS,
+            "concurrency": CONCURRENCY,
+            "upstream_latency": UPSTREAM_LATENCY,
+        },
+        "results": collected,
+    }
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nbenchmark results written to {path}")
+    for name, result in collected.items():
+        print(
+            f"{name:20} p50 {result['p50_ms']:8.1f}ms  p99 {result['p99_ms']:8.1f}ms  "
+            f"{result['throughput']:8.1f}/s  errors {result['errors']}"
+        )
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    with FakeUpstream(
+            latency=UPSTREAM_LATENCY, per_page=INGEST_PER_PAGE, price_count=PRICE_COUNT
+    ) as fake:
+        yield fake
+
+
+@pytest.fixture(scope="module")
+def session_local(tmp_path_factory):
+    return seed_database(tmp_path_factory.mktemp("bench") / "news.db")
+
+
+@pytest.fixture(scope="module")
+def app_url(session_local, upstream):
+    def override_session_opener():
+        db = session_local()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    patch = pytest.MonkeyPatch()
+    patch.setattr(main, "UDN_BASE_URL", upstream.url)
+    patch.setattr(main, "OPENAI_BASE_URL", f"{upstream.url}/v1")
+    patch.setattr(main, "NECESSITIES_PRICE_URL", upstream.prices_url)
+    patch.setattr(main, "shared_clients", {})
+    patch.setattr(main, "relevance_classifier", main.RelevanceClassifier(main.OpenAIRelevanceBackend()))
+    patch.setattr(main, "known_news_urls", main.RecentUrls(main.KNOWN_URL_CACHE_SIZE))
+    patch.setitem(app.dependency_overrides, session_opener, override_session_opener)
+    # caches of their own, nothing cached here leaks into other tests
+    for name in ("keyword_cache", "article_cache", "user_cache"):
+        cache = getattr(main, name)
+        patch.setattr(main, name, TTLCache(cache.ttl, cache.max_bytes))
+    patch.setattr(main, "feed_snapshots", FeedSnapshotCache(main.FEED_SNAPSHOT_TTL, main.FEED_SNAPSHOT_PAGES))
+    server, thread, url = serve_in_thread(app)
+    yield url
+    server.should_exit = True
+    thread.join()
+    patch.undo()
+
+
+def token_headers(user_id):
+    token = jwt.encode({"sub": f"reader{user_id}"}, SECRET_KEY, algorithm=ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def summarise(latencies, errors, elapsed, unit_count=None):
+    """p50/p99 in milliseconds and throughput in units (requests by default) per second"""
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, round(len(ordered) * 0.99) - 1)]
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "throughput": round((unit_count or len(latencies)) / elapsed, 2),
+    }
+
+
+async def run_load(url, make_request, requests=REQUESTS, concurrency=CONCURRENCY):
+    """
+    send `requests` requests, `concurrency` at a time
+
+    :param make_request: async callable (client, request number) -> response
+    """
+    latencies, errors = [], 0
+    numbers = itertools.count()
+
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        async def worker():
+            nonlocal errors
+            while (i := next(numbers)) < requests:
+                start = time.perf_counter()
+                response = await make_request(client, i)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code >= 400
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return summarise(latencies, errors, elapsed)
+
+
+def benchmark(results, name, url, make_request, **kwargs):
+    result = asyncio.run(run_load(url, make_request, **kwargs))
+    results[name] = result
+    assert result["errors"] == 0, result
+    return result
+
+
+def test_feed(app_url, results):
+    walk = [None]
+    with httpx.Client(base_url=app_url) as client:
+        for _ in range(20):
+            walk.append(
+                client.get("/api/v1/news/news", params={"limit": 50, "cursor": walk[-1]})
+                .headers["X-Next-Cursor"]
+            )
+
+    benchmark(results, "feed_anonymous", app_url,
+              lambda c, i: c.get("/api/v1/news/news", params={"limit": 50}))
+    benchmark(results, "feed_paged", app_url,
+              lambda c, i: c.get("/api/v1/news/news", params={"limit": 50, "cursor": walk[i % len(walk)]}))
+    benchmark(results, "feed_user", app_url,
+              lambda c, i: c.get("/api/v1/news/user_news", params={"limit": 50},
+                                 headers=token_headers(i % USER_COUNT + 1)))
+
+
+def test_search(app_url, results):
+    benchmark(results, "search_stored", app_url,
+              lambda c, i: c.get("/api/v1/news/search", params={"q": QUERIES[i % len(QUERIES)]}))
+    # distinct prompts miss the keyword and article caches
+    benchmark(results, "search_live", app_url,
+              lambda c, i: c.post("/api/v1/news/search_news", json={"prompt": f"雞蛋價格 {i}"}),
+              requests=max(1, REQUESTS // 4))
+
+
+def test_summary(app_url, results):
+    benchmark(results, "summary", app_url,
+              lambda c, i: c.post("/api/v1/news/news_summary",
+                                  json={"content": f"{sentence(random.Random(i), 20)} {i}"},
+                                  headers=token_headers(i % USER_COUNT + 1)))
+
+
+def test_upvote(app_url, results):
+    rng = random.Random(1)
+    votes = [(rng.randint(1, USER_COUNT), rng.randint(1, ARTICLE_COUNT)) for _ in range(REQUESTS)]
+    benchmark(results, "upvote", app_url,
+              lambda c, i: c.post(f"/api/v1/news/{votes[i][1]}/upvote",
+                                  headers=token_headers(votes[i][0])))
+
+
+def test_prices(app_url, session_local, results):
+    start = time.perf_counter()
+    refresh = main.refresh_necessities_prices(session_local)
+    results["price_refresh"] = summarise([time.perf_counter() - start], 0, time.perf_counter() - start)
+    assert refresh is not None and refresh.item_count == PRICE_COUNT
+
+    benchmark(results, "price_list", app_url,
+              lambda c, i: c.get("/api/v1/prices/necessities-price"))
+    benchmark(results, "price_series", app_url,
+              lambda c, i: c.get(f"/api/v1/prices/{i % PRICE_COUNT + 1}/series", params={"points": 50}))
+    benchmark(results, "price_ranking", app_url,
+              lambda c, i: c.get("/api/v1/prices/ranking", params={"window": 12, "k": 20}))
+
+
+def ingest_cycles(upstream, session_local, name, results):
+    """
+    initial crawls of fresh list editions, throughput counts stored articles
+    """
+    durations, stored, failed = [], 0, 0
+    start = time.perf_counter()
+    for _ in range(INGEST_CYCLES):
+        upstream.edition += 1
+        cycle = time.perf_counter()
+        stats = main.IngestStats()
+        records = asyncio.run(main.ingest_news(is_initial=True, stats=stats, session_factory=session_local))
+        inserted, _ = main.add_news(records, session_local)
+        durations.append(time.perf_counter() - cycle)
+        stored += inserted
+        failed += stats.failed
+    results[name] = summarise(durations, failed, time.perf_counter() - start, unit_count=stored)
+    return stored, failed
+
+
+def test_ingest(app_url, upstream, session_local, results):
+    stored, failed = ingest_cycles(upstream, session_local, "ingest", results)
+
+    assert (stored, failed) == (INGEST_CYCLES * 9 * INGEST_PER_PAGE, 0)
+
+
+def test_ingest_with_upstream_errors(app_url, upstream, session_local, results, monkeypatch):
+    monkeypatch.setattr(upstream, "error_rate", {"list": 0.05, "article": 0.05, "chat": 0.05})
+    errors_before = sum(upstream.errors.values())
+
+    stored, failed = ingest_cycles(upstream, session_local, "ingest_5pct_errors", results)
+
+    print(f"\n{sum(upstream.errors.values()) - errors_before} injected errors, {failed} articles lost")
+    # retries absorb most injected errors
+    assert stored + failed == INGEST_CYCLES * 9 * INGEST_PER_PAGE
+    assert stored > 0.9 * INGEST_CYCLES * 9 * INGEST_PER_PAGE
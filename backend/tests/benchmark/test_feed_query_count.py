@@ -0,0 +1,209 @@
+import time
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import StaticPool, create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from main import Base, NewsArticle, User, session_opener, user_news_association_table
+from main import feed_snapshots, query_news_page, read_news_page, repair_upvote_counts, user_cache
+
+SECRET_KEY = "1892dhianiandowqd0n"
+ALGORITHM = "HS256"
+USER_COUNT = 50
+
+client = TestClient(app)
+
+
+def upvote_pairs(article_count, upvote_count):
+    """
+    spread upvotes evenly over articles, each (user, article) pair unique
+    as long as upvote_count <= article_count * USER_COUNT
+    """
+    return [
+        ((i // article_count * 7 + i) % USER_COUNT + 1, i % article_count + 1)
+        for i in range(upvote_count)
+    ]
+
+
+def seed_feed_database(article_count, upvote_count):
+    """
+    create an in-memory database with `article_count` articles and
+    `upvote_count` upvotes spread over USER_COUNT users
+    """
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [
+                {"id": i, "username": f"user{i}", "hashed_password": "x"}
+                for i in range(1, USER_COUNT + 1)
+            ],
+        )
+        conn.execute(
+            insert(NewsArticle),
+            [
+                {
+                    "id": i,
+                    "url": f"https://example.com/news-{i}",
+                    "title": f"News {i}",
+                    "time": f"2024-01-01 {i // 60 % 24:02d}:{i % 60:02d}",
+                    "content": "content " * 20,
+                    "summary": "summary",
+                    "reason": "reason",
+                }
+                for i in range(1, article_count + 1)
+            ],
+        )
+        conn.execute(
+            insert(user_news_association_table),
+            [
+                {"user_id": user_id, "news_articles_id": article_id}
+                for user_id, article_id in upvote_pairs(article_count, upvote_count)
+            ],
+        )
+    # the upvotes were inserted behind toggle_upvote's back
+    repair_upvote_counts(sessionmaker(bind=engine))
+    return engine
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self)
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def measure_feed(engine, url, headers=None):
+    """
+    request `url` against `engine` and return (queries, seconds, payload)
+    """
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # count the token's user lookup and the page query on every measurement
+    user_cache.clear()
+    feed_snapshots.bump()
+
+    def override_session_opener():
+        db = session_local()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previous = app.dependency_overrides.get(session_opener)
+    app.dependency_overrides[session_opener] = override_session_opener
+    counter = QueryCounter(engine)
+    try:
+        start = time.perf_counter()
+        response = client.get(url, headers=headers or {})
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+        if previous is None:
+            app.dependency_overrides.pop(session_opener, None)
+        else:
+            app.dependency_overrides[session_opener] = previous
+    assert response.status_code == 200
+    return counter.count, elapsed, response.json()
+
+
+@pytest.fixture(scope="module")
+def small_feed_db():
+    return seed_feed_database(article_count=100, upvote_count=500)
+
+
+@pytest.fixture(scope="module")
+def large_feed_db():
+    return seed_feed_database(article_count=10_000, upvote_count=50_000)
+
+
+@pytest.fixture(scope="module")
+def user_token():
+    return jwt.encode({"sub": "user1"}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def test_read_news_query_count_is_constant(small_feed_db, large_feed_db):
+    small_queries, small_elapsed, small = measure_feed(small_feed_db, "/api/v1/news/news?limit=200")
+    large_queries, large_elapsed, large = measure_feed(large_feed_db, "/api/v1/news/news?limit=200")
+    print(
+        f"\n/news: 100 articles {small_queries} queries {small_elapsed:.3f}s, "
+        f"10k articles {large_queries} queries {large_elapsed:.3f}s"
+    )
+    assert small_queries == large_queries
+    assert len(small) == 100 and len(large) == 200
+    assert sum(n["upvotes"] for n in small) == 500
+    assert all(n["upvotes"] == 5 for n in large)
+    assert not any(n["is_upvoted"] for n in large)
+
+
+def test_read_user_news_query_count_is_constant(small_feed_db, large_feed_db, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    small_queries, small_elapsed, small = measure_feed(small_feed_db, "/api/v1/news/user_news?limit=200", headers)
+    large_queries, large_elapsed, large = measure_feed(large_feed_db, "/api/v1/news/user_news?limit=200", headers)
+    print(
+        f"\n/user_news: 100 articles {small_queries} queries {small_elapsed:.3f}s, "
+        f"10k articles {large_queries} queries {large_elapsed:.3f}s"
+    )
+    assert small_queries == large_queries
+    assert sum(n["upvotes"] for n in small) == 500
+    upvoted_by_user1 = {a for u, a in upvote_pairs(10_000, 50_000) if u == 1}
+    assert all(n["is_upvoted"] == (n["id"] in upvoted_by_user1) for n in large)
+    assert any(n["is_upvoted"] for n in large)
+
+
+def test_feed_page_is_an_index_range_scan(large_feed_db):
+    queries = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "news_articles" in statement:
+            queries.append((statement, parameters))
+
+    event.listen(large_feed_db, "before_cursor_execute", record)
+    try:
+        measure_feed(large_feed_db, "/api/v1/news/news?limit=50&since=2024-01-01T06:00:00")
+    finally:
+        event.remove(large_feed_db, "before_cursor_execute", record)
+    statement, parameters = queries[-1]
+    with large_feed_db.connect() as conn:
+        plan = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+    print("\n" + "\n".join(plan))
+    assert any("USING INDEX ix_news_articles_published_at_id (published_at>?)" in step for step in plan)
+    assert not any("TEMP B-TREE FOR ORDER BY" in step for step in plan)
+
+
+def test_anonymous_feed_snapshot_hit(large_feed_db):
+    url = "/api/v1/news/news?limit=200"
+    cold_queries, cold_elapsed, cold = measure_feed(large_feed_db, url)
+
+    session_local = sessionmaker(bind=large_feed_db)
+    counter = QueryCounter(large_feed_db)
+    try:
+        start = time.perf_counter()
+        for _ in range(100):
+            with session_local() as db:
+                response = read_news_page(db, None, 200, None)
+        warm_elapsed = (time.perf_counter() - start) / 100
+        start = time.perf_counter()
+        for _ in range(20):
+            with session_local() as db:
+                items, _ = query_news_page(db, 200, None)
+                orjson.dumps(items)
+        rebuild_elapsed = (time.perf_counter() - start) / 20
+    finally:
+        event.remove(large_feed_db, "before_cursor_execute", counter)
+    print(
+        f"\n/news?limit=200 cold {cold_queries} queries {cold_elapsed * 1000:.1f}ms; "
+        f"page rebuild {rebuild_elapsed * 1000:.2f}ms, snapshot hit {warm_elapsed * 1000:.3f}ms "
+        f"({rebuild_elapsed / warm_elapsed:.0f}x)"
+    )
+    # the 100 snapshot hits ran no query, only the 20 rebuilds did
+    assert counter.count == 20 * cold_queries
+    assert orjson.loads(response.body) == cold
@@ -0,0 +1,35 @@
+"""
+Time `import main` in a fresh interpreter, on top of the frameworks it is
+built on, which are imported first and left out of the measurement.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[2]
+# 0.25-0.40s measured locally; with openai and bs4 imported eagerly it was
+# 0.84s or more, so the budget still catches that with room for slower machines
+IMPORT_BUDGET = 0.8
+RUNS = 3
+
+IMPORT_SCRIPT = """
+import time
+import fastapi, sqlalchemy.orm, pydantic, httpx
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+
+def test_import_time_budget(tmp_path):
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'news.db'}"}
+    timings = []
+    for _ in range(RUNS):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT],
+            cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+        )
+        timings.append(float(result.stdout.splitlines()[-1]))
+    print(f"\nimport main: best {min(timings):.3f}s of {RUNS}")
+    assert min(timings) < IMPORT_BUDGET
@@ -0,0 +1,170 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import StaticPool, create_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from main import Base, NewsArticle
+from tests.fake_upstream import FakeUpstream, article_time, article_title
+
+LATENCY = 0.05
+PER_PAGE = 10
+
+
+@pytest.fixture(scope="module")
+def fake_upstream():
+    with FakeUpstream(latency=LATENCY, per_page=PER_PAGE) as upstream:
+        yield upstream
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def ingest_against(fake_upstream, monkeypatch):
+    monkeypatch.setattr(main, "UDN_BASE_URL", fake_upstream.url)
+    monkeypatch.setattr(main, "OPENAI_BASE_URL", f"{fake_upstream.url}/v1")
+    monkeypatch.setattr(main, "relevance_classifier", main.RelevanceClassifier(main.OpenAIRelevanceBackend()))
+    monkeypatch.setattr(main, "known_news_urls", main.RecentUrls(main.KNOWN_URL_CACHE_SIZE))
+    for key in fake_upstream.calls:
+        fake_upstream.calls[key] = 0
+    return fake_upstream
+
+
+def test_initial_crawl_wall_clock(ingest_against, session_factory):
+    start = time.perf_counter()
+    records = asyncio.run(main.ingest_news(is_initial=True, session_factory=session_factory))
+    elapsed = time.perf_counter() - start
+
+    calls = ingest_against.calls
+    serial = sum(calls.values()) * LATENCY
+    print(
+        f"\n9-page initial crawl: {len(records)} records, {calls} upstream calls, "
+        f"{elapsed:.2f}s wall clock vs {serial:.2f}s of serial upstream latency"
+    )
+    # one relevance request per RELEVANCE_BATCH_SIZE titles, one summary per article
+    assert calls == {"list": 9, "article": 9 * PER_PAGE, "chat": 2 + 9 * PER_PAGE, "prices": 0}
+    assert len(records) == 9 * PER_PAGE
+    assert elapsed < serial / 2
+
+
+def test_ingest_records_match_add_new_format(ingest_against, session_factory):
+    records = asyncio.run(main.ingest_news(session_factory=session_factory))
+
+    assert len(records) == PER_PAGE
+    first = records[0]
+    title = article_title(1, 0)
+    assert first["url"] == f"{ingest_against.url}/news/story/1/0"
+    assert first["title"] == title
+    assert first["time"] == article_time(1, 0)
+    assert first["content"] == [f"{title} 第一段內容。", f"{title} 第二段內容。"]
+    assert first["summary"].startswith("影響:")
+    assert first["reason"].startswith("原因:")
+
+
+def test_stored_articles_are_skipped_before_fetching(ingest_against, session_factory):
+    with session_factory() as db:
+        db.add_all(
+            NewsArticle(
+                url=f"{ingest_against.url}/news/story/1/{i}",
+                title=article_title(1, i),
+                time=article_time(1, i),
+                content="stored",
+                summary="stored",
+                reason="stored",
+            )
+            for i in range(3)
+        )
+        db.commit()
+    stats = main.IngestStats()
+
+    records = asyncio.run(main.ingest_news(stats=stats, session_factory=session_factory))
+
+    assert len(records) == PER_PAGE - 3
+    assert (stats.skipped, stats.irrelevant, stats.failed) == (3, 0, 0)
+    assert ingest_against.calls["article"] == PER_PAGE - 3
+    # the urls found in the database are now answered from memory
+    assert all(f"{ingest_against.url}/news/story/1/{i}" in main.known_news_urls for i in range(3))
+
+
+def test_dedup_defaults_to_the_configured_session(ingest_against, session_factory, monkeypatch):
+    # the scheduled get_new passes no session_factory
+    monkeypatch.setitem(main.Session.kw, "bind", session_factory.kw["bind"])
+    with session_factory() as db:
+        db.add(NewsArticle(
+            url=f"{ingest_against.url}/news/story/1/0",
+            title=article_title(1, 0),
+            time=article_time(1, 0),
+            content="stored",
+            summary="stored",
+            reason="stored",
+        ))
+        db.commit()
+    stats = main.IngestStats()
+
+    records = asyncio.run(main.ingest_news(stats=stats))
+
+    assert len(records) == PER_PAGE - 1
+    assert stats.skipped == 1
+
+
+def test_ingest_stages_are_timed(ingest_against, session_factory):
+    before = {
+        stage: main.ingest_stage_duration.labels(stage).snapshot()[0][-1]
+        for stage in ("list", "dedup", "relevance", "article_fetch", "article_parse", "summary")
+    }
+    calls_before = main.upstream_requests.labels("127.0.0.1", "2xx").value
+
+    asyncio.run(main.ingest_news(session_factory=session_factory))
+
+    observed = {
+        stage: main.ingest_stage_duration.labels(stage).snapshot()[0][-1] - count
+        for stage, count in before.items()
+    }
+    metrics = main.metrics_registry.render()
+    print("\n" + "\n".join(l for l in metrics.splitlines() if l.startswith("ingest_stage_duration_seconds_sum")))
+    assert observed == {
+        "list": 1, "dedup": 1, "relevance": 1,
+        "article_fetch": PER_PAGE, "article_parse": PER_PAGE, "summary": PER_PAGE,
+    }
+    # list page, articles, one relevance batch and the summaries
+    assert main.upstream_requests.labels("127.0.0.1", "2xx").value - calls_before == 1 + PER_PAGE + 1 + PER_PAGE
+
+
+def test_relevance_batches_share_the_cycle_llm_client(ingest_against, session_factory, monkeypatch):
+    created = []
+    new_llm_client = main.new_llm_client
+
+    def counting_llm_client():
+        created.append(1)
+        return new_llm_client()
+
+    monkeypatch.setattr(main, "new_llm_client", counting_llm_client)
+
+    asyncio.run(main.ingest_news(is_initial=True, session_factory=session_factory))
+
+    # two relevance batches and the summaries, all on one client
+    assert ingest_against.calls["chat"] == 2 + 9 * PER_PAGE
+    assert len(created) == 1
+
+
+def test_failed_relevance_batch_counts_as_failed(ingest_against, session_factory, monkeypatch):
+    async def failing_backend(titles, llm):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(main, "relevance_classifier", main.RelevanceClassifier(failing_backend))
+    stats = main.IngestStats()
+
+    records = asyncio.run(main.ingest_news(stats=stats, session_factory=session_factory))
+
+    assert records == []
+    assert (stats.failed, stats.irrelevant) == (PER_PAGE, 0)
+    assert ingest_against.calls["article"] == 0
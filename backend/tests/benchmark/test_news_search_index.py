@@ -0,0 +1,112 @@
+import random
+import statistics
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import StaticPool, create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+import news_search
+from main import Base, NewsArticle, app, session_opener
+
+ARTICLE_COUNT = 100_000
+WORDS = [
+    "油價", "電價", "物價", "通膨", "上漲", "下跌", "颱風", "蔬菜", "雞蛋", "稻米",
+    "台積電", "央行", "升息", "降息", "薪資", "房價", "匯率", "出口", "進口", "供應鏈",
+    "消費者", "零售", "批發", "能源", "天然氣", "運費", "港口", "缺貨", "補貼", "關稅",
+]
+# filler words of random common characters so topic words are not in every article
+_filler_rng = random.Random(1)
+FILLER = ["".join(chr(_filler_rng.randrange(0x4E00, 0x6000)) for _ in range(2)) for _ in range(3000)]
+QUERIES = ["油價上漲", "颱風 蔬菜", "央行升息", "雞蛋缺貨", "天然氣 補貼", "台積電 出口", "CPI"]
+
+client = TestClient(app)
+
+
+def sentence(rng, words):
+    return "".join(
+        rng.choice(WORDS) if rng.random() < 0.2 else rng.choice(FILLER) for _ in range(words)
+    ) + "。"
+
+
+@pytest.fixture(scope="module")
+def search_engine():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(NewsArticle),
+            [
+                {
+                    "id": i,
+                    "url": f"https://example.com/news-{i}",
+                    "title": sentence(rng, 4),
+                    "time": f"2024-01-01 {i // 60 % 24:02d}:{i % 60:02d}",
+                    "content": sentence(rng, 12) + sentence(rng, 12),
+                    "summary": sentence(rng, 6),
+                    "reason": sentence(rng, 6),
+                }
+                for i in range(1, ARTICLE_COUNT + 1)
+            ],
+        )
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        indexed = news_search.sync_index(conn)
+    print(f"\nindexed {indexed} articles in {time.perf_counter() - start:.1f}s")
+    assert indexed == ARTICLE_COUNT
+    return engine
+
+
+@pytest.fixture
+def search_client(search_engine):
+    session_local = sessionmaker(bind=search_engine)
+
+    def override_session_opener():
+        db = session_local()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previous = app.dependency_overrides.get(session_opener)
+    app.dependency_overrides[session_opener] = override_session_opener
+    yield client
+    if previous is None:
+        app.dependency_overrides.pop(session_opener, None)
+    else:
+        app.dependency_overrides[session_opener] = previous
+
+
+def test_search_on_100k_articles_takes_milliseconds(search_client):
+    latencies = []
+    for _ in range(5):
+        for query in QUERIES:
+            start = time.perf_counter()
+            response = search_client.get("/api/v1/news/search", params={"q": query, "limit": 20})
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"\n/search on {ARTICLE_COUNT} articles: p50 {p50 * 1000:.1f}ms p99 {p99 * 1000:.1f}ms")
+    assert p50 < 0.05
+
+
+def test_search_finds_what_a_scan_finds(search_engine):
+    with search_engine.connect() as conn:
+        start = time.perf_counter()
+        scanned = conn.execute(
+            text("SELECT count(*) FROM news_articles WHERE title LIKE '%雞蛋缺貨%' "
+                 "OR content LIKE '%雞蛋缺貨%' OR summary LIKE '%雞蛋缺貨%' OR reason LIKE '%雞蛋缺貨%'")
+        ).scalar()
+        scan_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        found = news_search.search(conn, "雞蛋缺貨", ARTICLE_COUNT)
+        search_elapsed = time.perf_counter() - start
+    print(f"\nLIKE scan {scan_elapsed * 1000:.1f}ms, FTS5 {search_elapsed * 1000:.1f}ms for {len(found)} matches")
+    # bigram phrases also match across sentence boundaries, so never fewer
+    assert len(found) >= scanned > 0
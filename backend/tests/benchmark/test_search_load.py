@@ -0,0 +1,92 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from main import Base, NewsArticle, app, session_opener
+from tests.fake_upstream import FakeUpstream, serve_in_thread
+
+LATENCY = 0.2
+PER_PAGE = 5
+CONCURRENT_SEARCHES = 20
+
+
+@pytest.fixture
+def app_url(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'feed.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_local = sessionmaker(bind=engine)
+    with session_local() as db:
+        db.add_all(
+            NewsArticle(
+                url=f"https://example.com/news-{i}",
+                title=f"News {i}",
+                time=f"2024-08-01 12:{i:02d}",
+                content="content",
+                summary="summary",
+                reason="reason",
+            )
+            for i in range(50)
+        )
+        db.commit()
+
+    def override_session_opener():
+        db = session_local()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with FakeUpstream(latency=LATENCY, per_page=PER_PAGE) as upstream:
+        monkeypatch.setattr(main, "UDN_BASE_URL", upstream.url)
+        monkeypatch.setattr(main, "OPENAI_BASE_URL", f"{upstream.url}/v1")
+        monkeypatch.setattr(main, "shared_clients", {})
+        monkeypatch.setitem(app.dependency_overrides, session_opener, override_session_opener)
+        server, thread, url = serve_in_thread(app)
+        yield url
+        server.should_exit = True
+        thread.join()
+
+
+async def feed_latencies(client, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.get("/api/v1/news/news")
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return latencies
+
+
+async def run_load(url):
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        idle = await feed_latencies(client, 10)
+        searches = [
+            asyncio.create_task(
+                client.post("/api/v1/news/search_news", json={"prompt": f"雞蛋價格 {i}"})
+            )
+            for i in range(CONCURRENT_SEARCHES)
+        ]
+        # let every search reach its upstream calls before probing the feed
+        await asyncio.sleep(LATENCY)
+        loaded = await feed_latencies(client, 10)
+        responses = await asyncio.gather(*searches)
+    return idle, loaded, responses
+
+
+def test_feed_latency_stays_flat_during_searches(app_url):
+    idle, loaded, responses = asyncio.run(run_load(app_url))
+
+    print(
+        f"\n/news p50 idle {statistics.median(idle) * 1000:.1f}ms, "
+        f"with {CONCURRENT_SEARCHES} searches in flight {statistics.median(loaded) * 1000:.1f}ms "
+        f"(max {max(loaded) * 1000:.1f}ms)"
+    )
+    assert all(r.status_code == 200 and len(r.json()) == PER_PAGE for r in responses)
+    # a blocked event loop would hold every feed request for a whole upstream round trip
+    assert statistics.median(loaded) < LATENCY / 2
@@ -0,0 +1,108 @@
+import statistics
+import threading
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import create_database_engine
+from main import Base, NewsArticle, query_news_with_upvote_details
+
+READERS = 8
+DURATION = 2.0
+# a batch larger than sqlite's page cache, spilled to the database file before commit
+WRITE_BATCH = 2000
+# time the writer keeps its transaction open, as a slow ingest cycle does
+WRITE_HOLD = 0.1
+
+
+def news_rows(start, count):
+    return [
+        {
+            "url": f"https://example.com/news-{i}",
+            "title": f"News {i}",
+            "time": f"2024-01-01 {i // 60 % 24:02d}:{i % 60:02d}",
+            "content": "content " * 300,
+            "summary": "summary",
+            "reason": "reason",
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def run_contention(path, journal_mode):
+    """
+    READERS threads read feed pages while one thread keeps writing batches
+    of news, as the ingest job does next to request threads
+
+    :return: (sorted reader latencies, failed reads, batches written, failed writes)
+    """
+    engine = create_database_engine(
+        f"sqlite:///{path}", journal_mode=journal_mode, busy_timeout_ms=5000
+    )
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(NewsArticle), news_rows(0, 1000))
+    session_local = sessionmaker(bind=engine)
+    stop = threading.Event()
+    latencies, failures, written = [], {"read": 0, "write": 0}, [0]
+
+    def read():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with session_local() as db:
+                    query_news_with_upvote_details(db).limit(50).all()
+            except OperationalError:
+                failures["read"] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    def write():
+        offset = 1000
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(NewsArticle), news_rows(offset, WRITE_BATCH))
+                    time.sleep(WRITE_HOLD)
+                written[0] += 1
+            except OperationalError:
+                failures["write"] += 1
+            offset += WRITE_BATCH
+
+    threads = [threading.Thread(target=read) for _ in range(READERS)]
+    threads.append(threading.Thread(target=write))
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return sorted(latencies), failures["read"], written[0], failures["write"]
+
+
+def percentile(latencies, fraction):
+    return latencies[max(0, int(len(latencies) * fraction) - 1)]
+
+
+def test_readers_are_not_blocked_by_ingest_writes(tmp_path):
+    results = {
+        "WAL": run_contention(tmp_path / "wal.db", "WAL"),
+        "DELETE": run_contention(tmp_path / "rollback.db", "DELETE"),
+    }
+    for mode, (latencies, read_failures, batches, write_failures) in results.items():
+        print(
+            f"\n{mode}: {len(latencies)} reads "
+            f"p50 {statistics.median(latencies) * 1000:.1f}ms "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms, {read_failures} failed; "
+            f"{batches} write batches, {write_failures} failed"
+        )
+
+    wal, rollback = results["WAL"], results["DELETE"]
+    assert wal[1] == 0 and wal[3] == 0
+    assert wal[2] > 0
+    # WAL readers keep reading the last commit while a batch is being written
+    assert len(wal[0]) > len(rollback[0])
+    assert percentile(wal[0], 0.99) < percentile(rollback[0], 0.99)
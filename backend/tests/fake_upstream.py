@@ -0,0 +1,217 @@
+"""
+Local stand-ins for the udn news site, the OpenAI chat completions API and
+the opendata NecessitiesPrice API, served by uvicorn on a background thread
+so the application can be timed against real sockets without touching the
+network.
+
+Latency and error injection are set per route (list, article, chat, prices)
+or for all of them at once; injected errors answer 503, which the ingest
+retries and the OpenAI client retries as well.
+"""
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+
+ARTICLE_HTML = """
+<html>
+<h1 class="article-content__title">{title}</h1>
+<time class="article-content__time">{time}</time>
+<section class="article-content__editor">
+    <p>{title} 第一段內容。</p>
+    <p>▪ 延伸閱讀</p>
+    <p>{title} 第二段內容。</p>
+</section>
+</html>
+"""
+ROUTES = ("list", "article", "chat", "prices")
+# list pages of one edition, see FakeUpstream.edition
+EDITION_PAGES = 100
+PRICE_CATEGORIES = ("鮮乳", "雞蛋", "米", "食用油", "衛生紙", "洗衣精")
+PRICE_MONTHS = 114
+
+
+def serve_in_thread(app):
+    """
+    serve an ASGI app with uvicorn on a free local port, without lifespan events
+
+    :return: (uvicorn.Server, thread, base url)
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def article_title(page, index):
+    return f"價格新聞 {page}-{index}"
+
+
+def article_time(page, index):
+    return f"2024-08-{(page - 1) % 28 + 1:02d} {index // 60:02d}:{index % 60:02d}"
+
+
+def price_items(count, seed=0):
+    """
+    NecessitiesPrice items with monthly series from 2015-03, some months
+    missing as the upstream sends them
+    """
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        price = rng.uniform(20, 300)
+        values = []
+        for _ in range(PRICE_MONTHS):
+            price *= rng.uniform(0.97, 1.04)
+            values.append("0" if rng.random() < 0.05 else str(round(price)))
+        items.append({
+            "類別": PRICE_CATEGORIES[i % len(PRICE_CATEGORIES)],
+            "編號": i + 1,
+            "產品名稱": f"商品 {i + 1}",
+            "規格": "1入",
+            "統計值": ",".join(values),
+            "時間起點": "2015-03-01",
+            "時間終點": "2024-08-01",
+        })
+    return items
+
+
+class FakeUpstream:
+    """
+    fake udn `/api/more` list, udn article pages, OpenAI chat completions
+    and the opendata NecessitiesPrice list
+
+    :param latency: seconds each response is delayed, a number for every
+        route or a dict of route -> seconds
+    :param per_page: list entries returned for every udn list page
+    :param error_rate: share of requests answered with 503, a number or a
+        dict of route -> share
+    :param price_count: commodities in the NecessitiesPrice list
+    :param seed: seed of the injected errors and the generated prices
+    """
+
+    def __init__(self, latency=0.0, per_page=20, error_rate=0.0, price_count=50, seed=0):
+        self.latency = latency
+        self.per_page = per_page
+        self.error_rate = error_rate
+        self.prices = price_items(price_count, seed)
+        self.random = random.Random(seed)
+        # list pages of a later edition link to articles not seen before
+        self.edition = 0
+        self.calls = {route: 0 for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+        self.app = self.build_app()
+        self.server = None
+        self.thread = None
+        self.url = None
+
+    @property
+    def prices_url(self):
+        return f"{self.url}/api/ConsumerProtection/NecessitiesPrice"
+
+    def setting(self, value, route):
+        return value.get(route, 0.0) if isinstance(value, dict) else value
+
+    async def answer(self, route):
+        """
+        count and delay a request
+
+        :return: an injected error response, None to answer normally
+        """
+        self.calls[route] += 1
+        await asyncio.sleep(self.setting(self.latency, route))
+        if self.random.random() < self.setting(self.error_rate, route):
+            self.errors[route] += 1
+            return JSONResponse({"error": "injected"}, status_code=503)
+        return None
+
+    def build_app(self):
+        app = FastAPI()
+
+        @app.get("/api/more")
+        async def news_list(page: int):
+            if error := await self.answer("list"):
+                return error
+            story_page = page + self.edition * EDITION_PAGES
+            return {
+                "lists": [
+                    {
+                        "title": article_title(story_page, i),
+                        "titleLink": f"{self.url}/news/story/{story_page}/{i}",
+                    }
+                    for i in range(self.per_page)
+                ]
+            }
+
+        @app.get("/news/story/{page}/{index}")
+        async def article(page: int, index: int):
+            if error := await self.answer("article"):
+                return error
+            return HTMLResponse(
+                ARTICLE_HTML.format(
+                    title=article_title(page, index), time=article_time(page, index)
+                )
+            )
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            if error := await self.answer("chat"):
+                return error
+            system, user = body["messages"][0]["content"], body["messages"][-1]["content"]
+            if "關聯度" in system:
+                content = json.dumps({i: "high" for i in json.loads(user)})
+            elif "關鍵字" in system:
+                content = user
+            else:
+                content = json.dumps(
+                    {"影響": f"影響:{user[:10]}", "原因": f"原因:{user[:10]}"},
+                    ensure_ascii=False,
+                )
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
+
+        @app.get("/api/ConsumerProtection/NecessitiesPrice")
+        async def necessities_price():
+            if error := await self.answer("prices"):
+                return error
+            return self.prices
+
+        return app
+
+    def start(self):
+        self.server, self.thread, self.url = serve_in_thread(self.app)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
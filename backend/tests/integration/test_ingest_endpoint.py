@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
+
+import main
+from main import app
+from main import Base, IngestRun, SchedulerLease, User, run_ingest, session_opener
+
+SECRET_KEY = "1892dhianiandowqd0n"
+ALGORITHM = "HS256"
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+
+def override_session_opener():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[session_opener] = override_session_opener
+client = TestClient(app)
+
+
+@pytest.fixture
+def clean_ingest_tables():
+    with TestingSessionLocal() as db:
+        db.query(SchedulerLease).delete()
+        db.query(IngestRun).delete()
+        db.commit()
+
+
+def user_headers(username):
+    with TestingSessionLocal() as db:
+        if db.query(User).filter(User.username == username).first() is None:
+            db.add(User(username=username, hashed_password="x"))
+            db.commit()
+    token = jwt.encode({"sub": username}, SECRET_KEY, algorithm=ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def headers(monkeypatch):
+    monkeypatch.setattr(main, "INGEST_OPERATORS", {"ingestuser"})
+    return user_headers("ingestuser")
+
+
+def test_trigger_ingest(mocker, clean_ingest_tables, headers):
+    add_job = mocker.patch("main.bgs.add_job")
+
+    response = client.post("/api/v1/ingest/runs", headers=headers)
+
+    assert response.status_code == 202
+    add_job.assert_called_once_with(run_ingest, kwargs={"trigger": "manual"})
+
+
+def test_trigger_ingest_while_running(mocker, clean_ingest_tables, headers):
+    with TestingSessionLocal() as db:
+        db.add(SchedulerLease(
+            name="ingest", holder="other-worker", expires_at=datetime.utcnow() + timedelta(minutes=5)
+        ))
+        db.commit()
+    add_job = mocker.patch("main.bgs.add_job")
+
+    response = client.post("/api/v1/ingest/runs", headers=headers)
+
+    assert response.status_code == 409
+    add_job.assert_not_called()
+    assert client.get("/api/v1/ingest/status").json()["running"] == "other-worker"
+
+
+def test_trigger_ingest_requires_login():
+    assert client.post("/api/v1/ingest/runs").status_code == 401
+
+
+def test_trigger_ingest_requires_an_operator(mocker, clean_ingest_tables, headers):
+    add_job = mocker.patch("main.bgs.add_job")
+
+    response = client.post("/api/v1/ingest/runs", headers=user_headers("reader"))
+
+    assert response.status_code == 403
+    add_job.assert_not_called()
+
+
+def test_trigger_ingest_is_rate_limited(mocker, clean_ingest_tables, headers):
+    add_job = mocker.patch("main.bgs.add_job")
+
+    assert client.post("/api/v1/ingest/runs", headers=headers).status_code == 202
+    response = client.post("/api/v1/ingest/runs", headers=headers)
+
+    assert response.status_code == 429
+    assert 0 < int(response.headers["Retry-After"]) <= main.MANUAL_INGEST_COOLDOWN_SECONDS
+    assert add_job.call_count == 1
+
+
+def test_ingest_status(clean_ingest_tables):
+    started = datetime(2024, 8, 1, 12, 0)
+    with TestingSessionLocal() as db:
+        db.add_all([
+            IngestRun(
+                trigger="scheduled", holder="a", status="succeeded", started_at=started,
+                finished_at=started + timedelta(seconds=30), duration=30.0, new=4, skipped=1,
+                irrelevant=6, failed=0,
+            ),
+            IngestRun(trigger="manual", holder="b", status="running", started_at=started + timedelta(hours=1)),
+        ])
+        db.commit()
+
+    response = client.get("/api/v1/ingest/status", params={"limit": 5})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["running"] is None
+    assert [r["trigger"] for r in body["runs"]] == ["manual", "scheduled"]
+    assert body["runs"][1]["new"] == 4
+    assert body["runs"][1]["duration"] == 30.0
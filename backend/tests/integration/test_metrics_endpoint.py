@@ -0,0 +1,56 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from main import Base, session_opener
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+
+def override_session_opener():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[session_opener] = override_session_opener
+client = TestClient(app)
+
+
+def metric_value(text, prefix):
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics_record_route_latency_and_queries():
+    count = 'http_request_duration_seconds_count{method="GET",route="/api/v1/news/news/{id}",status="404"}'
+    queries = 'http_request_sql_queries_sum{method="GET",route="/api/v1/news/news/{id}"}'
+    before = client.get("/metrics").text
+
+    client.get("/api/v1/news/news/999999")
+    client.get("/api/v1/news/news/999998")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert metric_value(response.text, count) - metric_value(before, count) == 2
+    # one lookup per request
+    assert metric_value(response.text, queries) - metric_value(before, queries) == 2
+
+
+def test_unknown_paths_share_one_label():
+    client.get("/no/such/path/1")
+    client.get("/no/such/path/2")
+
+    text = client.get("/metrics").text
+
+    assert 'route="unmatched",status="404"' in text
+    assert "/no/such/path" not in text
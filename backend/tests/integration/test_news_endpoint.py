@@ -1,3 +1,6 @@
+import asyncio
+import time
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, StaticPool
@@ -7,8 +10,11 @@ from jose import jwt
 from main import app
 from main import Base, NewsArticle, User, session_opener, user_news_association_table
 from main import NewsSumaryRequestSchema, PromptRequest
-from main import pwd_context
-from unittest.mock import Mock
+from main import pwd_context, user_cache, get_http_client, get_llm_client
+from main import keyword_cache, article_cache, content_hash, SummaryCacheEntry
+from main import sync_news_search_index, feed_snapshots
+from ttl_cache import SQLiteCacheStore, TTLCache
+from unittest.mock import AsyncMock, Mock
 
 
 SECRET_KEY = "1892dhianiandowqd0n"
@@ -35,6 +41,7 @@ def clear_users():
     with next(override_session_opener()) as db:
         db.query(User).delete()
         db.commit()
+    user_cache.clear()
 
 @pytest.fixture(scope="module")
 def test_user(clear_users):
@@ -61,6 +68,7 @@ def test_articles():
             url="https://example.com/test-news-1",
             title="Test News 1",
             content="This is test content 1",
+            content_hash=content_hash("This is test content 1"),
             time="2024-01-01",
             summary="Test summary 1",
             reason="Test reason 1"
@@ -95,6 +103,58 @@ def test_read_news(test_articles):
     assert json_response[1]["title"] == "Test News 1"
 
 
+def test_read_news_pagination(test_articles):
+    response = client.get("/api/v1/news/news", params={"limit": 1})
+    assert response.status_code == 200
+    assert [n["title"] for n in response.json()] == ["Test News 2"]
+    assert "content" not in response.json()[0]
+    assert "_sa_instance_state" not in response.json()[0]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get("/api/v1/news/news", params={"limit": 1, "cursor": cursor})
+    assert response.status_code == 200
+    assert [n["title"] for n in response.json()] == ["Test News 1"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_read_news_date_range(test_articles):
+    response = client.get("/api/v1/news/news", params={"since": "2024-01-02"})
+    assert [n["title"] for n in response.json()] == ["Test News 2"]
+
+    response = client.get("/api/v1/news/news", params={"until": "2024-01-02T00:00:00"})
+    assert [n["title"] for n in response.json()] == ["Test News 1"]
+
+    response = client.get("/api/v1/news/news", params={"since": "yesterday"})
+    assert response.status_code == 422
+
+
+def test_read_news_invalid_cursor():
+    response = client.get("/api/v1/news/news", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_read_news_detail(test_articles):
+    response = client.get(f"/api/v1/news/news/{test_articles[0].id}")
+    assert response.status_code == 200
+    assert response.json()["content"] == "This is test content 1"
+
+    response = client.get("/api/v1/news/news/999999")
+    assert response.status_code == 404
+
+
+def test_search_stored_news(test_articles):
+    sync_news_search_index(TestingSessionLocal)
+
+    response = client.get("/api/v1/news/search", params={"q": "Content 2"})
+
+    assert response.status_code == 200
+    assert [n["title"] for n in response.json()] == ["Test News 2"]
+    assert "content" not in response.json()[0]
+
+    response = client.get("/api/v1/news/search", params={"q": "no such words"})
+    assert response.json() == []
+
+
 def test_read_user_news(test_user, test_token, test_articles):
     headers = {"Authorization": f"Bearer {test_token}"}
     response = client.get("/api/v1/news/user_news", headers=headers)
@@ -108,8 +168,16 @@ def test_read_user_news(test_user, test_token, test_articles):
     assert json_response[1]["title"] == "Test News 1"
     assert json_response[1]["is_upvoted"] is False
 
+@pytest.fixture(autouse=True)
+def clear_search_caches():
+    keyword_cache.clear()
+    article_cache.clear()
+    # fixtures write articles behind add_news' back
+    feed_snapshots.bump()
+
+
 def mock_openai(mocker, return_content):
-    mock_openai_client = mocker.patch('main.OpenAI')
+    mock_openai_client = Mock()
 
     mock_message = Mock()
     mock_message.content = return_content
@@ -120,18 +188,20 @@ def mock_openai(mocker, return_content):
     mock_completion = Mock()
     mock_completion.choices = [mock_choice]
 
-    mock_openai_client.return_value.chat.completions.create.return_value = mock_completion
+    mock_openai_client.chat.completions.create = AsyncMock(return_value=mock_completion)
+    mocker.patch.dict(app.dependency_overrides, {get_llm_client: lambda: mock_openai_client})
 
     return mock_openai_client
 
 def test_search_news(mocker):
     mock_openai(mocker, "keywords")
 
-    mock_get_new_info = mocker.patch("main.get_new_info", return_value=[
+    mock_get_new_info = mocker.patch("main.async_get_new_info", AsyncMock(return_value=[
         {"titleLink": "http://example.com/news1"}
-    ])
+    ]))
 
-    mock_get = mocker.patch("main.requests.get", return_value=mocker.Mock(
+    mock_http_client = Mock()
+    mock_http_client.get = AsyncMock(return_value=mocker.Mock(
         text="""
         <html>
         <h1 class="article-content__title">Test Title</h1>
@@ -142,6 +212,7 @@ def test_search_news(mocker):
         </html>
         """
     ))
+    mocker.patch.dict(app.dependency_overrides, {get_http_client: lambda: mock_http_client})
 
     request_body = {"prompt": "Test search prompt"}
 
@@ -156,6 +227,211 @@ def test_search_news(mocker):
     assert data[0]["content"] == "This is a test paragraph."
 
 
+ARTICLE_HTML = """
+<html>
+<h1 class="article-content__title">{title}</h1>
+<time class="article-content__time">{time}</time>
+<section class="article-content__editor">
+    <p>{title} paragraph.</p>
+</section>
+</html>
+"""
+
+
+def test_search_news_skips_pages_without_article_text(mocker):
+    mock_openai(mocker, "keywords")
+    mocker.patch("main.async_get_new_info", AsyncMock(return_value=[
+        {"titleLink": "http://example.com/video"},
+        {"titleLink": "http://example.com/news1"},
+    ]))
+
+    async def get(url):
+        if url.endswith("video"):
+            return Mock(text='<h1 class="article-content__title">Video</h1><section class="video"></section>')
+        return Mock(text=ARTICLE_HTML.format(title="Title 1", time="2024-09-11"))
+
+    mock_http_client = Mock()
+    mock_http_client.get = get
+    mocker.patch.dict(app.dependency_overrides, {get_http_client: lambda: mock_http_client})
+
+    response = client.post("/api/v1/news/search_news", json={"prompt": "Video search prompt"})
+
+    assert response.status_code == 200
+    assert [n["title"] for n in response.json()] == ["Title 1"]
+
+
+def test_search_news_fetches_articles_concurrently_within_budget(mocker):
+    mock_openai(mocker, "keywords")
+    mocker.patch("main.async_get_new_info", AsyncMock(return_value=[
+        {"titleLink": f"http://example.com/news{i}"} for i in range(6)
+    ]))
+    mocker.patch("main.SEARCH_FANOUT", 3)
+    mocker.patch("main.SEARCH_ARTICLE_BUDGET", 0.5)
+    in_flight = []
+    peak = []
+
+    async def fake_get(url):
+        in_flight.append(url)
+        peak.append(len(in_flight))
+        # news5 is too slow for the budget and is left out
+        await asyncio.sleep(5 if url.endswith("news5") else 0.05)
+        in_flight.remove(url)
+        i = url[-1]
+        return Mock(text=ARTICLE_HTML.format(title=f"Title {i}", time=f"2024-09-1{i}"))
+
+    mock_http_client = Mock()
+    mock_http_client.get = fake_get
+    mocker.patch.dict(app.dependency_overrides, {get_http_client: lambda: mock_http_client})
+
+    start = time.perf_counter()
+    response = client.post("/api/v1/news/search_news", json={"prompt": "Test search prompt"})
+    elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200
+    assert [n["title"] for n in response.json()] == [f"Title {i}" for i in (4, 3, 2, 1, 0)]
+    assert max(peak) == 3
+    assert elapsed < 2
+
+
+def test_search_news_repeated_prompt_is_cached(mocker):
+    llm = mock_openai(mocker, "keywords")
+    get_new_info = mocker.patch("main.async_get_new_info", AsyncMock(return_value=[
+        {"titleLink": "http://example.com/news1"}
+    ]))
+    mock_http_client = Mock()
+    mock_http_client.get = AsyncMock(return_value=Mock(
+        text=ARTICLE_HTML.format(title="Title 1", time="2024-09-11")
+    ))
+    mocker.patch.dict(app.dependency_overrides, {get_http_client: lambda: mock_http_client})
+
+    first = client.post("/api/v1/news/search_news", json={"prompt": "Test search prompt"})
+    # same prompt up to case and whitespace
+    second = client.post("/api/v1/news/search_news", json={"prompt": "  test SEARCH   prompt "})
+
+    assert first.json() == second.json()
+    assert llm.chat.completions.create.await_count == 1
+    assert get_new_info.await_count == 1
+    assert mock_http_client.get.await_count == 1
+    stats = client.get("/api/v1/news/search_cache/stats").json()
+    assert stats["keywords"]["hits"] == 1
+    assert stats["articles"]["hits"] == 1
+
+
+class ThreadCheckedStore(SQLiteCacheStore):
+    """records whether each read and write ran on the event loop"""
+
+    def __init__(self, path, table):
+        super().__init__(path, table)
+        self.on_loop = []
+
+    def record(self):
+        try:
+            asyncio.get_running_loop()
+            self.on_loop.append(True)
+        except RuntimeError:
+            self.on_loop.append(False)
+
+    def get(self, key, now):
+        self.record()
+        return super().get(key, now)
+
+    def set(self, key, expires_at, encoded):
+        self.record()
+        super().set(key, expires_at, encoded)
+
+
+def test_search_news_with_sqlite_cache_store(mocker, tmp_path):
+    path = str(tmp_path / "search_cache.db")
+    stores = []
+
+    def restart_caches():
+        # fresh memory tiers over the same file, as after a restart
+        for name, table in (("keyword_cache", "search_keyword_cache"), ("article_cache", "search_article_cache")):
+            store = ThreadCheckedStore(path, table)
+            stores.append(store)
+            mocker.patch(f"main.{name}", TTLCache(60, 1024 * 1024, store))
+
+    llm = mock_openai(mocker, "keywords")
+    mocker.patch("main.async_get_new_info", AsyncMock(return_value=[
+        {"titleLink": "http://example.com/news1"}
+    ]))
+    mock_http_client = Mock()
+    mock_http_client.get = AsyncMock(return_value=Mock(
+        text=ARTICLE_HTML.format(title="Title 1", time="2024-09-11")
+    ))
+    mocker.patch.dict(app.dependency_overrides, {get_http_client: lambda: mock_http_client})
+
+    restart_caches()
+    first = client.post("/api/v1/news/search_news", json={"prompt": "Stored search prompt"})
+    restart_caches()
+    second = client.post("/api/v1/news/search_news", json={"prompt": "Stored search prompt"})
+
+    assert first.json() == second.json()
+    assert [n["title"] for n in second.json()] == ["Title 1"]
+    assert llm.chat.completions.create.await_count == 1
+    assert mock_http_client.get.await_count == 1
+    stats = client.get("/api/v1/news/search_cache/stats").json()
+    assert stats["keywords"]["store_hits"] == stats["articles"]["store_hits"] == 1
+    # the sqlite tier is only touched from worker threads
+    on_loop = [call for store in stores for call in store.on_loop]
+    assert on_loop and not any(on_loop)
+
+
+def test_stream_search_news(mocker):
+    mock_openai(mocker, "keywords")
+    mocker.patch("main.async_get_new_info", AsyncMock(return_value=[
+        {"titleLink": f"http://example.com/news{i}"} for i in range(3)
+    ]))
+
+    async def fake_get(url):
+        i = int(url[-1])
+        # later articles finish first
+        await asyncio.sleep(0.05 * (3 - i))
+        return Mock(text=ARTICLE_HTML.format(title=f"Title {i}", time=f"2024-09-1{i}"))
+
+    mock_http_client = Mock()
+    mock_http_client.get = fake_get
+    mocker.patch.dict(app.dependency_overrides, {get_http_client: lambda: mock_http_client})
+
+    response = client.get("/api/v1/news/search_news/stream", params={"prompt": "Test search prompt"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert events[0] == ("keywords", {"keywords": "keywords"})
+    assert [(e, d["title"]) for e, d in events[1:4]] == [("news", "Title 2"), ("news", "Title 1"), ("news", "Title 0")]
+    assert events[4] == ("done", {})
+    assert [d["published_at"] for _, d in events[1:4]] == [f"2024-09-1{i}T00:00:00" for i in (2, 1, 0)]
+
+
+def test_search_news_orders_by_parsed_time(mocker):
+    mock_openai(mocker, "keywords")
+    mocker.patch("main.async_get_new_info", AsyncMock(return_value=[
+        {"titleLink": f"http://example.com/news{i}"} for i in range(3)
+    ]))
+    # display times that do not sort as strings
+    times = ["2024/9/8 10:00", "2024/10/01 09:00", "2024-09-09 08:00"]
+
+    async def fake_get(url):
+        i = int(url[-1])
+        return Mock(text=ARTICLE_HTML.format(title=f"Title {i}", time=times[i]))
+
+    mock_http_client = Mock()
+    mock_http_client.get = fake_get
+    mocker.patch.dict(app.dependency_overrides, {get_http_client: lambda: mock_http_client})
+
+    response = client.post("/api/v1/news/search_news", json={"prompt": "Mixed time prompt"})
+
+    assert [(n["title"], n["published_at"]) for n in response.json()] == [
+        ("Title 1", "2024-10-01T09:00:00"),
+        ("Title 2", "2024-09-09T08:00:00"),
+        ("Title 0", "2024-09-08T10:00:00"),
+    ]
+
+
 def test_news_summary(mocker, test_token):
     headers = {"Authorization": f"Bearer {test_token}"}
     openai_response = json.dumps({"影響": "test impact", "原因": "test reason"})
@@ -170,6 +446,33 @@ def test_news_summary(mocker, test_token):
     assert json_response["reason"] == "test reason"
 
 
+def test_news_summary_of_stored_article_skips_llm(mocker, test_token, test_articles):
+    llm = mock_openai(mocker, json.dumps({"影響": "new impact", "原因": "new reason"}))
+
+    response = client.post(
+        "/api/v1/news/news_summary",
+        json={"content": "  This is test\ncontent 1 "},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+
+    assert response.json() == {"summary": "Test summary 1", "reason": "Test reason 1"}
+    llm.chat.completions.create.assert_not_awaited()
+
+
+def test_news_summary_is_cached_by_content(mocker, test_token):
+    with next(override_session_opener()) as db:
+        db.query(SummaryCacheEntry).delete()
+        db.commit()
+    headers = {"Authorization": f"Bearer {test_token}"}
+    llm = mock_openai(mocker, json.dumps({"影響": "test impact", "原因": "test reason"}))
+
+    first = client.post("/api/v1/news/news_summary", json={"content": "Uncached content"}, headers=headers)
+    second = client.post("/api/v1/news/news_summary", json={"content": "Uncached  content\n"}, headers=headers)
+
+    assert first.json() == second.json() == {"summary": "test impact", "reason": "test reason"}
+    assert llm.chat.completions.create.await_count == 1
+
+
 def test_upvote_article(test_user_and_articles, test_token):
     user, articles = test_user_and_articles
     headers = {"Authorization": f"Bearer {test_token}"}
@@ -178,6 +481,14 @@ def test_upvote_article(test_user_and_articles, test_token):
     assert response.status_code == 200
     assert response.json()["message"] == "Article upvoted"
 
+    response = client.get("/api/v1/news/user_news", headers=headers)
+    upvoted = {n["id"]: (n["upvotes"], n["is_upvoted"]) for n in response.json()}
+    assert upvoted[articles[0].id] == (1, True)
+    assert upvoted[articles[1].id] == (0, False)
+
+    response = client.post("/api/v1/news/999999/upvote", headers=headers)
+    assert response.status_code == 404
+
 
 def test_downvote_article(test_user_and_articles, test_token):
     user, articles = test_user_and_articles
@@ -186,3 +497,26 @@ def test_downvote_article(test_user_and_articles, test_token):
     response = client.post(f"/api/v1/news/{articles[0].id}/upvote", headers=headers)
     assert response.status_code == 200
     assert response.json()["message"] == "Upvote removed"
+
+
+def test_feed_snapshot_follows_upvotes(test_user_and_articles, test_token):
+    user, articles = test_user_and_articles
+    headers = {"Authorization": f"Bearer {test_token}"}
+
+    first = client.get("/api/v1/news/news")
+    hits = feed_snapshots.stats()["hits"]
+    second = client.get("/api/v1/news/news")
+    assert feed_snapshots.stats()["hits"] == hits + 1
+    assert first.content == second.content
+
+    client.post(f"/api/v1/news/{articles[1].id}/upvote", headers=headers)
+    anonymous = {n["id"]: (n["upvotes"], n["is_upvoted"]) for n in client.get("/api/v1/news/news").json()}
+    own = {
+        n["id"]: (n["upvotes"], n["is_upvoted"])
+        for n in client.get("/api/v1/news/user_news", headers=headers).json()
+    }
+    client.post(f"/api/v1/news/{articles[1].id}/upvote", headers=headers)
+
+    assert anonymous[articles[1].id] == (1, False)
+    assert own[articles[1].id] == (1, True)
+    assert own[articles[0].id] == anonymous[articles[0].id]
@@ -1,8 +1,28 @@
 import pytest
+import requests
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
 from unittest.mock import patch
+import main
 from main import app
+from main import Base, NecessityPrice, PriceRefresh, refresh_necessities_prices, session_opener
 
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+
+def override_session_opener():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[session_opener] = override_session_opener
 client = TestClient(app)
 
 @pytest.fixture
@@ -29,13 +49,21 @@ def mock_necessities_data():
     ]
 
 
-@patch("main.requests.get")
-def test_get_necessities_prices(mock_get, mock_necessities_data):
-    mock_response = mock_get.return_value
-    mock_response.status_code = 200
-    mock_response.json.return_value = mock_necessities_data
+@pytest.fixture
+def stored_prices(mock_necessities_data):
+    with next(override_session_opener()) as db:
+        db.query(NecessityPrice).delete()
+        db.query(PriceRefresh).delete()
+        db.commit()
+    with patch("main.requests.get") as mock_get:
+        mock_get.return_value.json.return_value = mock_necessities_data
+        return refresh_necessities_prices(TestingSessionLocal)
 
-    response = client.get("/api/v1/prices/necessities-price")
+
+def test_get_necessities_prices(stored_prices):
+    with patch("main.requests.get") as mock_get:
+        response = client.get("/api/v1/prices/necessities-price")
+        mock_get.assert_not_called()
 
     assert response.status_code == 200
     data = response.json()
@@ -45,28 +73,112 @@ def test_get_necessities_prices(mock_get, mock_necessities_data):
     assert data[1]["產品名稱"] == "味全林鳳營鮮乳"
 
 
-@patch("main.requests.get")
-def test_get_necessities_prices_with_query(mock_get, mock_necessities_data):
-    mock_response = mock_get.return_value
-    mock_response.status_code = 200
-    mock_response.json.return_value = mock_necessities_data
-
+def test_get_necessities_prices_with_query(stored_prices):
     response = client.get("/api/v1/prices/necessities-price", params={"category": "鮮乳", "commodity": "統一瑞穗高優質鮮乳"})
 
     assert response.status_code == 200
     data = response.json()
-    assert len(data) == 2
+    assert len(data) == 1
     assert data[0]["類別"] == "鮮乳"
     assert data[0]["產品名稱"] == "統一瑞穗高優質鮮乳"
 
 
-# @patch("main.requests.get")
-# def test_get_necessities_prices_error_handling(mock_get):
-#     mock_response = mock_get.return_value
-#     mock_response.status_code = 400
-#     mock_response.raise_for_status.side_effect = requests.RequestException("Error fetching data")
+def test_get_necessities_prices_not_modified(stored_prices):
+    response = client.get("/api/v1/prices/necessities-price")
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/v1/prices/necessities-price", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.get("/api/v1/prices/necessities-price", params={"category": "鮮乳"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_refresh_keeps_prices_when_upstream_fails(stored_prices):
+    with patch("main.requests.get", side_effect=requests.RequestException("Error fetching data")):
+        assert refresh_necessities_prices(TestingSessionLocal) is None
+
+    response = client.get("/api/v1/prices/necessities-price")
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+
+def test_scheduled_refresh_uses_the_configured_session(mock_necessities_data, monkeypatch):
+    # the scheduler calls refresh_necessities_prices without a session_factory
+    monkeypatch.setitem(main.Session.kw, "bind", engine)
+    with patch("main.requests.get") as mock_get:
+        mock_get.return_value.json.return_value = mock_necessities_data[:1]
+        refresh = refresh_necessities_prices()
+
+    assert refresh.item_count == 1
+    response = client.get("/api/v1/prices/necessities-price")
+    assert [item["編號"] for item in response.json()] == [1]
+
+
+def test_refresh_keeps_commodity_ids(stored_prices, mock_necessities_data):
+    ids = [item["id"] for item in client.get("/api/v1/prices/necessities-price").json()]
+
+    with patch("main.requests.get") as mock_get:
+        mock_get.return_value.json.return_value = mock_necessities_data[::-1]
+        refresh_necessities_prices(TestingSessionLocal)
+
+    data = client.get("/api/v1/prices/necessities-price").json()
+    assert {item["產品名稱"]: item["id"] for item in data} == {
+        "統一瑞穗高優質鮮乳": ids[0],
+        "味全林鳳營鮮乳": ids[1],
+    }
+
+
+def test_get_necessity_price_series(stored_prices):
+    commodity = client.get("/api/v1/prices/necessities-price").json()[0]
+
+    response = client.get(f"/api/v1/prices/{commodity['id']}/series", params={"window": 22})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["name"] == "統一瑞穗高優質鮮乳"
+    assert data["step_months"] == 11
+    assert data["dates"][:2] == ["2015-03-01", "2016-02-01"]
+    assert data["values"] == [144, 143, 143, 143, 143, None, None, 145, 145, 146, 146]
+    assert data["moving_average"][:2] == [None, 143.5]
+    assert data["stats"]["min"] == 143
+    assert data["stats"]["max"] == 146
+    assert data["stats"]["yoy_change"] == 0
+
+
+def test_get_necessity_price_series_downsampled(stored_prices):
+    commodity = client.get("/api/v1/prices/necessities-price").json()[1]
+
+    response = client.get(
+        f"/api/v1/prices/{commodity['id']}/series",
+        params={"since": "2016-02-01", "points": 3},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    # ten prices over 113 months are 13 months apart
+    assert data["step_months"] == 13
+    assert data["dates"] == ["2016-04-01", "2019-07-01", "2022-10-01"]
+    assert data["values"] == [140, 149.67, 142.67]
+
+
+def test_get_necessity_price_series_not_found():
+    response = client.get("/api/v1/prices/999999/series")
+    assert response.status_code == 404
+
+
+def test_get_necessity_price_ranking(stored_prices):
+    response = client.get("/api/v1/prices/ranking", params={"category": "鮮乳", "window": 12})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["name"] for item in data] == ["統一瑞穗高優質鮮乳", "味全林鳳營鮮乳"]
+    assert data[1]["change"] == -2.11
+
+    response = client.get("/api/v1/prices/ranking", params={"window": 12, "k": 1, "order": "asc"})
+    assert [item["name"] for item in response.json()] == ["味全林鳳營鮮乳"]
 
-#     response = client.get("/api/v1/prices/necessities-price")
 
-#     assert response.status_code == 400
-#     assert response.json()["detail"] == "Error fetching data"
\ No newline at end of file
+def test_get_necessity_price_ranking_errors(stored_prices):
+    assert client.get("/api/v1/prices/ranking", params={"window": 5}).status_code == 400
+    assert client.get("/api/v1/prices/ranking", params={"category": "米"}).status_code == 404
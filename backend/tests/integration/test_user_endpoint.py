@@ -1,11 +1,13 @@
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, StaticPool
+from sqlalchemy import create_engine, event, StaticPool
 from sqlalchemy.orm import sessionmaker
 from main import app
 from main import Base, User, session_opener
 from jose import jwt
-from main import pwd_context
+from main import pwd_context, user_cache
 
 SECRET_KEY = "1892dhianiandowqd0n"
 ALGORITHM = "HS256"
@@ -35,6 +37,7 @@ def clear_users():
     with next(override_session_opener()) as db:
         db.query(User).delete()
         db.commit()
+    user_cache.clear()
 
 @pytest.fixture(scope="module")
 def test_user(clear_users):
@@ -83,4 +86,78 @@ def test_read_users_me(test_token):
 
     assert response.status_code == 200
     data = response.json()
-    assert data["username"] == "testuser"
\ No newline at end of file
+    assert data["username"] == "testuser"
+
+def test_login_wrong_password(test_user):
+    response = client.post("/api/v1/users/login", data={
+        "username": "testuser",
+        "password": "wrongpassword"
+    })
+
+    assert response.status_code == 401
+
+
+def test_login_unknown_user(clear_users):
+    response = client.post("/api/v1/users/login", data={
+        "username": "nosuchuser",
+        "password": "testpassword"
+    })
+
+    assert response.status_code == 401
+
+
+def test_login_rehashes_other_cost(clear_users):
+    cheap_hash = pwd_context.hash("rehashpassword", rounds=4)
+    with next(override_session_opener()) as db:
+        db.add(User(username="rehashuser", hashed_password=cheap_hash))
+        db.commit()
+
+    response = client.post("/api/v1/users/login", data={
+        "username": "rehashuser",
+        "password": "rehashpassword"
+    })
+
+    assert response.status_code == 200
+    with next(override_session_opener()) as db:
+        stored = db.query(User).filter(User.username == "rehashuser").one().hashed_password
+    assert stored != cheap_hash
+    assert not pwd_context.needs_update(stored)
+    assert pwd_context.verify("rehashpassword", stored)
+
+
+def test_register_and_login_keep_queries_off_the_event_loop(clear_users):
+    on_loop = []
+
+    def record(*args):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert client.post("/api/v1/users/register", json={
+            "username": "loopuser", "password": "looppassword"
+        }).status_code == 200
+        assert client.post("/api/v1/users/login", data={
+            "username": "loopuser", "password": "looppassword"
+        }).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert on_loop and not any(on_loop)
+
+
+def test_read_users_me_invalid_token():
+    headers = {"Authorization": "Bearer not-a-token"}
+    response = client.get("/api/v1/users/me", headers=headers)
+
+    assert response.status_code == 401
+
+
+def test_read_users_me_unknown_user(clear_users):
+    token = jwt.encode({"sub": "ghostuser"}, SECRET_KEY, algorithm=ALGORITHM)
+    response = client.get("/api/v1/users/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 401
@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import StaticPool, create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import main
+from main import Base, NewsArticle, add_news
+
+
+def news_data(i):
+    return {
+        "url": f"https://example.com/news-{i}",
+        "title": f"News {i}",
+        "time": "2024-08-01 12:00",
+        "content": ["first paragraph", "second paragraph"],
+        "summary": "summary",
+        "reason": "reason",
+    }
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(conn))
+    factory = sessionmaker(bind=engine)
+    factory.commits = commits
+    return factory
+
+
+def test_add_news_inserts_in_one_transaction(session_factory):
+    inserted, skipped = add_news([news_data(i) for i in range(100)], session_factory)
+
+    assert (inserted, skipped) == (100, 0)
+    assert len(session_factory.commits) == 1
+    with session_factory() as db:
+        assert db.query(NewsArticle).count() == 100
+        assert db.query(NewsArticle).first().content == "first paragraph second paragraph"
+
+
+def test_add_news_skips_stored_urls(session_factory):
+    add_news([news_data(i) for i in range(3)], session_factory)
+
+    inserted, skipped = add_news([news_data(i) for i in range(1, 5)], session_factory)
+
+    assert (inserted, skipped) == (2, 2)
+    with session_factory() as db:
+        assert db.query(NewsArticle).count() == 5
+
+
+def test_add_news_defaults_to_the_configured_session(session_factory, monkeypatch):
+    # the scheduled get_new passes no session_factory
+    monkeypatch.setitem(main.Session.kw, "bind", session_factory.kw["bind"])
+
+    assert add_news([news_data(i) for i in range(2)]) == (2, 0)
+    with session_factory() as db:
+        assert db.query(NewsArticle).count() == 2
+
+
+def test_add_news_with_nothing_to_write(session_factory):
+    assert add_news([], session_factory) == (0, 0)
+    assert session_factory.commits == []
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+from article_html import ArticlePage, extract_article
+from main import parse_news_article
+
+FIXTURES = Path(__file__).parent.parent / "fixtures"
+
+
+def fixture_page(name):
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def test_extract_saved_article():
+    page = extract_article(fixture_page("udn_article.html"))
+
+    assert page.title.strip()
+    assert page.time.startswith("2024-08-")
+    assert len(page.paragraphs) == 14
+    assert not any("▪" in p for p in page.paragraphs)
+
+
+def test_inline_tags_are_part_of_the_paragraph():
+    page = extract_article(
+        '<h1 class="article-content__title">標題</h1>'
+        '<time class="article-content__time">2024-08-01 12:00</time>'
+        '<section class="article-content__editor ">'
+        '<p>油價<a href="/tag">上漲</a>，<strong>物價</strong>跟進 &amp; 雞蛋&lt;缺貨&gt;</p>'
+        '</section>'
+    )
+
+    assert page == ArticlePage("標題", "2024-08-01 12:00", ["油價上漲，物價跟進 & 雞蛋<缺貨>"])
+
+
+def test_blank_related_comments_and_scripts_are_left_out():
+    page = extract_article(
+        '<h1 class="article-content__title">標題</h1>'
+        '<time class="article-content__time">2024-08-01 12:00</time>'
+        '<section class="article-content__editor">'
+        '<p><br></p><p>內文<!-- ad --><script>googletag.display("x")</script></p>'
+        '<div><p>廣告後內文</p></div>'
+        '<section class="inner"><p>內層段落</p></section>'
+        '<p>▪ 延伸閱讀</p>'
+        '</section>'
+        '<p>頁尾</p>'
+    )
+
+    assert page.paragraphs == ["內文", "廣告後內文", "內層段落"]
+
+
+@pytest.mark.parametrize("html", [
+    fixture_page("udn_video_no_editor.html"),
+    '<h1 class="article-content__title">標題</h1><section class="article-content__editor"><p>x</p></section>',
+    '<time class="article-content__time">t</time><section class="article-content__editor"><p>x</p></section>',
+    "",
+])
+def test_pages_missing_a_part_are_skipped(html):
+    assert extract_article(html) is None
+
+
+def test_parse_news_article_skips_pages_without_text():
+    assert parse_news_article("https://udn.com/1", fixture_page("udn_video_no_editor.html")) is None
+    news = parse_news_article("https://udn.com/2", fixture_page("udn_article_inline_tags.html"))
+    assert news["url"] == "https://udn.com/2"
+    assert len(news["content"]) == 22
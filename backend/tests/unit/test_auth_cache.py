@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+import main
+from main import AuthenticatedUser, Base, User, find_user, invalidate_user, user_cache
+
+
+@pytest.fixture
+def session_local(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'auth.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 7, "username": "alice", "hashed_password": "x"}])
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    user_cache.clear()
+    yield sessionmaker(bind=engine), statements
+    user_cache.clear()
+
+
+def test_find_user_is_cached(session_local):
+    session_local, statements = session_local
+
+    with session_local() as db:
+        first = find_user(db, "alice")
+        second = find_user(db, "alice")
+
+    assert first == second == AuthenticatedUser(7, "alice")
+    assert len(statements) == 1
+
+
+def test_unknown_user_is_not_cached(session_local):
+    session_local, _ = session_local
+
+    with session_local() as db:
+        assert find_user(db, "bob") is None
+        db.execute(insert(User).values(id=8, username="bob", hashed_password="x"))
+        db.commit()
+        assert find_user(db, "bob") == AuthenticatedUser(8, "bob")
+
+
+def test_invalidate_user(session_local):
+    session_local, statements = session_local
+
+    with session_local() as db:
+        find_user(db, "alice")
+        invalidate_user("alice")
+        find_user(db, "alice")
+
+    assert len(statements) == 2
+
+
+def test_cached_user_expires(session_local, mocker):
+    session_local, statements = session_local
+    now = [1000.0]
+    mocker.patch.object(user_cache, "clock", lambda: now[0])
+
+    with session_local() as db:
+        find_user(db, "alice")
+        now[0] += main.AUTH_USER_CACHE_TTL + 1
+        find_user(db, "alice")
+
+    assert len(statements) == 2
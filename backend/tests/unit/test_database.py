@@ -0,0 +1,32 @@
+from database import create_database_engine
+
+
+def pragmas(engine):
+    with engine.connect() as conn:
+        return [
+            conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in ("journal_mode", "busy_timeout", "synchronous")
+        ]
+
+
+def test_sqlite_file_settings(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'news.db'}", busy_timeout_ms=1234)
+
+    # synchronous=NORMAL reads back as 1
+    assert pragmas(engine) == ["wal", 1234, 1]
+    assert engine.pool.size() == 10
+    assert engine.echo is False
+
+
+def test_journal_mode_is_configurable(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'news.db'}", journal_mode="DELETE")
+
+    assert pragmas(engine)[0] == "delete"
+
+
+def test_in_memory_sqlite():
+    engine = create_database_engine("sqlite://", echo=True)
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT 1").scalar() == 1
+    assert engine.echo is True
@@ -0,0 +1,63 @@
+import orjson
+
+from feed_snapshot import FeedSnapshotCache
+
+ITEMS = [{"id": 1, "title": "油價上漲", "upvotes": 0, "is_upvoted": False}]
+
+
+def test_store_and_hit():
+    cache = FeedSnapshotCache(ttl=5, max_pages=10)
+
+    page, generation = cache.lookup("first")
+    assert page is None
+    cache.store("first", generation, ITEMS, "cursor")
+    page, _ = cache.lookup("first")
+
+    assert orjson.loads(page.body) == ITEMS
+    assert page.next_cursor == "cursor"
+    assert cache.stats()["hits"] == 1
+
+
+def test_bump_makes_pages_stale():
+    cache = FeedSnapshotCache(ttl=5, max_pages=10)
+    _, generation = cache.lookup("first")
+    cache.store("first", generation, ITEMS, None)
+
+    cache.bump()
+
+    page, new_generation = cache.lookup("first")
+    assert page is None
+    assert new_generation == generation + 1
+
+
+def test_page_read_before_a_write_is_not_kept():
+    cache = FeedSnapshotCache(ttl=5, max_pages=10)
+    _, generation = cache.lookup("first")
+
+    cache.bump()
+    page = cache.store("first", generation, ITEMS, None)
+
+    assert orjson.loads(page.body) == ITEMS
+    assert cache.lookup("first")[0] is None
+
+
+def test_page_expires():
+    now = [0.0]
+    cache = FeedSnapshotCache(ttl=5, max_pages=10, clock=lambda: now[0])
+    cache.store("first", 0, ITEMS, None)
+
+    now[0] = 6.0
+
+    assert cache.lookup("first")[0] is None
+
+
+def test_least_recently_used_page_is_dropped():
+    cache = FeedSnapshotCache(ttl=5, max_pages=2)
+    cache.store("first", 0, ITEMS, None)
+    cache.store("second", 0, ITEMS, None)
+    cache.lookup("first")
+
+    cache.store("third", 0, ITEMS, None)
+
+    assert cache.lookup("second")[0] is None
+    assert cache.lookup("first")[0] is not None
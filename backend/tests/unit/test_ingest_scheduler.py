@@ -0,0 +1,155 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import main
+from main import Base, IngestRun, IngestStats, SchedulerLease
+from main import acquire_lease, release_lease, renew_lease, run_ingest, run_search_index_sync
+
+
+@pytest.fixture
+def session_local(tmp_path):
+    # a file database so threads get their own connections
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'ingest.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def test_lease_is_held_until_released(session_local):
+    token = acquire_lease("ingest", 60, session_local)
+
+    assert token is not None
+    assert acquire_lease("ingest", 60, session_local) is None
+    release_lease("ingest", token, session_local)
+    assert acquire_lease("ingest", 60, session_local) is not None
+
+
+def test_expired_lease_is_taken_over(session_local):
+    stale = acquire_lease("ingest", 0, session_local)
+    token = acquire_lease("ingest", 60, session_local)
+
+    assert token not in (None, stale)
+    assert not renew_lease("ingest", stale, 60, session_local)
+    assert renew_lease("ingest", token, 60, session_local)
+
+
+def test_parallel_acquires_have_one_winner(session_local):
+    barrier = threading.Barrier(10)
+    tokens = []
+
+    def acquire():
+        barrier.wait()
+        tokens.append(acquire_lease("ingest", 60, session_local))
+
+    threads = [threading.Thread(target=acquire) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len([t for t in tokens if t is not None]) == 1
+
+
+def ingest_stats(new=0, skipped=0, irrelevant=0, failed=0):
+    stats = IngestStats()
+    stats.new, stats.skipped, stats.irrelevant, stats.failed = new, skipped, irrelevant, failed
+    return stats
+
+
+def test_run_is_recorded(session_local, monkeypatch):
+    monkeypatch.setattr(main, "get_new", lambda: ingest_stats(new=3, skipped=2, irrelevant=5))
+
+    run = run_ingest("manual", session_local)
+
+    assert (run.trigger, run.status, run.new, run.skipped, run.irrelevant, run.failed) == (
+        "manual", "succeeded", 3, 2, 5, 0
+    )
+    assert run.duration >= 0 and run.finished_at >= run.started_at
+    with session_local() as db:
+        assert db.scalar(select(IngestRun.status)) == "succeeded"
+        lease = db.get(SchedulerLease, "ingest")
+        assert lease.expires_at <= main.datetime.utcnow()
+
+
+def test_failed_run_is_recorded(session_local, monkeypatch):
+    def broken():
+        raise RuntimeError("udn is down")
+
+    monkeypatch.setattr(main, "get_new", broken)
+
+    run = run_ingest("scheduled", session_local)
+
+    assert run.status == "failed"
+    assert "udn is down" in run.error
+    assert acquire_lease("ingest", 60, session_local) is not None
+
+
+def test_overlapping_runs_ingest_once(session_local, monkeypatch):
+    calls = []
+
+    def slow_get_new():
+        calls.append(1)
+        time.sleep(0.3)
+        return ingest_stats(new=1)
+
+    monkeypatch.setattr(main, "get_new", slow_get_new)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(run_ingest("scheduled", session_local)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len([r for r in results if r is not None]) == 1
+    with session_local() as db:
+        assert len(db.scalars(select(IngestRun)).all()) == 1
+
+
+def test_lease_is_renewed_during_a_long_run(session_local, monkeypatch):
+    monkeypatch.setattr(main, "INGEST_LEASE_SECONDS", 0.3)
+    holders = []
+
+    def long_get_new():
+        time.sleep(0.5)
+        # past the initial 0.3s the lease is only held because it was renewed
+        holders.append(acquire_lease("ingest", 60, session_local))
+        return ingest_stats()
+
+    monkeypatch.setattr(main, "get_new", long_get_new)
+
+    assert run_ingest("scheduled", session_local).status == "succeeded"
+    assert holders == [None]
+
+
+def test_search_index_sync_waits_for_the_ingest_lease(session_local, monkeypatch):
+    synced = []
+    monkeypatch.setattr(main, "sync_news_search_index", lambda factory: synced.append(factory) or 0)
+    token = acquire_lease("ingest", 60, session_local)
+
+    assert run_search_index_sync(session_local) is None
+    assert synced == []
+
+    release_lease("ingest", token, session_local)
+    assert run_search_index_sync(session_local) == 0
+    assert synced == [session_local]
+    assert acquire_lease("ingest", 60, session_local) is not None
+
+
+def test_ingest_syncs_the_search_index_before_crawling(session_local, monkeypatch):
+    steps = []
+    monkeypatch.setattr(main, "sync_news_search_index", lambda factory: steps.append("sync") or 0)
+    monkeypatch.setattr(main, "get_new", lambda: steps.append("crawl") or ingest_stats())
+
+    run_ingest("scheduled", session_local)
+
+    assert steps == ["sync", "crawl"]
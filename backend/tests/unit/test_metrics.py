@@ -0,0 +1,64 @@
+import pytest
+
+from metrics import Registry
+
+
+def test_counter_render():
+    registry = Registry()
+    calls = registry.counter("upstream_requests_total", "Upstream calls.", ["host", "outcome"])
+
+    calls.labels("udn.com", "2xx").inc()
+    calls.labels("udn.com", "2xx").inc(2)
+    calls.labels("udn.com", "error").inc()
+
+    assert registry.render() == (
+        "# HELP upstream_requests_total Upstream calls.\n"
+        "# TYPE upstream_requests_total counter\n"
+        'upstream_requests_total{host="udn.com",outcome="2xx"} 3\n'
+        'upstream_requests_total{host="udn.com",outcome="error"} 1\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1))
+
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.labels("/api/v1/news/news").observe(value)
+
+    lines = registry.render().splitlines()[2:]
+    assert lines == [
+        'latency_seconds_bucket{route="/api/v1/news/news",le="0.1"} 2',
+        'latency_seconds_bucket{route="/api/v1/news/news",le="1"} 3',
+        'latency_seconds_bucket{route="/api/v1/news/news",le="+Inf"} 4',
+        'latency_seconds_sum{route="/api/v1/news/news"} 3.65',
+        'latency_seconds_count{route="/api/v1/news/news"} 4',
+    ]
+
+
+def test_histogram_time_observes_on_error():
+    registry = Registry()
+    stage = registry.histogram("stage_seconds", "Stage time.", ["stage"])
+
+    with pytest.raises(RuntimeError):
+        with stage.labels("list").time():
+            raise RuntimeError("upstream down")
+
+    assert stage.labels("list").snapshot()[0][-1] == 1
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors.", ["message"])
+
+    errors.labels('say "hi"\\\n').inc()
+
+    assert 'errors_total{message="say \\"hi\\"\\\\\\n"} 1' in registry.render()
+
+
+def test_wrong_label_count():
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors.", ["host"])
+
+    with pytest.raises(ValueError):
+        errors.labels()
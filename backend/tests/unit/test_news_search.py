@@ -0,0 +1,101 @@
+from sqlalchemy import StaticPool, create_engine, delete, insert
+
+import news_search
+from main import Base, NewsArticle
+
+
+def test_cjk_runs_are_indexed_as_bigrams():
+    assert news_search.index_text("台積電ADR大漲 3%") == "台積 積電 adr 大漲 3"
+
+
+def test_text_is_normalised():
+    assert news_search.index_text("ＡＢＣ　油價") == "abc 油價"
+
+
+def test_match_query_requires_every_run_as_a_phrase():
+    assert news_search.match_query("油價上漲 CPI") == '"油價 價上 上漲" "cpi"'
+
+
+def test_match_query_single_character_is_a_prefix():
+    assert news_search.match_query("油") == '"油"*'
+
+
+def test_match_query_without_tokens():
+    assert news_search.match_query(" %% ") is None
+
+
+def seed(articles):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(NewsArticle), [
+            {
+                "id": i,
+                "url": f"https://example.com/{i}",
+                "title": title,
+                "time": "2024-01-01",
+                "content": content,
+                "summary": "",
+                "reason": "",
+            }
+            for i, (title, content) in enumerate(articles, start=1)
+        ])
+    return engine
+
+
+def test_search_ranks_title_matches_first():
+    engine = seed([
+        ("蔬菜價格持平", "颱風過後油價上漲"),
+        ("油價上漲", "國際原油走高"),
+        ("雞蛋缺貨", "蛋價上漲"),
+    ])
+    with engine.begin() as conn:
+        assert news_search.sync_index(conn) == 3
+        ranked = news_search.search(conn, "油價上漲", 10)
+
+    assert [article_id for article_id, _ in ranked] == [2, 1]
+
+
+def test_sync_index_only_indexes_new_articles():
+    engine = seed([("油價上漲", "")])
+    with engine.begin() as conn:
+        news_search.sync_index(conn)
+        conn.execute(insert(NewsArticle), [{
+            "id": 2, "url": "https://example.com/2", "title": "油價下跌",
+            "time": "2024-01-02", "content": "", "summary": "", "reason": "",
+        }])
+        assert news_search.sync_index(conn) == 1
+        assert news_search.sync_index(conn) == 0
+        assert sorted(i for i, _ in news_search.search(conn, "油價", 10)) == [1, 2]
+
+
+def test_sync_index_drops_entries_of_deleted_and_reused_ids():
+    engine = seed([("油價上漲", ""), ("雞蛋缺貨", "")])
+    with engine.begin() as conn:
+        news_search.sync_index(conn)
+        conn.execute(delete(NewsArticle))
+        # id 1 comes back as another article, id 2 is gone
+        conn.execute(insert(NewsArticle), [{
+            "id": 1, "url": "https://example.com/other", "title": "電價調漲",
+            "time": "2024-01-02", "content": "", "summary": "", "reason": "",
+        }])
+
+        assert news_search.sync_index(conn) == 1
+        assert news_search.search(conn, "油價", 10) == []
+        assert news_search.search(conn, "雞蛋", 10) == []
+        assert [i for i, _ in news_search.search(conn, "電價", 10)] == [1]
+
+
+def test_index_urls_replaces_a_reused_id():
+    engine = seed([("油價上漲", "")])
+    with engine.begin() as conn:
+        news_search.sync_index(conn)
+        conn.execute(delete(NewsArticle))
+        conn.execute(insert(NewsArticle), [{
+            "id": 1, "url": "https://example.com/other", "title": "電價調漲",
+            "time": "2024-01-02", "content": "", "summary": "", "reason": "",
+        }])
+
+        assert news_search.index_urls(conn, ["https://example.com/other"]) == 1
+        assert news_search.search(conn, "油價", 10) == []
+        assert [i for i, _ in news_search.search(conn, "電價", 10)] == [1]
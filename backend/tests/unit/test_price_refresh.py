@@ -0,0 +1,77 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import StaticPool, create_engine
+from sqlalchemy.orm import sessionmaker
+
+import price_series
+from main import PRICE_LEASE, Base, NecessityPrice, refresh_necessities_prices, run_price_refresh
+from main import acquire_lease, release_lease
+
+
+def price_item(item_no, series):
+    return {
+        "類別": "雞蛋",
+        "編號": item_no,
+        "產品名稱": f"雞蛋 {item_no}",
+        "規格": "10入",
+        "統計值": series,
+        "時間起點": "2015-03-01",
+        "時間終點": "2024-08-01",
+    }
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def refresh(session_factory, items):
+    with patch("main.requests.get") as mock_get:
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = items
+        return refresh_necessities_prices(session_factory)
+
+
+def stored_series(session_factory):
+    with session_factory() as db:
+        return {
+            p.item_no: price_series.to_json_list(price_series.blob_to_series(p.series))
+            for p in db.query(NecessityPrice)
+        }
+
+
+def test_malformed_series_keeps_the_stored_row(session_factory, capsys):
+    refresh(session_factory, [price_item(1, "60,61,62"), price_item(2, "70,71")])
+
+    result = refresh(session_factory, [price_item(1, "60,61,??"), price_item(2, "72,73")])
+
+    assert result.item_count == 1
+    assert stored_series(session_factory) == {"1": [60, 61, 62], "2": [72, 73]}
+    assert "skipped necessity price 雞蛋 1" in capsys.readouterr().out
+
+
+def test_malformed_new_item_is_not_stored(session_factory, capsys):
+    refresh(session_factory, [price_item(1, "60,61"), price_item(2, "7O,71")])
+
+    assert stored_series(session_factory) == {"1": [60, 61]}
+    assert "skipped necessity price 雞蛋 2" in capsys.readouterr().out
+
+
+def test_refresh_waits_for_the_lease(session_factory):
+    token = acquire_lease(PRICE_LEASE, 60, session_factory)
+    with patch("main.requests.get") as mock_get:
+        assert run_price_refresh(session_factory) is None
+        mock_get.assert_not_called()
+
+    release_lease(PRICE_LEASE, token, session_factory)
+    with patch("main.requests.get") as mock_get:
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = [price_item(1, "60,61")]
+        assert run_price_refresh(session_factory).item_count == 1
+    # released again for the next worker
+    assert acquire_lease(PRICE_LEASE, 60, session_factory) is not None
@@ -0,0 +1,107 @@
+from datetime import date
+
+import numpy as np
+
+import price_series
+
+
+def test_parse_series_marks_missing_months():
+    values = price_series.parse_series("144,143,0,,145")
+
+    assert values.dtype == np.float32
+    assert price_series.to_json_list(values) == [144, 143, None, None, 145]
+
+
+def test_blob_round_trip():
+    values = price_series.parse_series("1.5,2,0")
+
+    restored = price_series.blob_to_series(price_series.series_to_blob(values))
+
+    np.testing.assert_array_equal(restored, values)
+
+
+def test_series_step_months():
+    start, end = date(2015, 3, 1), date(2024, 8, 1)
+
+    assert price_series.series_step_months(start, end, 115) == 1
+    assert price_series.series_step_months(start, end, 39) == 3
+    assert price_series.series_step_months(start, start, 1) == 1
+
+
+def test_slice_series():
+    values = np.arange(24, dtype=np.float32)
+
+    sliced, start = price_series.slice_series(
+        values, date(2020, 1, 1), 1, since=date(2020, 6, 1), until=date(2020, 8, 1)
+    )
+
+    assert start == date(2020, 6, 1)
+    assert sliced.tolist() == [5, 6, 7]
+
+
+def test_bucket_means_ignores_missing():
+    values = np.array([1, np.nan, 3, 5, 7, 9], dtype=np.float32)
+
+    means, starts = price_series.bucket_means(values, 3)
+
+    assert means.tolist() == [1, 4, 8]
+    assert starts.tolist() == [0, 2, 4]
+
+
+def test_moving_average():
+    values = np.array([1, 2, 3, np.nan, 5], dtype=np.float32)
+
+    average = price_series.moving_average(values, 2)
+
+    assert price_series.to_json_list(average) == [None, 1.5, 2.5, 3, 5]
+
+
+def test_summarize_series():
+    values = np.array([100] + [np.nan] * 11 + [110], dtype=np.float32)
+
+    stats = price_series.summarize_series(values, 1)
+
+    assert stats == {"min": 100, "max": 110, "mean": 105, "yoy_change": 10}
+    assert price_series.summarize_series(values[1:12], 1)["mean"] is None
+
+
+def test_align_series_on_a_monthly_grid():
+    matrix, first = price_series.align_series([
+        (np.array([1, 2], dtype=np.float32), date(2020, 2, 1), 1),
+        (np.array([5, 6], dtype=np.float32), date(2020, 1, 1), 2),
+    ])
+
+    assert first == date(2020, 1, 1)
+    assert price_series.to_json_list(matrix[0]) == [None, 1, 2]
+    assert price_series.to_json_list(matrix[1]) == [5, None, 6]
+
+
+def test_forward_fill():
+    matrix = np.array([[np.nan, 1, np.nan, 3], [2, np.nan, np.nan, np.nan]], dtype=np.float32)
+
+    filled = price_series.forward_fill(matrix)
+
+    assert price_series.to_json_list(filled[0]) == [None, 1, 1, 3]
+    assert price_series.to_json_list(filled[1]) == [2, 2, 2, 2]
+
+
+def test_price_ranking_top_k():
+    start = date(2023, 1, 1)
+    ranking = price_series.PriceRanking(
+        [
+            (1, "蛋", "雞蛋", np.array([100, 110, 120], dtype=np.float32), start, 1),
+            (2, "蛋", "鴨蛋", np.array([100, 100, 90], dtype=np.float32), start, 1),
+            (3, "米", "白米", np.array([50, 50, 75], dtype=np.float32), start, 1),
+            (4, "米", "糙米", np.array([np.nan, np.nan, 75], dtype=np.float32), start, 1),
+        ],
+        windows=(1, 2),
+    )
+
+    assert [r["id"] for r in ranking.top(1, 10)] == [3, 1, 2]
+    assert [r["id"] for r in ranking.top(2, 2)] == [3, 1]
+    assert [r["id"] for r in ranking.top(2, 1, ascending=True)] == [2]
+    assert ranking.top(2, 10, category="蛋") == [
+        {"id": 1, "category": "蛋", "name": "雞蛋", "change": 20, "latest": 120, "previous": 100},
+        {"id": 2, "category": "蛋", "name": "鴨蛋", "change": -10, "latest": 90, "previous": 100},
+    ]
+    assert ranking.top(1, 10, category="肉") is None
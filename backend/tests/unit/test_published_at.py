@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from main import parse_published_at
+
+
+def test_udn_display_time():
+    assert parse_published_at("2024-08-01 12:34") == datetime(2024, 8, 1, 12, 34)
+
+
+def test_other_formats():
+    assert parse_published_at(" 2024/08/01 12:34 ") == datetime(2024, 8, 1, 12, 34)
+    assert parse_published_at("2024-08-01") == datetime(2024, 8, 1)
+
+
+def test_unreadable_time_counts_as_now():
+    before = datetime.now().replace(microsecond=0)
+    assert before <= parse_published_at("3 小時前") <= datetime.now()
@@ -0,0 +1,79 @@
+import asyncio
+
+from main import RelevanceClassifier
+
+
+class StubBackend:
+    def __init__(self, grades):
+        self.grades = grades
+        self.batches = []
+
+    async def __call__(self, titles):
+        self.batches.append(list(titles))
+        return {t: self.grades.get(t) for t in titles}
+
+
+def test_grades_titles_in_batches():
+    backend = StubBackend({"雞蛋漲價": "high", "球賽結果": "low", "油價調整": "medium"})
+    classifier = RelevanceClassifier(backend, batch_size=2)
+
+    grades = asyncio.run(classifier.grade(["雞蛋漲價", "球賽結果", "油價調整"]))
+
+    assert grades == {"雞蛋漲價": "high", "球賽結果": "low", "油價調整": "medium"}
+    assert backend.batches == [["雞蛋漲價", "球賽結果"], ["油價調整"]]
+
+
+def test_seen_titles_are_not_graded_again():
+    backend = StubBackend({"雞蛋漲價": "high", "油價調整": "medium"})
+    classifier = RelevanceClassifier(backend)
+
+    asyncio.run(classifier.grade(["雞蛋漲價", "雞蛋漲價"]))
+    grades = asyncio.run(classifier.grade(["雞蛋漲價", "油價調整"]))
+
+    assert grades == {"雞蛋漲價": "high", "油價調整": "medium"}
+    assert backend.batches == [["雞蛋漲價"], ["油價調整"]]
+
+
+def test_unknown_grades_default_to_low_and_are_retried():
+    backend = StubBackend({"雞蛋漲價": "very high"})
+    classifier = RelevanceClassifier(backend)
+
+    assert asyncio.run(classifier.grade(["雞蛋漲價"])) == {"雞蛋漲價": "low"}
+    asyncio.run(classifier.grade(["雞蛋漲價"]))
+
+    assert backend.batches == [["雞蛋漲價"], ["雞蛋漲價"]]
+
+
+def test_backend_failure_leaves_titles_ungraded():
+    async def failing_backend(titles):
+        raise RuntimeError("upstream down")
+
+    classifier = RelevanceClassifier(failing_backend)
+
+    assert asyncio.run(classifier.grade(["雞蛋漲價"])) == {"雞蛋漲價": None}
+    assert classifier.cached("雞蛋漲價") is None
+
+
+def test_backend_arguments_are_passed_on():
+    received = []
+
+    async def backend(titles, llm):
+        received.append(llm)
+        return {t: "high" for t in titles}
+
+    classifier = RelevanceClassifier(backend)
+
+    assert asyncio.run(classifier.grade(["雞蛋漲價"], "client")) == {"雞蛋漲價": "high"}
+    assert received == ["client"]
+
+
+def test_cache_evicts_least_recently_used():
+    backend = StubBackend({"a": "high", "b": "low", "c": "low"})
+    classifier = RelevanceClassifier(backend, max_entries=2)
+
+    asyncio.run(classifier.grade(["a", "b"]))
+    asyncio.run(classifier.grade(["a"]))
+    asyncio.run(classifier.grade(["c"]))
+    asyncio.run(classifier.grade(["a", "b"]))
+
+    assert backend.batches == [["a", "b"], ["c"], ["b"]]
@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from main import Base, app, session_opener
+
+BACKEND = Path(__file__).resolve().parents[2]
+# imported on first use, not by `import main`, see tests/benchmark/test_import_time.py for the timing
+HEAVY_MODULES = ("openai", "bs4", "numpy")
+
+IMPORT_SCRIPT = f"""
+import sys
+import main
+print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+
+def test_heavy_packages_are_imported_on_first_use(tmp_path):
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'news.db'}"}
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.splitlines()[-1] == ""
+
+
+def test_startup_does_not_wait_for_the_first_crawl(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'news.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_local = sessionmaker(bind=engine)
+    release = threading.Event()
+
+    def slow_run_ingest(trigger="scheduled"):
+        release.wait(5)
+        return SimpleNamespace(status="succeeded")
+
+    monkeypatch.setattr(main, "SessionLocal", session_local)
+    monkeypatch.setattr(main, "bgs", BackgroundScheduler())
+    monkeypatch.setattr(main, "run_ingest", slow_run_ingest)
+    monkeypatch.setattr(main, "run_price_refresh", lambda: None)
+    monkeypatch.setattr(main, "run_search_index_sync", lambda: 0)
+    monkeypatch.setitem(main.initial_crawl, "state", "not_needed")
+    monkeypatch.setitem(app.dependency_overrides, session_opener, lambda: session_local())
+
+    start = time.perf_counter()
+    with TestClient(app) as client:
+        started = time.perf_counter() - start
+        response = client.get("/api/v1/health/ready")
+        assert response.status_code == 503
+        assert response.json()["initial_crawl"] in ("pending", "running")
+
+        release.set()
+        for _ in range(100):
+            if main.initial_crawl["state"] == "done":
+                break
+            time.sleep(0.02)
+        response = client.get("/api/v1/health/ready")
+        assert response.status_code == 200
+        assert response.json() == {"ready": True, "initial_crawl": "done"}
+    assert started < 1
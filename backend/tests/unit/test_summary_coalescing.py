@@ -0,0 +1,44 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, Mock
+
+from main import coalesced_summary, summary_requests
+
+
+def slow_llm(content):
+    async def create(**kwargs):
+        await asyncio.sleep(0.05)
+        return Mock(choices=[Mock(message=Mock(content=content))])
+
+    llm = Mock()
+    llm.chat.completions.create = AsyncMock(side_effect=create)
+    return llm
+
+
+def test_concurrent_identical_summaries_share_one_call():
+    llm = slow_llm(json.dumps({"影響": "impact", "原因": "reason"}))
+
+    async def run():
+        return await asyncio.gather(
+            *(coalesced_summary(llm, "digest", "content") for _ in range(5))
+        )
+
+    results = asyncio.run(run())
+
+    assert results == [{"summary": "impact", "reason": "reason"}] * 5
+    assert llm.chat.completions.create.await_count == 1
+    assert summary_requests == {}
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    llm = slow_llm(json.dumps({"影響": "impact", "原因": "reason"}))
+
+    async def run():
+        first = asyncio.create_task(coalesced_summary(llm, "digest", "content"))
+        second = asyncio.create_task(coalesced_summary(llm, "digest", "content"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == {"summary": "impact", "reason": "reason"}
+    assert llm.chat.completions.create.await_count == 1
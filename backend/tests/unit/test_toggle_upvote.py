@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select, update
+from sqlalchemy.orm import sessionmaker
+
+from main import Base, NewsArticle, User, repair_upvote_counts, toggle_upvote
+from main import user_news_association_table
+
+USER_COUNT = 20
+
+
+@pytest.fixture
+def session_local(tmp_path):
+    # a file database so every thread gets its own connection
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'upvotes.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+        pool_size=USER_COUNT,
+    )
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "username": f"user{i}", "hashed_password": "x"}
+            for i in range(1, USER_COUNT + 1)
+        ])
+        conn.execute(insert(NewsArticle), [{
+            "id": 1, "url": "https://example.com/1", "title": "News",
+            "time": "2024-01-01 00:00", "content": "", "summary": "", "reason": "",
+        }])
+    return sessionmaker(bind=engine)
+
+
+def upvote_state(session_local):
+    with session_local() as db:
+        count = db.scalar(select(NewsArticle.upvote_count).where(NewsArticle.id == 1))
+        rows = db.scalar(select(func.count()).select_from(user_news_association_table))
+    return count, rows
+
+
+def toggle_in_parallel(session_local, user_ids):
+    barrier = threading.Barrier(len(user_ids))
+    messages = []
+
+    def toggle(user_id):
+        barrier.wait()
+        with session_local() as db:
+            messages.append(toggle_upvote(1, user_id, db))
+
+    threads = [threading.Thread(target=toggle, args=(u,)) for u in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return messages
+
+
+def test_parallel_toggles_by_many_users(session_local):
+    messages = toggle_in_parallel(session_local, range(1, USER_COUNT + 1))
+
+    assert messages == ["Article upvoted"] * USER_COUNT
+    assert upvote_state(session_local) == (USER_COUNT, USER_COUNT)
+
+
+def test_parallel_toggles_by_one_user_stay_consistent(session_local):
+    messages = toggle_in_parallel(session_local, [1] * 9)
+
+    assert messages.count("Article upvoted") == 5
+    assert messages.count("Upvote removed") == 4
+    assert upvote_state(session_local) == (1, 1)
+
+
+def test_toggle_missing_article(session_local):
+    with session_local() as db:
+        assert toggle_upvote(99, 1, db) is None
+    assert upvote_state(session_local) == (0, 0)
+
+
+def test_repair_upvote_counts(session_local):
+    with session_local() as db:
+        db.execute(insert(user_news_association_table), [
+            {"user_id": 1, "news_articles_id": 1}, {"user_id": 2, "news_articles_id": 1},
+        ])
+        db.execute(update(NewsArticle).values(upvote_count=7))
+        db.commit()
+
+    assert repair_upvote_counts(session_local) == 1
+    assert upvote_state(session_local) == (2, 2)
+    assert repair_upvote_counts(session_local) == 0
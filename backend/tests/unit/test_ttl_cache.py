@@ -0,0 +1,111 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from ttl_cache import SQLiteCacheStore, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entry_expires_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, max_bytes=1024, clock=clock)
+    cache.set("a", ["x", 1])
+
+    assert cache.get("a") == ["x", 1]
+    clock.now += 11
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 1, "store_hits": 0, "misses": 1, "entries": 0, "bytes": 0}
+
+
+def test_least_recently_used_entry_is_evicted_over_budget():
+    cache = TTLCache(ttl=10, max_bytes=20)
+    cache.set("a", "aaaaaa")  # 8 bytes encoded
+    cache.set("b", "bbbbbb")
+    cache.get("a")
+    cache.set("c", "cccccc")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaaaa"
+    assert cache.get("c") == "cccccc"
+    assert cache.stats()["bytes"] == 16
+
+
+def test_oversized_value_is_not_kept():
+    cache = TTLCache(ttl=10, max_bytes=4)
+    cache.set("a", "too large")
+
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_returned_values_are_copies():
+    cache = TTLCache(ttl=10, max_bytes=1024)
+    cache.set("a", [1])
+    cache.get("a").append(2)
+
+    assert cache.get("a") == [1]
+
+
+def test_sqlite_store_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "cache.db")
+    TTLCache(ttl=10, max_bytes=1024, store=SQLiteCacheStore(path, "search")).set("a", {"k": "新聞"})
+
+    cache = TTLCache(ttl=10, max_bytes=1024, store=SQLiteCacheStore(path, "search"))
+    assert cache.get("a") == {"k": "新聞"}
+    # promoted to memory
+    assert cache.get("a") == {"k": "新聞"}
+    assert cache.stats()["store_hits"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_sqlite_store_ignores_expired_entries(tmp_path):
+    clock = FakeClock()
+    store = SQLiteCacheStore(str(tmp_path / "cache.db"), "search")
+    TTLCache(ttl=10, max_bytes=1024, store=store, clock=clock).set("a", 1)
+    clock.now += 11
+
+    assert TTLCache(ttl=10, max_bytes=1024, store=store, clock=clock).get("a") is None
+
+
+def test_async_access_reads_and_writes_the_store(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def scenario():
+        await TTLCache(ttl=10, max_bytes=1024, store=SQLiteCacheStore(path, "search")).aset("a", [1, 2])
+        cache = TTLCache(ttl=10, max_bytes=1024, store=SQLiteCacheStore(path, "search"))
+        return await cache.aget("a"), await cache.aget("a"), await cache.aget("b"), cache.stats()
+
+    first, second, missing, stats = asyncio.run(scenario())
+
+    assert first == second == [1, 2]
+    assert missing is None
+    assert (stats["store_hits"], stats["hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_sqlite_store_closes_its_connections(tmp_path):
+    opened = []
+
+    class TrackedStore(SQLiteCacheStore):
+        def connect(self):
+            conn = super().connect()
+            opened.append(conn)
+            return conn
+
+    cache = TTLCache(ttl=10, max_bytes=1024, store=TrackedStore(str(tmp_path / "cache.db"), "search"))
+    cache.set("a", 1)
+    cache.discard("a")
+    assert cache.get("a") == 1
+    cache.clear()
+
+    assert len(opened) == 4
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
@@ -0,0 +1,174 @@
+"""
+In-memory TTL cache with LRU eviction under a byte budget, optionally backed
+by an SQLite table so warm entries survive restarts.
+
+Values are stored JSON encoded: the byte budget counts real payload sizes and
+callers always get their own copy back. Caches are safe to share between
+threads; on the event loop use aget/aset, which keep the SQLite tier's reads
+and writes off the loop.
+"""
+import asyncio
+import json
+import sqlite3
+from contextlib import closing
+import threading
+import time
+from collections import OrderedDict
+
+
+class SQLiteCacheStore:
+    """
+    persistent tier of a TTLCache, one table per cache
+
+    :param path: sqlite database file
+    :param table: table name, created if missing
+    """
+
+    def __init__(self, path, table):
+        self.path = path
+        self.table = table
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+
+    def connect(self):
+        """a new connection, callers close it, `with conn` only ends the transaction"""
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key, now):
+        """:return: (expires_at, encoded value), None if missing or expired"""
+        with closing(self.connect()) as conn, conn:
+            return conn.execute(
+                f"SELECT expires_at, value FROM {self.table} WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+
+    def set(self, key, expires_at, encoded):
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, encoded),
+            )
+            conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        with closing(self.connect()) as conn, conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+
+class TTLCache:
+    """
+    :param ttl: seconds an entry stays fresh
+    :param max_bytes: memory budget of the encoded values, least recently
+        used entries are evicted beyond it
+    :param store: optional SQLiteCacheStore consulted on memory misses and
+        written through on set
+    """
+
+    def __init__(self, ttl, max_bytes, store=None, clock=time.time):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.store = store
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def get(self, key):
+        """:return: a copy of the cached value, None on a miss"""
+        found, value = self.lookup(key)
+        if found:
+            return value
+        return self.load(key)
+
+    async def aget(self, key):
+        """get() for the event loop, the store is read on a worker thread"""
+        found, value = self.lookup(key)
+        if found:
+            return value
+        if self.store is None:
+            return self.load(key)
+        return await asyncio.to_thread(self.load, key)
+
+    def lookup(self, key):
+        """:return: (found, copy of the value) from memory"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, json.loads(entry[1])
+                self.discard(key)
+            return False, None
+
+    def load(self, key):
+        """:return: a copy of the value from the store after a memory miss, None on a miss"""
+        if self.store is not None:
+            found = self.store.get(key, self.clock())
+            if found is not None:
+                self.put(key, *found)
+                with self.lock:
+                    self.store_hits += 1
+                return json.loads(found[1])
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        expires_at, encoded = self.remember(key, value)
+        if self.store is not None:
+            self.store.set(key, expires_at, encoded)
+
+    async def aset(self, key, value):
+        """set() for the event loop, the store is written on a worker thread"""
+        expires_at, encoded = self.remember(key, value)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.set, key, expires_at, encoded)
+
+    def remember(self, key, value):
+        """:return: (expires_at, encoded value) kept in memory"""
+        encoded = json.dumps(value, ensure_ascii=False)
+        expires_at = self.clock() + self.ttl
+        self.put(key, expires_at, encoded)
+        return expires_at, encoded
+
+    def put(self, key, expires_at, encoded):
+        with self.lock:
+            self.discard(key)
+            size = len(encoded.encode("utf-8"))
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (expires_at, encoded, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def discard(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            if self.store is not None:
+                self.store.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
@@ -5,7 +5,9 @@ import { useAuthStore } from './auth';
 export const useNewsStore = defineStore('news', {
     state: () => ({
         newsList: [],
+        nextCursor: null,
         isLoading: false,
+        isSearching: false,
         errorMessage: '',
     }),
     actions: {
@@ -21,24 +23,82 @@ export const useNewsStore = defineStore('news', {
                     { headers: authStore.isLoggedIn ? { Authorization: `Bearer ${authStore.accessToken}` } : {}
                 });
                 this.newsList = response.data.map(news => ({ ...news, isSummaryLoading: false }));
+                this.nextCursor = response.headers['x-next-cursor'] || null;
             } catch (error) {
                 this.errorMessage = 'Error fetching news: ' + error.message;
             } finally {
                 this.isLoading = false;
             }
         },
-        async promptSearchNews(prompt) {
-            if(this.isLoading) return;
+        async fetchMoreNews() {
+            if(this.isLoading || !this.nextCursor) return;
             this.isLoading = true;
             this.errorMessage = '';
+            const authStore = useAuthStore();
+            const apiUrl = authStore.isLoggedIn
+                ? 'http://localhost:8000/api/v1/news/user_news'
+                : 'http://localhost:8000/api/v1/news/news';
             try {
-                const response = await axios.post('http://localhost:8000/api/v1/news/search_news', {prompt: prompt});
-                this.newsList = response.data.map(news => ({ ...news, isSummaryLoading: false }));
+                const response = await axios.get(apiUrl, {
+                    params: { cursor: this.nextCursor },
+                    headers: authStore.isLoggedIn ? { Authorization: `Bearer ${authStore.accessToken}` } : {}
+                });
+                this.newsList.push(...response.data.map(news => ({ ...news, isSummaryLoading: false })));
+                this.nextCursor = response.headers['x-next-cursor'] || null;
             } catch (error) {
                 this.errorMessage = 'Error fetching news: ' + error.message;
             } finally {
                 this.isLoading = false;
-            }            
+            }
+        },
+        async fetchNewsContent(newsId) {
+            const index = this.newsList.findIndex(news => news.id === newsId);
+            if (index === -1 || this.newsList[index].content) return;
+            try {
+                const response = await axios.get(`http://localhost:8000/api/v1/news/news/${newsId}`);
+                this.newsList[index].content = response.data.content;
+            } catch (error) {
+                this.errorMessage = 'Error fetching news: ' + error.message;
+            }
+        },
+        promptSearchNews(prompt) {
+            if(this.isLoading || this.isSearching) return;
+            this.isLoading = true;
+            this.isSearching = true;
+            this.errorMessage = '';
+            this.newsList = [];
+            this.nextCursor = null;
+            const source = new EventSource(
+                'http://localhost:8000/api/v1/news/search_news/stream?prompt=' + encodeURIComponent(prompt)
+            );
+            const finish = () => {
+                source.close();
+                this.isLoading = false;
+                this.isSearching = false;
+            };
+            source.addEventListener('keywords', () => {
+                this.isLoading = false;
+            });
+            source.addEventListener('news', event => {
+                const news = { ...JSON.parse(event.data), isSummaryLoading: false };
+                // keep the newest first while results arrive in completion order,
+                // published_at is ISO 8601 so it orders as a string
+                const index = this.newsList.findIndex(item => item.published_at < news.published_at);
+                if (index === -1) {
+                    this.newsList.push(news);
+                } else {
+                    this.newsList.splice(index, 0, news);
+                }
+            });
+            source.addEventListener('error', event => {
+                if (event.data) {
+                    this.errorMessage = 'Error fetching news: ' + JSON.parse(event.data).detail;
+                } else {
+                    this.errorMessage = 'Error fetching news: connection lost';
+                    finish();
+                }
+            });
+            source.addEventListener('done', finish);
         },
         async fetchNewsSummary(content, index) {
             if(this.newsList[index].isSummaryLoading) return;